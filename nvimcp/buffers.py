@@ -0,0 +1,145 @@
+"""Buffer metadata mirrored from nvim and patched from buffer events."""
+
+import json
+import threading
+from typing import Any, Callable, Dict, List, Set
+
+from .cache import CacheStats
+
+# Args: buffer ids (nil = every buffer). Invalid ids are left out.
+BUFFER_INFO_LUA = r"""
+local ids = ...
+if ids == nil or ids == vim.NIL then
+  ids = vim.api.nvim_list_bufs()
+end
+local out = {}
+for _, b in ipairs(ids) do
+  if vim.api.nvim_buf_is_valid(b) then
+    local loaded = vim.api.nvim_buf_is_loaded(b)
+    local lines = vim.api.nvim_buf_line_count(b)
+    local bytes = 0
+    if loaded then
+      local ok, n = pcall(vim.api.nvim_buf_get_offset, b, lines)
+      bytes = ok and n or 0
+    end
+    out[#out + 1] = {
+      buf = b,
+      name = vim.api.nvim_buf_get_name(b),
+      filetype = vim.bo[b].filetype,
+      buftype = vim.bo[b].buftype,
+      lines = lines,
+      bytes = bytes,
+      modified = vim.bo[b].modified,
+      listed = vim.bo[b].buflisted,
+      loaded = loaded,
+      changedtick = vim.api.nvim_buf_get_changedtick(b),
+    }
+  end
+end
+return out
+"""
+
+# Per-entry overhead of a mirrored buffer besides its name (dict, keys, ints)
+_ENTRY_BYTES = 700
+
+
+class BufferInventory:
+    """
+    Metadata of every buffer, refreshed only where events say it changed.
+
+    Subscribe on_event and invalidate to an EventQueue for EVENTS; after
+    draining it, refresh() fetches what is dirty in one call, or nothing.
+    """
+
+    EVENTS = (
+        "BufAdd",
+        "BufNew",
+        "BufDelete",
+        "BufWipeout",
+        "BufUnload",
+        "BufReadPost",
+        "BufWritePost",
+        "BufFilePost",
+        "BufModifiedSet",
+        "FileType",
+        "BufChanged",
+    )
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self._buffers: Dict[int, Dict[str, Any]] = {}
+        self._dirty: Set[int] = set()
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(_ENTRY_BYTES + len(b["name"]) for b in self._buffers.values())
+
+    def on_event(self, event: str, bufnr: int):
+        with self._lock:
+            if event == "BufWipeout":
+                self._buffers.pop(bufnr, None)
+                self._dirty.discard(bufnr)
+            else:
+                self._dirty.add(bufnr)
+
+    def invalidate(self):
+        """Refetch everything on the next refresh."""
+        with self._lock:
+            self._stale = True
+
+    def evict(self, target_bytes: int) -> int:
+        """Drop everything; it is rebuilt by the next refresh."""
+        if self.nbytes <= target_bytes:
+            return 0
+        freed = self.nbytes
+        with self._lock:
+            count = len(self._buffers)
+            self._buffers.clear()
+            self._dirty.clear()
+            self._stale = True
+        self.stats.evicted(count, freed)
+        return freed
+
+    def refresh(self, exec_lua: Callable):
+        """Bring the mirror up to date; no RPC when nothing changed."""
+        with self._lock:
+            stale, dirty = self._stale, self._dirty
+            self._stale, self._dirty = False, set()
+        if not stale and not dirty:
+            self.stats.hits += 1
+            return
+        self.stats.misses += 1
+        try:
+            infos = exec_lua(BUFFER_INFO_LUA, None if stale else sorted(dirty))
+        except Exception:
+            with self._lock:
+                self._stale = self._stale or stale
+                self._dirty |= dirty
+            raise
+        fresh = {info["buf"]: info for info in infos}
+        with self._lock:
+            if stale:
+                self._buffers = fresh
+            else:
+                for bufnr in dirty:
+                    if bufnr in fresh:
+                        self._buffers[bufnr] = fresh[bufnr]
+                    else:
+                        self._buffers.pop(bufnr, None)
+
+    def buffers(self, include_unlisted: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(b)
+                for _, b in sorted(self._buffers.items())
+                if include_unlisted or b["listed"]
+            ]
+
+
+def format_buffers(buffers: List[Dict[str, Any]]) -> str:
+    return json.dumps({"buffers": buffers}, separators=(",", ":"))
@@ -0,0 +1,157 @@
+"""Byte accounting and eviction across the server's caches."""
+
+import logging
+import mmap
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Counters a cache keeps about itself."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+
+    def evicted(self, count: int, nbytes: int):
+        self.evictions += count
+        self.evicted_bytes += nbytes
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process, or None without /proc."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_bytes(n: Optional[int]) -> str:
+    if n is None:
+        return "unknown"
+    return f"{n / (1 << 20):.1f} MiB"
+
+
+class CacheManager:
+    """
+    Byte budgets for the server's caches.
+
+    A cache registers under a name and provides `stats` (CacheStats),
+    `nbytes`, `__len__` and evict(target_bytes), which frees least
+    recently used entries until it holds at most target_bytes and returns
+    the bytes freed; drop_buffer(bufnr), if present, forgets a buffer that
+    nvim unloaded.
+
+    enforce() keeps the total under max_bytes and, when the process RSS
+    exceeds max_rss, frees the overshoot from the caches as well, largest
+    cache first. Both shrink to `low_water` of the limit so the next insert
+    does not trigger another round.
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = 256 << 20,
+        max_rss: Optional[int] = None,
+        low_water: float = 0.9,
+        rss: Callable[[], Optional[int]] = rss_bytes,
+    ):
+        self.max_bytes = max_bytes
+        self.max_rss = max_rss
+        self.low_water = low_water
+        self.rounds = 0
+        self.dropped_buffers = 0
+        self._rss = rss
+        self._caches: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._caches
+
+    def register(self, name: str, cache: Any):
+        if name in self._caches:
+            raise ValueError(f"Cache already registered: {name}")
+        self._caches[name] = cache
+
+    def names(self) -> List[str]:
+        return list(self._caches)
+
+    def total_bytes(self) -> int:
+        return sum(c.nbytes for c in self._caches.values())
+
+    def drop_buffer(self, bufnr: int) -> int:
+        """Forget a buffer in every cache; returns the bytes freed."""
+        freed = 0
+        for cache in list(self._caches.values()):
+            drop = getattr(cache, "drop_buffer", None)
+            if drop is not None:
+                freed += drop(bufnr)
+        self.dropped_buffers += 1
+        return freed
+
+    def enforce(self) -> int:
+        """Evict down to the limits; returns the bytes freed."""
+        with self._lock:
+            caches = list(self._caches.values())
+            total = sum(c.nbytes for c in caches)
+            excess = 0
+            if self.max_bytes is not None and total > self.max_bytes:
+                excess = total - int(self.max_bytes * self.low_water)
+            rss = self._rss() if self.max_rss is not None else None
+            if rss is not None and rss > self.max_rss:
+                excess = max(excess, rss - int(self.max_rss * self.low_water))
+            if excess <= 0:
+                return 0
+            self.rounds += 1
+            freed = 0
+            for cache in sorted(caches, key=lambda c: c.nbytes, reverse=True):
+                if freed >= excess:
+                    break
+                size = cache.nbytes
+                freed += cache.evict(max(size - (excess - freed), 0))
+            if freed < excess and rss is not None and not self._warned:
+                self._warned = True
+                logger.warning(
+                    f"RSS {format_bytes(rss)} stays over the "
+                    f"{format_bytes(self.max_rss)} ceiling with caches emptied"
+                )
+            return freed
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "rss": self._rss(),
+            "max_rss": self.max_rss,
+            "bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "rounds": self.rounds,
+            "dropped_buffers": self.dropped_buffers,
+            "caches": {
+                name: dict(asdict(c.stats), bytes=c.nbytes, entries=len(c))
+                for name, c in self._caches.items()
+            },
+        }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    def limit(n):
+        return f" (limit {format_bytes(n)})" if n is not None else ""
+
+    lines = [
+        f"rss: {format_bytes(report['rss'])}{limit(report['max_rss'])}",
+        f"cached: {format_bytes(report['bytes'])}{limit(report['max_bytes'])}",
+        f"eviction rounds: {report['rounds']}, "
+        f"buffers dropped: {report['dropped_buffers']}",
+    ]
+    for name, c in report["caches"].items():
+        lines.append(
+            f"{name}: {format_bytes(c['bytes'])}, {c['entries']} entries, "
+            f"hits {c['hits']}, misses {c['misses']}, "
+            f"evictions {c['evictions']} ({format_bytes(c['evicted_bytes'])})"
+        )
+    return "\n".join(lines)
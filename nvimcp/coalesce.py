@@ -0,0 +1,149 @@
+"""Write-behind batching of small edits to the same buffer."""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Applies edits in arrival order, so each one sees the lines the previous
+# ones produced, exactly as separate calls would. Successful edits after the
+# first are joined into one undo step. Args: buffer, {{start, end, lines}, ...}
+# with 0-based, end-exclusive ranges (-1 = end). Returns per-edit
+# {ok = true} or {ok = false, error = ...} and the final changedtick.
+EDIT_BATCH_LUA = r"""
+local buf, edits = ...
+if not vim.api.nvim_buf_is_valid(buf) then
+  error("invalid buffer " .. buf, 0)
+end
+local results = {}
+vim.api.nvim_buf_call(buf, function()
+  local applied = false
+  for i, e in ipairs(edits) do
+    if applied then
+      pcall(vim.cmd, "undojoin")
+    end
+    local ok, err = pcall(vim.api.nvim_buf_set_lines, buf, e[1], e[2], false, e[3])
+    if ok then
+      applied = true
+      results[i] = { ok = true }
+    else
+      results[i] = { ok = false, error = tostring(err) }
+    end
+  end
+end)
+return { results = results, tick = vim.api.nvim_buf_get_changedtick(buf) }
+"""
+
+# (buffer, [[start, end, lines], ...]) -> EDIT_BATCH_LUA result
+BatchApplier = Callable[[int, List[List[Any]]], Awaitable[Dict[str, Any]]]
+
+
+class EditError(Exception):
+    """Raised to the caller whose edit in a batch failed."""
+
+    pass
+
+
+@dataclass
+class PendingEdit:
+    start: int
+    end: int
+    lines: List[str]
+    future: asyncio.Future
+
+
+class EditCoalescer:
+    """
+    Groups edits to a buffer that arrive within `window` seconds.
+
+    The first edit to an idle buffer opens the window; when it closes,
+    every edit queued for that buffer is applied in one call. Each
+    caller's submit() returns once its own edit has been applied, with
+    the buffer's changedtick after the batch. Batches for one buffer are
+    applied in order. Call flush() before anything that reads buffers.
+    """
+
+    def __init__(
+        self, apply: BatchApplier, window: float = 0.005, max_batch: int = 256
+    ):
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.edits = 0
+        self._apply = apply
+        self._pending: Dict[int, List[PendingEdit]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    @property
+    def idle(self) -> bool:
+        return not self._pending and not self._inflight
+
+    async def submit(
+        self, buffer_id: int, start: int, end: int, lines: List[str]
+    ) -> int:
+        """Queue an edit and wait until it is applied; returns the changedtick."""
+        loop = asyncio.get_running_loop()
+        edit = PendingEdit(start, end, lines, loop.create_future())
+        queue = self._pending.setdefault(buffer_id, [])
+        queue.append(edit)
+        if len(queue) >= self.max_batch:
+            self._start(buffer_id)
+        elif len(queue) == 1:
+            self._timers[buffer_id] = loop.call_later(
+                self.window, self._start, buffer_id
+            )
+        return await edit.future
+
+    async def flush(self, buffer_id: Optional[int] = None):
+        """Apply queued edits now and wait for every batch in flight."""
+        for b in list(self._pending) if buffer_id is None else [buffer_id]:
+            self._start(b)
+        if buffer_id is None:
+            tasks = list(self._inflight.values())
+        else:
+            tasks = [t for t in [self._inflight.get(buffer_id)] if t is not None]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(self, buffer_id: int):
+        timer = self._timers.pop(buffer_id, None)
+        if timer is not None:
+            timer.cancel()
+        edits = self._pending.pop(buffer_id, None)
+        if not edits:
+            return
+        previous = self._inflight.get(buffer_id)
+        task = asyncio.ensure_future(self._run(buffer_id, edits, previous))
+        self._inflight[buffer_id] = task
+        task.add_done_callback(lambda t: self._done(buffer_id, t))
+
+    def _done(self, buffer_id: int, task: asyncio.Task):
+        if self._inflight.get(buffer_id) is task:
+            del self._inflight[buffer_id]
+
+    async def _run(
+        self,
+        buffer_id: int,
+        edits: List[PendingEdit],
+        previous: Optional[asyncio.Task],
+    ):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        self.batches += 1
+        self.edits += len(edits)
+        try:
+            result = await self._apply(
+                buffer_id, [[e.start, e.end, e.lines] for e in edits]
+            )
+        except Exception as error:
+            for e in edits:
+                if not e.future.done():
+                    e.future.set_exception(error)
+            return
+        for e, r in zip(edits, result["results"]):
+            if e.future.done():
+                continue
+            if r.get("ok"):
+                e.future.set_result(result["tick"])
+            else:
+                e.future.set_exception(EditError(r.get("error", "edit failed")))
@@ -1,12 +1,56 @@
 """Nvim connection management for nvimcp server."""
 
+import contextvars
 import logging
 import asyncio
-from typing import Optional
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 import pynvim
 
 logger = logging.getLogger(__name__)
 
+# Embedded nvim without the user's config, shada or swap files; builtin
+# plugins still load.
+LEAN_NVIM_ARGS = ["nvim", "--embed", "--headless", "--clean", "-n", "-i", "NONE"]
+
+
+def lean_nvim_args(plugins: Iterable[str] = (), nvim: str = "nvim") -> List[str]:
+    """
+    argv for a lean embedded nvim.
+
+    Args:
+        plugins: Plugin directories to put on 'runtimepath'; only these
+            are loaded on top of nvim's builtin plugins
+        nvim: nvim executable
+    """
+    args = [nvim] + LEAN_NVIM_ARGS[1:]
+    for path in plugins:
+        escaped = path.replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ")
+        args += ["--cmd", f"set rtp^={escaped}"]
+    return args
+
+
+@dataclass
+class StartupTiming:
+    """Seconds spent in each phase of bringing up an nvim connection."""
+
+    phases: Dict[str, float] = field(default_factory=dict)
+    # How long a standby instance took to start, off the critical path
+    background: Optional["StartupTiming"] = None
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def format(self) -> str:
+        parts = [f"{k}={v * 1000:.1f}ms" for k, v in self.phases.items()]
+        parts.append(f"total={self.total * 1000:.1f}ms")
+        if self.background is not None:
+            parts.append(f"(standby, started ahead in {self.background.format()})")
+        return " ".join(parts)
+
 
 class ConnectionError(Exception):
     """Raised when connection to nvim fails."""
@@ -18,6 +62,7 @@ def connect_neovim(
     mode: str = "auto",
     socket_path: str = "/tmp/nvim.sock",
     nvim_args: Optional[list] = None,
+    timing: Optional[StartupTiming] = None,
 ) -> pynvim.Nvim:
     """
     Connect to nvim instance.
@@ -26,6 +71,7 @@ def connect_neovim(
         mode: Connection mode - "auto", "socket", or "embedded"
         socket_path: Path to nvim socket (for socket mode)
         nvim_args: Additional arguments for embedded mode
+        timing: Filled with the duration of each startup phase
 
     Returns:
         Connected nvim instance
@@ -39,22 +85,24 @@ def connect_neovim(
     if mode == "auto":
         # Try socket first, fallback to embedded
         try:
-            return _connect_socket(socket_path)
+            return _connect_socket(socket_path, timing)
         except Exception as e:
             logger.info(f"Socket connection failed ({e}), trying embedded mode")
-            return _connect_embedded(nvim_args)
+            return _connect_embedded(nvim_args, timing)
 
     elif mode == "socket":
-        return _connect_socket(socket_path)
+        return _connect_socket(socket_path, timing)
 
     elif mode == "embedded":
-        return _connect_embedded(nvim_args)
+        return _connect_embedded(nvim_args, timing)
 
     else:
         raise ConnectionError(f"Invalid connection mode: {mode}")
 
 
-def _connect_socket(socket_path: str) -> pynvim.Nvim:
+def _connect_socket(
+    socket_path: str, timing: Optional[StartupTiming] = None
+) -> pynvim.Nvim:
     """Connect to existing nvim instance via socket."""
     try:
         # Use synchronous connection to avoid event loop conflicts
@@ -81,8 +129,13 @@ def _connect_socket(socket_path: str) -> pynvim.Nvim:
 
         def connect_sync():
             try:
+                start = time.perf_counter()
                 nvim = pynvim.attach("socket", path=socket_path)
+                attached = time.perf_counter()
                 nvim.command('echo "nvimcp server connected"')
+                if timing is not None:
+                    timing.phases["attach"] = attached - start
+                    timing.phases["probe"] = time.perf_counter() - attached
                 nvim_result[0] = nvim
             except Exception as e:
                 error_result[0] = e
@@ -102,8 +155,15 @@ def _connect_socket(socket_path: str) -> pynvim.Nvim:
         raise ConnectionError(f"Failed to connect via socket {socket_path}: {e}")
 
 
-def _connect_embedded(nvim_args: list) -> pynvim.Nvim:
-    """Start embedded nvim instance."""
+def _connect_embedded(
+    nvim_args: list, timing: Optional[StartupTiming] = None
+) -> pynvim.Nvim:
+    """
+    Start embedded nvim instance.
+
+    "attach" covers spawning nvim up to its API handshake, "probe" the
+    first command round trip, which waits for startup to finish.
+    """
     try:
         import threading
 
@@ -112,8 +172,13 @@ def _connect_embedded(nvim_args: list) -> pynvim.Nvim:
 
         def connect_sync():
             try:
+                start = time.perf_counter()
                 nvim = pynvim.attach("child", argv=nvim_args)
+                attached = time.perf_counter()
                 nvim.command('echo "nvimcp server connected (embedded)"')
+                if timing is not None:
+                    timing.phases["attach"] = attached - start
+                    timing.phases["probe"] = time.perf_counter() - attached
                 nvim_result[0] = nvim
             except Exception as e:
                 error_result[0] = e
@@ -131,3 +196,291 @@ def _connect_embedded(nvim_args: list) -> pynvim.Nvim:
         return nvim_result[0]
     except Exception as e:
         raise ConnectionError(f"Failed to start embedded nvim: {e}")
+
+
+# Whether the tool call in progress may be re-run after a reconnect.
+retry_safe: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "nvimcp_retry_safe", default=False
+)
+
+
+class NvimDisconnected(Exception):
+    """Raised when nvim went away during a call that cannot be retried."""
+
+    pass
+
+
+def is_disconnect(error: BaseException) -> bool:
+    """Whether an exception from pynvim means the connection is gone."""
+    return isinstance(error, (OSError, EOFError))
+
+
+def _close_quietly(nvim: pynvim.Nvim):
+    try:
+        nvim.close()
+    except Exception:
+        pass
+
+
+class StandbyPool:
+    """
+    Embedded nvim instances started ahead of time.
+
+    take() hands out a ready instance and starts its replacement in the
+    background, so switching to a fresh nvim costs one round trip instead
+    of nvim's startup. With nothing ready, take() waits up to
+    `wait_timeout` seconds for an instance already starting, or starts
+    one itself.
+    """
+
+    def __init__(
+        self,
+        nvim_args: Optional[list] = None,
+        size: int = 1,
+        spawn: Callable[..., pynvim.Nvim] = _connect_embedded,
+        wait_timeout: float = 30.0,
+    ):
+        self.nvim_args = nvim_args or ["nvim", "--embed", "--headless"]
+        self.size = size
+        self.wait_timeout = wait_timeout
+        self.hits = 0
+        self.misses = 0
+        self._spawn = spawn
+        self._ready: List[Tuple[pynvim.Nvim, StartupTiming]] = []
+        self._starting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def fill(self):
+        """Start instances until `size` are ready or starting."""
+        with self._cond:
+            if self._closed:
+                return
+            missing = max(self.size - len(self._ready) - self._starting, 0)
+            self._starting += missing
+        for _ in range(missing):
+            threading.Thread(
+                target=self._start_one, name="nvimcp-standby", daemon=True
+            ).start()
+
+    def _start_one(self):
+        timing = StartupTiming()
+        try:
+            nvim = self._spawn(self.nvim_args, timing)
+        except Exception as e:
+            logger.warning(f"Standby nvim failed to start: {e}")
+            nvim = None
+        with self._cond:
+            self._starting -= 1
+            if nvim is not None and not self._closed:
+                self._ready.append((nvim, timing))
+                nvim = None
+            self._cond.notify_all()
+        if nvim is not None:
+            _close_quietly(nvim)
+
+    def take(self) -> Tuple[pynvim.Nvim, StartupTiming]:
+        """
+        A ready nvim and what bringing it up cost the caller.
+
+        Raises:
+            ConnectionError: If no instance could be started, or none of
+                those starting came up within wait_timeout
+        """
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.wait_timeout
+        with self._cond:
+            while not self._ready and self._starting:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise ConnectionError(
+                        f"No standby nvim ready after {self.wait_timeout:g}s"
+                    )
+                self._cond.wait(remaining)
+            ready = self._ready.pop(0) if self._ready else None
+        waited = time.perf_counter() - start
+        nvim = None
+        if ready is not None:
+            nvim, spawned = ready
+            probed = time.perf_counter()
+            try:
+                # It may have exited while idle
+                nvim.request("nvim_get_mode")
+            except Exception as e:
+                logger.warning(f"Standby nvim is gone ({e}), starting another")
+                _close_quietly(nvim)
+                nvim = None
+        if nvim is not None:
+            self.hits += 1
+            timing = StartupTiming(
+                {"wait": waited, "probe": time.perf_counter() - probed},
+                background=spawned,
+            )
+        else:
+            self.misses += 1
+            timing = StartupTiming()
+            nvim = self._spawn(self.nvim_args, timing)
+        self.fill()
+        return nvim, timing
+
+    def close(self):
+        """Stop standby instances; instances already taken are not touched."""
+        with self._cond:
+            self._closed = True
+            ready, self._ready = self._ready, []
+        for nvim, _ in ready:
+            _close_quietly(nvim)
+
+
+class ConnectionManager:
+    """
+    Supervises the nvim connection and replaces it when nvim goes away.
+
+    Reconnects use the original mode and socket with exponential backoff.
+    In socket mode the last attempt spawns an embedded nvim instead, so
+    tools keep working when the user's nvim does not come back. Listeners
+    are called with the new pynvim.Nvim after every reconnect or restart,
+    to drop anything cached about the old instance.
+
+    With a StandbyPool, embedded instances come from the pool, so
+    reconnects and restarts do not wait for nvim to start.
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        socket_path: str = "/tmp/nvim.sock",
+        nvim_args: Optional[list] = None,
+        embedded_fallback: bool = True,
+        max_attempts: int = 5,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        connect: Callable[..., pynvim.Nvim] = connect_neovim,
+        standby: Optional[StandbyPool] = None,
+    ):
+        self.mode = mode
+        self.socket_path = socket_path
+        self.nvim_args = nvim_args
+        self.embedded_fallback = embedded_fallback
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.nvim: Optional[pynvim.Nvim] = None
+        self.generation = 0
+        self.reconnects = 0
+        self.restarts = 0
+        self.standby = standby
+        self.startup: Optional[StartupTiming] = None
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[pynvim.Nvim], None]] = []
+
+    def connect(self) -> pynvim.Nvim:
+        """Make the initial connection."""
+        with self._lock:
+            self.nvim = self._open(self.mode)
+            self.generation += 1
+            return self.nvim
+
+    def add_listener(self, listener: Callable[[pynvim.Nvim], None]):
+        self._listeners.append(listener)
+
+    def _open(self, mode: str) -> pynvim.Nvim:
+        """Connect in `mode`, recording the startup timing."""
+        if self.standby is not None and mode in ("auto", "embedded"):
+            if mode == "auto":
+                try:
+                    return self._open("socket")
+                except Exception as e:
+                    logger.info(f"Socket connection failed ({e}), using standby nvim")
+            nvim, self.startup = self.standby.take()
+            return nvim
+        timing = StartupTiming()
+        nvim = self._connect(
+            mode=mode,
+            socket_path=self.socket_path,
+            nvim_args=self.nvim_args,
+            timing=timing,
+        )
+        self.startup = timing
+        return nvim
+
+    def _attempt(self, attempt: int) -> pynvim.Nvim:
+        if (
+            self.mode == "socket"
+            and self.embedded_fallback
+            and attempt == self.max_attempts
+        ):
+            logger.info("Socket still unavailable, starting embedded nvim")
+            return self._open("embedded")
+        return self._open(self.mode)
+
+    def reconnect(self, generation: Optional[int] = None) -> pynvim.Nvim:
+        """
+        Replace a dead connection.
+
+        Args:
+            generation: Generation the caller saw fail; if another caller
+                has reconnected since, the current connection is returned
+
+        Raises:
+            ConnectionError: If every attempt failed
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return self.nvim
+            delay = self.backoff
+            error = None
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    nvim = self._attempt(attempt)
+                    break
+                except Exception as e:
+                    error = e
+                    logger.warning(f"Reconnect attempt {attempt} failed: {e}")
+                    if attempt < self.max_attempts:
+                        time.sleep(delay)
+                        delay = min(delay * 2, self.max_backoff)
+            else:
+                raise ConnectionError(
+                    f"Reconnect failed after {self.max_attempts} attempts: {error}"
+                )
+            old, self.nvim = self.nvim, nvim
+            self.generation += 1
+            self.reconnects += 1
+        logger.info(f"Reconnected to nvim (generation {self.generation})")
+        self._replaced(old, nvim)
+        return nvim
+
+    def restart(self) -> pynvim.Nvim:
+        """
+        Replace the connection with a fresh instance, even if it still works.
+
+        Raises:
+            ConnectionError: If the new instance could not be started
+        """
+        with self._lock:
+            nvim = self._open(self.mode)
+            old, self.nvim = self.nvim, nvim
+            self.generation += 1
+            self.restarts += 1
+        logger.info(f"Restarted nvim (generation {self.generation})")
+        self._replaced(old, nvim)
+        return nvim
+
+    def _replaced(self, old: Optional[pynvim.Nvim], nvim: pynvim.Nvim):
+        if old is not None:
+            _close_quietly(old)
+        for listener in list(self._listeners):
+            try:
+                listener(nvim)
+            except Exception as e:
+                logger.error(f"Reconnect listener failed: {e}")
+
+    def close(self):
+        """Stop standby instances."""
+        if self.standby is not None:
+            self.standby.close()
@@ -0,0 +1,145 @@
+"""Cursor and viewport aware context reads for nvimcp server."""
+
+from typing import Any, Dict, List
+
+# Rough size of one token, used to turn a token budget into bytes.
+BYTES_PER_TOKEN = 4
+
+# Gathers context for the current window first, then the other visible
+# (non-floating) windows of the current tabpage, all within `max_bytes`.
+# Around the cursor the range starts from the largest enclosing multi-line
+# treesitter node that fits (only for buffers with an active highlighter, so
+# no parser is ever created here), then grows line by line in both
+# directions. Other windows get an equal share of what is left and stay
+# inside their viewport.
+CONTEXT_LUA = r"""
+local max_bytes, all_windows = ...
+local api = vim.api
+local cur = api.nvim_get_current_win()
+local wins = {cur}
+if all_windows then
+  for _, w in ipairs(api.nvim_tabpage_list_wins(0)) do
+    if w ~= cur and api.nvim_win_get_config(w).relative == '' then
+      table.insert(wins, w)
+    end
+  end
+end
+
+local function ts_range(buf, row, col, budget)
+  if not (vim.treesitter.highlighter and vim.treesitter.highlighter.active[buf]) then
+    return nil
+  end
+  local ok, node = pcall(function()
+    vim.treesitter.get_parser(buf):parse()
+    return vim.treesitter.get_node({bufnr = buf, pos = {row, col}})
+  end)
+  if not ok or not node then return nil end
+  local best
+  while node do
+    local sr, _, er, ec = node:range()
+    if ec == 0 and er > sr then er = er - 1 end
+    local bytes = api.nvim_buf_get_offset(buf, er + 1) - api.nvim_buf_get_offset(buf, sr)
+    if bytes > budget then break end
+    if er > sr then best = {sr, er, node:type()} end
+    node = node:parent()
+  end
+  return best
+end
+
+-- Grow [first, last] (0-based, inclusive) inside [lo, hi] while it fits.
+local function grow(buf, first, last, lo, hi, budget)
+  local from = math.max(lo, first - budget)
+  local to = math.min(hi, last + budget)
+  local lines = api.nvim_buf_get_lines(buf, from, to + 1, false)
+  local function len(row) return #lines[row - from + 1] + 1 end
+  local used = 0
+  for row = first, last do used = used + len(row) end
+  if used > budget then
+    first, last, used = first, first, len(first)
+    if used > budget then return nil end
+  end
+  local up = true
+  while true do
+    local grew = false
+    for _ = 1, 2 do
+      if up and first > from and used + len(first - 1) <= budget then
+        first = first - 1
+        used = used + len(first)
+        grew = true
+      elseif not up and last < to and used + len(last + 1) <= budget then
+        last = last + 1
+        used = used + len(last)
+        grew = true
+      end
+      up = not up
+    end
+    if not grew then break end
+  end
+  local out = {}
+  for row = first, last do out[#out + 1] = lines[row - from + 1] end
+  return first, last, out, used
+end
+
+local remaining, out = max_bytes, {}
+for i, win in ipairs(wins) do
+  if remaining <= 0 then break end
+  local buf = api.nvim_win_get_buf(win)
+  local cursor = api.nvim_win_get_cursor(win)
+  local w0 = vim.fn.line('w0', win)
+  local w1 = vim.fn.line('w$', win)
+  local n = api.nvim_buf_line_count(buf)
+  local row = cursor[1] - 1
+  local budget = remaining
+  local first, last, lo, hi, node = row, row, 0, n - 1, nil
+  if i == 1 then
+    if #wins > 1 then budget = math.floor(remaining * 0.6) end
+    local r = ts_range(buf, row, cursor[2], budget)
+    if r then first, last, node = r[1], r[2], r[3] end
+  else
+    budget = math.floor(remaining / (#wins - i + 1))
+    lo, hi = w0 - 1, w1 - 1
+    row = math.min(math.max(row, lo), hi)
+    first, last = row, row
+  end
+  local f, l, lines, used = grow(buf, first, last, lo, hi, budget)
+  if f then
+    remaining = remaining - used
+    table.insert(out, {
+      win = win, buf = buf, name = api.nvim_buf_get_name(buf),
+      filetype = vim.bo[buf].filetype, cursor = cursor,
+      viewport = {w0, w1}, first = f + 1, last = l + 1,
+      node = node, lines = lines, current = win == cur,
+    })
+  end
+end
+return out
+"""
+
+
+def budget_bytes(max_tokens: int = None, max_bytes: int = None) -> int:
+    """Resolve the caller's budget to bytes; max_bytes wins if both are given."""
+    if max_bytes is not None:
+        return max_bytes
+    if max_tokens is None:
+        max_tokens = 2000
+    return max_tokens * BYTES_PER_TOKEN
+
+
+def format_context(windows: List[Dict[str, Any]]) -> str:
+    """Render CONTEXT_LUA results, one section per window."""
+    out = []
+    for w in windows:
+        name = w.get("name") or "[No Name]"
+        row, col = w["cursor"]
+        header = (
+            f"==> {name} (buffer {w['buf']}, window {w['win']}"
+            f"{', current' if w.get('current') else ''}) "
+            f"lines {w['first']}-{w['last']}, cursor {row}:{col}"
+        )
+        if w.get("filetype"):
+            header += f", filetype {w['filetype']}"
+        if w.get("node"):
+            header += f", node {w['node']}"
+        out.append(header + " <==")
+        out.extend(w.get("lines") or [])
+    return "\n".join(out) if out else "No context within budget"
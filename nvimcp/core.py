@@ -1,119 +1,879 @@
 """Core nvimcp server implementation."""
 
 import asyncio
+import contextvars
+import inspect
 import logging
-from typing import Any, Dict, List
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 import pynvim
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
-from mcp.types import Tool, TextContent
+from mcp.types import CallToolRequest, Tool, TextContent
+from .patch import (
+    APPLY_PATCH_LUA,
+    format_patch_results,
+    parse_unified_diff,
+    patches_to_lua,
+)
+from .replace import (
+    ENGINES,
+    REPLACE_LUA,
+    build_targets,
+    format_replace_results,
+)
+from .scratch import LOAD_FILES_LUA, ScratchPool, format_files
+from .index import QUERY_MODES, FileIndex
+from .search import (
+    SEARCH_LUA,
+    SYNC_BUFFERS_LUA,
+    TrigramIndex,
+    WorkspaceSearch,
+    required_trigrams,
+    vim_pattern,
+)
+from .context import CONTEXT_LUA, budget_bytes, format_context
+from .recorder import SessionRecorder, current_call
+from .rpc import RpcHooks
+from .tracing import Tracer
+from .registry import ToolArgumentError, ToolRegistry, ToolSpec
+from .quickfix import (
+    ACTIONS as QF_ACTIONS,
+    GET_QF_LUA,
+    SET_QF_LUA,
+    action_flag,
+    build_items,
+    format_list,
+)
+from .snapshot import (
+    EDIT_IF_UNCHANGED_LUA,
+    SNAPSHOT_LUA,
+    SnapshotError,
+    SnapshotStore,
+    format_snapshot,
+)
+from .diff import (
+    ALGORITHMS,
+    DIFF_LUA,
+    TARGETS as DIFF_TARGETS,
+    build_specs as build_diff_specs,
+    with_lines,
+    format_diffs,
+)
+from .buffers import BufferInventory, format_buffers
+from .cache import CacheManager, format_report as format_cache_report
+from .coalesce import EDIT_BATCH_LUA, EditCoalescer
+from .events import EventQueue
+from .linehash import (
+    SPLICE_LUA,
+    LineHashIndex,
+    find_duplicates,
+    format_duplicates,
+    hash_lines,
+    minimal_splice,
+    moved_blocks,
+)
+from .save import (
+    DIRECT_MIN_BYTES,
+    MARK_SAVED_LUA,
+    SAVE_LUA,
+    encode_lines,
+    format_save_results,
+    write_files,
+)
+from .luacache import LuaChunks, format_results as format_lua_results
+from .connection import (
+    ConnectionManager,
+    NvimDisconnected,
+    is_disconnect,
+    retry_safe,
+)
+from .profiler import (
+    NVIM_PROFILE_LUA,
+    SORT_KEYS,
+    TIMED_LUA,
+    NvimProfile,
+    Profiler,
+    current_tool,
+    format_profile,
+    hot_spots,
+    parse_vim_profile,
+)
 
 logger = logging.getLogger(__name__)
 
+# Host and Origin headers the HTTP transport accepts by default. The server
+# has no authentication, so anything else (a web page rebinding its own
+# hostname to 127.0.0.1) is refused unless explicitly allowed.
+LOOPBACK_HOSTS = [
+    h + port for h in ("127.0.0.1", "localhost", "[::1]") for port in ("", ":*")
+]
+LOOPBACK_ORIGINS = [f"http://{h}" for h in LOOPBACK_HOSTS]
+
+
+def _is_error(result: List[TextContent]) -> bool:
+    """Whether a tool result reports a failure."""
+    return bool(result) and result[0].text.startswith(("Error", "Command failed"))
+
+
+@dataclass
+class SessionState:
+    """Per-session bookkeeping when several MCP clients share one server."""
+
+    semaphore: asyncio.Semaphore
+    created: float = field(default_factory=time.time)
+    calls: int = 0
+    errors: int = 0
+
 
 class NvimcpServer:
     """Nvimcp server that exposes nvim functionality."""
 
-    def __init__(self, nvim: pynvim.Nvim):
+    def __init__(
+        self,
+        nvim: pynvim.Nvim,
+        scratch_buffers: int = 64,
+        max_session_calls: int = 4,
+        recorder: Optional[SessionRecorder] = None,
+        tracer: Optional[Tracer] = None,
+        enable_profile: bool = False,
+        connection: Optional[ConnectionManager] = None,
+        ping_interval: float = 5.0,
+        ping_timeout: float = 2.0,
+        load_plugins: bool = False,
+        coalesce_window: float = 0.0,
+        cache_max_bytes: Optional[int] = 256 << 20,
+        max_rss: Optional[int] = None,
+        maintenance_interval: float = 10.0,
+        minimize_edits: bool = False,
+        index_on_start: bool = False,
+    ):
         self.nvim = nvim
+        # The file index walks and watches the whole cwd, which may be $HOME;
+        # by default it starts with the first find_files or search call
+        self.index_on_start = index_on_start
+        self.connection = connection
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self._health_task: Optional[asyncio.Task] = None
+        self.maintenance_interval = maintenance_interval
+        self._maintenance_task: Optional[asyncio.Task] = None
+        if connection is not None:
+            connection.add_listener(self._on_reconnect)
+        self.enable_profile = enable_profile
+        self.profiler = Profiler()
+        self._nvim_profile: Optional[NvimProfile] = None
+        self.recorder = recorder
+        self.tracer = tracer or Tracer()
+        self.rpc_hooks = RpcHooks()
+        if recorder is not None:
+            self.rpc_hooks.install(nvim)
+            self.rpc_hooks.add(recorder.record_rpc)
+        if self.tracer.enabled:
+            self.rpc_hooks.install(nvim)
+            self.rpc_hooks.add(self.tracer.record_rpc)
+        self.max_session_calls = max_session_calls
+        self._sessions: "weakref.WeakKeyDictionary[Any, SessionState]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.scratch = ScratchPool(scratch_buffers)
+        self.files: Optional[FileIndex] = None
+        self._files_lock = threading.Lock()
+        self._nvim_lock = threading.RLock()
+        self.search_index = TrigramIndex()
+        self.workspace_search = WorkspaceSearch(self.search_index)
+        self.lua_chunks = LuaChunks()
+        self.snapshots = SnapshotStore()
+        self.caches = CacheManager(max_bytes=cache_max_bytes, max_rss=max_rss)
+        self.caches.register("snapshots", self.snapshots)
+        self.caches.register("search_index", self.search_index)
+        self.buffer_inventory = BufferInventory()
+        self.caches.register("buffers", self.buffer_inventory)
+        self.line_hashes = LineHashIndex()
+        self.caches.register("line_hashes", self.line_hashes)
+        self.caches.register("lua_chunks", self.lua_chunks)
+        self.minimize_edits = minimize_edits
+        self.events = EventQueue()
+        self.events.subscribe(["BufUnload", "BufWipeout"], self._on_buffer_gone)
+        self.events.subscribe(
+            BufferInventory.EVENTS,
+            self.buffer_inventory.on_event,
+            self.buffer_inventory.invalidate,
+        )
+        self.edits: Optional[EditCoalescer] = None
+        if coalesce_window > 0:
+            self.edits = EditCoalescer(self._apply_edit_batch, coalesce_window)
+        self.registry = ToolRegistry()
+        self._register_tools()
+        if load_plugins:
+            self.registry.load_entry_points(self)
         self.server = Server("nvimcp", version="0.1.0")
         self._setup_handlers()
 
-    def _setup_handlers(self):
-        """Set up nvimcp server handlers."""
-
-        @self.server.list_tools()
-        async def handle_list_tools() -> List[Tool]:
-            """List available tools."""
-            return [
-                Tool(
-                    name="get_buffer_content",
-                    description="Get content of current or specified buffer",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "buffer_id": {
-                                "type": "integer",
-                                "description": "Buffer ID (optional, defaults to current)",
-                            }
+    def _register_tools(self):
+        """Register the built-in tools."""
+        specs = [
+            ToolSpec(
+                name="get_buffer_content",
+                description="Get content of current or specified buffer",
+                handler=self._get_buffer_content,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "buffer_id": {
+                            "type": "integer",
+                            "description": "Buffer ID (optional, defaults to current)",
+                        },
+                        "snapshot_id": {
+                            "type": "string",
+                            "description": "Read from this snapshot instead of nvim (buffer defaults to the snapshot's current)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="edit_buffer",
+                description="Edit buffer content",
+                handler=self._edit_buffer,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "content": {
+                            "type": "string",
+                            "description": "New content for the buffer",
+                        },
+                        "buffer_id": {
+                            "type": "integer",
+                            "description": "Buffer ID (optional, defaults to current)",
+                        },
+                        "line_start": {
+                            "type": "integer",
+                            "description": "Start line (1-indexed, optional)",
+                        },
+                        "line_end": {
+                            "type": "integer",
+                            "description": "End line (1-indexed, optional)",
+                        },
+                        "snapshot_id": {
+                            "type": "string",
+                            "description": "Only edit if the buffer is unchanged since this snapshot",
+                        },
+                    },
+                    "required": ["content"],
+                },
+            ),
+            ToolSpec(
+                name="snapshot",
+                description="Capture lines and changedticks of several buffers atomically; returns a snapshot id",
+                handler=self._snapshot,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "buffer_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Buffers to capture (default all loaded listed buffers)",
+                        },
+                        "include_content": {
+                            "type": "boolean",
+                            "description": "Also return the captured lines",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="run_command",
+                description="Execute Vim command",
+                handler=self._run_command,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "command": {
+                            "type": "string",
+                            "description": "Vim command to execute",
+                        }
+                    },
+                    "required": ["command"],
+                },
+            ),
+            ToolSpec(
+                name="get_status",
+                description="Get nvim status information",
+                handler=self._get_status,
+                read_only=True,
+                input_schema={"type": "object", "properties": {}},
+            ),
+            ToolSpec(
+                name="list_buffers",
+                description="List buffers with name, filetype, line count, byte size, modified flag and changedtick",
+                handler=self._list_buffers,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "include_unlisted": {
+                            "type": "boolean",
+                            "description": "Also list unlisted buffers (default false)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="save_buffers",
+                description="Write several buffers to their files in one call",
+                handler=self._save_buffers,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "buffer_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Buffers to save (default every modified file buffer)",
+                        },
+                        "autocmds": {
+                            "type": "boolean",
+                            "description": "Run BufWritePre/Post and other write autocmds (default true)",
+                        },
+                        "direct_min_bytes": {
+                            "type": "integer",
+                            "description": f"Without autocmds, buffers this large are written by the server in parallel (default {DIRECT_MIN_BYTES}, -1 = never)",
+                        },
+                        "fsync": {
+                            "type": "boolean",
+                            "description": "fsync each file before reporting it saved (default true)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="get_cache_stats",
+                description="Report cache sizes, memory limits and hit/miss/eviction counters",
+                handler=self._get_cache_stats,
+                read_only=True,
+            ),
+            ToolSpec(
+                name="apply_patch",
+                description="Apply a unified diff to buffers, loading files as needed",
+                handler=self._apply_patch,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "patch": {
+                            "type": "string",
+                            "description": "Unified diff (single or multi-file)",
+                        },
+                        "strip": {
+                            "type": "integer",
+                            "description": "Leading path components to strip, like patch -p (default 1)",
+                        },
+                        "max_offset": {
+                            "type": "integer",
+                            "description": "Max lines a hunk may drift from its header position (default unlimited)",
+                        },
+                        "strict": {
+                            "type": "boolean",
+                            "description": "Leave a buffer untouched if any of its hunks fail (default false)",
+                        },
+                    },
+                    "required": ["patch"],
+                },
+            ),
+            ToolSpec(
+                name="replace",
+                description="Find and replace inside nvim across buffers, files or the argument list",
+                handler=self._replace,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "pattern": {
+                            "type": "string",
+                            "description": "Vim regex (or Lua pattern with engine=lua)",
+                        },
+                        "replacement": {
+                            "type": "string",
+                            "description": "Replacement, as for :substitute (or string.gsub)",
+                        },
+                        "buffer_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Buffers to search (optional)",
+                        },
+                        "files": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Files to search, loaded if needed (optional)",
+                        },
+                        "use_arglist": {
+                            "type": "boolean",
+                            "description": "Also search every file in the argument list",
+                        },
+                        "engine": {
+                            "type": "string",
+                            "enum": list(ENGINES),
+                            "description": "Pattern engine (default vim)",
+                        },
+                        "dry_run": {
+                            "type": "boolean",
+                            "description": "Only count matches and preview changes",
+                        },
+                        "max_preview": {
+                            "type": "integer",
+                            "description": "Preview lines per buffer (default 20)",
+                        },
+                    },
+                    "required": ["pattern", "replacement"],
+                },
+            ),
+            ToolSpec(
+                name="open_files",
+                description="Load files into hidden scratch buffers without filetype, syntax or plugins and return their content",
+                handler=self._open_files,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "paths": {
+                            "type": "array",
+                            "items": {"type": "string"},
+                            "description": "Files to load (relative to nvim cwd)",
+                        },
+                        "max_lines": {
+                            "type": "integer",
+                            "description": "Max lines returned per file (default all)",
+                        },
+                        "include_content": {
+                            "type": "boolean",
+                            "description": "Return file content (default true); false only preloads",
+                        },
+                    },
+                    "required": ["paths"],
+                },
+            ),
+            ToolSpec(
+                name="find_files",
+                description="Find files under the nvim working directory (respects .gitignore)",
+                handler=self._find_files,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "query": {
+                            "type": "string",
+                            "description": "Fuzzy query, path prefix or glob (empty lists all)",
+                        },
+                        "mode": {
+                            "type": "string",
+                            "enum": list(QUERY_MODES),
+                            "description": "Query mode (default fuzzy)",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "description": "Maximum results (default 50)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="search",
+                description="Search loaded buffers (and optionally workspace files) using a trigram index",
+                handler=self._search,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "pattern": {
+                            "type": "string",
+                            "description": "Vim regex, or plain text with literal=true",
+                        },
+                        "literal": {
+                            "type": "boolean",
+                            "description": "Treat pattern as plain text",
+                        },
+                        "ignore_case": {
+                            "type": "boolean",
+                            "description": "Case-insensitive match",
+                        },
+                        "include_files": {
+                            "type": "boolean",
+                            "description": "Also search files under the nvim cwd",
+                        },
+                        "max_results": {
+                            "type": "integer",
+                            "description": "Maximum matching lines (default 100)",
+                        },
+                    },
+                    "required": ["pattern"],
+                },
+            ),
+            ToolSpec(
+                name="get_context",
+                description="Get code around the cursor and in visible windows, sized to a budget",
+                handler=self._get_context,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "max_tokens": {
+                            "type": "integer",
+                            "description": "Approximate token budget (default 2000)",
+                        },
+                        "max_bytes": {
+                            "type": "integer",
+                            "description": "Byte budget (overrides max_tokens)",
+                        },
+                        "all_windows": {
+                            "type": "boolean",
+                            "description": "Include other visible windows (default true)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="diff",
+                description="Unified diff computed in nvim: buffers vs disk, vs another buffer, or vs a snapshot",
+                handler=self._diff,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "target": {
+                            "type": "string",
+                            "enum": list(DIFF_TARGETS),
+                            "description": "Compare against the file on disk, another buffer or a snapshot (default disk)",
+                        },
+                        "buffer_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Buffers to diff (default: modified buffers for disk, all for snapshot)",
+                        },
+                        "other_buffer_id": {
+                            "type": "integer",
+                            "description": "Buffer to compare with for target=buffer",
+                        },
+                        "snapshot_id": {
+                            "type": "string",
+                            "description": "Snapshot to compare with for target=snapshot",
+                        },
+                        "context": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Context lines per hunk (default 3)",
+                        },
+                        "algorithm": {
+                            "type": "string",
+                            "enum": list(ALGORITHMS),
+                            "description": "Diff algorithm (default myers)",
+                        },
+                        "ignore_whitespace": {
+                            "type": "boolean",
+                            "description": "Ignore whitespace changes",
+                        },
+                        "detect_moves": {
+                            "type": "boolean",
+                            "description": "Also list blocks that moved (buffer and snapshot targets)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="find_duplicates",
+                description="Find blocks of identical lines repeated within or across buffers",
+                handler=self._find_duplicates,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "buffer_ids": {
+                            "type": "array",
+                            "items": {"type": "integer"},
+                            "description": "Buffers to search (default all loaded listed buffers)",
+                        },
+                        "min_lines": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "description": "Shortest block reported (default 4)",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 1,
+                            "description": "Max blocks reported, largest first (default 20)",
                         },
                     },
-                ),
-                Tool(
-                    name="edit_buffer",
-                    description="Edit buffer content",
-                    inputSchema={
+                },
+            ),
+            ToolSpec(
+                name="get_quickfix",
+                description="Read a quickfix or location list as structured items, paged, skipping unchanged lists",
+                handler=self._get_quickfix,
+                read_only=True,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "window": {
+                            "type": "integer",
+                            "description": "Window id for its location list (0 = current window); omit for quickfix",
+                        },
+                        "list_id": {
+                            "type": "integer",
+                            "description": "List id (default current list)",
+                        },
+                        "since_changedtick": {
+                            "type": "integer",
+                            "description": "Skip items if the list's changedtick still equals this",
+                        },
+                        "offset": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Index of the first item to return (default 0)",
+                        },
+                        "limit": {
+                            "type": "integer",
+                            "minimum": 0,
+                            "description": "Maximum items to return (default 200)",
+                        },
+                    },
+                },
+            ),
+            ToolSpec(
+                name="set_quickfix",
+                description="Create, replace or append to a quickfix or location list",
+                handler=self._set_quickfix,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "items": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "filename": {"type": "string"},
+                                    "bufnr": {"type": "integer"},
+                                    "lnum": {"type": "integer"},
+                                    "col": {"type": "integer"},
+                                    "end_lnum": {"type": "integer"},
+                                    "end_col": {"type": "integer"},
+                                    "type": {"type": "string"},
+                                    "text": {"type": "string"},
+                                    "valid": {"type": "boolean"},
+                                },
+                            },
+                            "description": "Entries, each with a filename or bufnr",
+                        },
+                        "action": {
+                            "type": "string",
+                            "enum": list(QF_ACTIONS),
+                            "description": "new list, replace or append (default new)",
+                        },
+                        "title": {"type": "string", "description": "List title"},
+                        "window": {
+                            "type": "integer",
+                            "description": "Window id for its location list (0 = current window); omit for quickfix",
+                        },
+                        "list_id": {
+                            "type": "integer",
+                            "description": "List to replace or append to (default current)",
+                        },
+                    },
+                    "required": ["items"],
+                },
+            ),
+            ToolSpec(
+                name="exec_lua",
+                description="Register a Lua chunk once and call it by handle, optionally many times in one request",
+                handler=self._exec_lua,
+                input_schema={
+                    "type": "object",
+                    "properties": {
+                        "code": {
+                            "type": "string",
+                            "description": "Lua chunk taking its arguments as ...; alone it is only registered",
+                        },
+                        "handle": {
+                            "type": "string",
+                            "description": "Handle returned for a registered chunk",
+                        },
+                        "args": {
+                            "type": "array",
+                            "description": "Arguments for a single call",
+                        },
+                        "calls": {
+                            "type": "array",
+                            "items": {
+                                "type": "object",
+                                "properties": {
+                                    "handle": {"type": "string"},
+                                    "args": {"type": "array"},
+                                },
+                            },
+                            "description": "Batch of calls, each with args and an optional handle",
+                        },
+                        "stop_on_error": {
+                            "type": "boolean",
+                            "description": "Stop the batch at the first failing call",
+                        },
+                    },
+                },
+            ),
+        ]
+        if self.connection is not None and self.connection.mode == "embedded":
+            specs.append(
+                ToolSpec(
+                    name="restart_nvim",
+                    description="Replace the embedded nvim with a fresh instance, discarding its state",
+                    handler=self._restart_nvim,
+                )
+            )
+        if self.enable_profile:
+            specs.append(
+                ToolSpec(
+                    name="profile",
+                    description="Start or stop profiling the server and nvim, and report hot spots",
+                    handler=self._profile,
+                    input_schema={
                         "type": "object",
                         "properties": {
-                            "content": {
+                            "action": {
                                 "type": "string",
-                                "description": "New content for the buffer",
+                                "enum": ["start", "stop", "status"],
+                                "description": "What to do (default status)",
                             },
-                            "buffer_id": {
-                                "type": "integer",
-                                "description": "Buffer ID (optional, defaults to current)",
+                            "nvim": {
+                                "type": "boolean",
+                                "description": "Also run :profile and Lua timing in nvim (default true)",
                             },
-                            "line_start": {
-                                "type": "integer",
-                                "description": "Start line (1-indexed, optional)",
+                            "sort": {
+                                "type": "string",
+                                "enum": list(SORT_KEYS),
+                                "description": "Python hot spot order (default tottime)",
                             },
-                            "line_end": {
+                            "limit": {
                                 "type": "integer",
-                                "description": "End line (1-indexed, optional)",
+                                "description": "Rows per section (default 20)",
                             },
                         },
-                        "required": ["content"],
-                    },
-                ),
-                Tool(
-                    name="run_command",
-                    description="Execute Vim command",
-                    inputSchema={
-                        "type": "object",
-                        "properties": {
-                            "command": {
-                                "type": "string",
-                                "description": "Vim command to execute",
-                            }
-                        },
-                        "required": ["command"],
                     },
-                ),
-                Tool(
-                    name="get_status",
-                    description="Get nvim status information",
-                    inputSchema={"type": "object", "properties": {}},
-                ),
-            ]
+                )
+            )
+        for spec in specs:
+            self.registry.register(spec)
 
-        @self.server.call_tool()
+    def _setup_handlers(self):
+        """Set up nvimcp server handlers."""
+
+        @self.server.list_tools()
+        async def handle_list_tools() -> List[Tool]:
+            """List available tools."""
+            return self.registry.tools()
+
+        # Arguments are checked by the registry's compiled validators instead
+        # of mcp's per-call jsonschema validation.
+        @self.server.call_tool(validate_input=False)
         async def handle_call_tool(
             name: str, arguments: Dict[str, Any]
         ) -> List[TextContent]:
             """Handle tool calls."""
-            try:
-                if name == "get_buffer_content":
-                    return await self._get_buffer_content(**arguments)
-                elif name == "edit_buffer":
-                    return await self._edit_buffer(**arguments)
-                elif name == "run_command":
-                    return await self._run_command(**arguments)
-                elif name == "get_status":
-                    return await self._get_status(**arguments)
+            return await self.call_tool(name, arguments)
+
+        # Wrap the registered request handler so a trace also covers the
+        # time mcp spends validating and encoding the result.
+        call_handler = self.server.request_handlers[CallToolRequest]
+
+        async def traced_call_handler(request: CallToolRequest):
+            with self.tracer.span("mcp:call_tool", "mcp", tool=request.params.name):
+                return await call_handler(request)
+
+        self.server.request_handlers[CallToolRequest] = traced_call_handler
+
+    async def call_tool(
+        self, name: str, arguments: Dict[str, Any]
+    ) -> List[TextContent]:
+        """Run a tool by name, applying per-session limits and recording."""
+        token = retry_safe.set(self.registry.read_only(name))
+        try:
+            with self.tracer.span(f"tool:{name}", "tool"), self.profiler.measure(name):
+                state = self._session_state()
+                if state is None:
+                    return await self._recorded_call(name, arguments)
+                state.calls += 1
+                if self.edits is not None and self._coalesced(name, arguments):
+                    # Waiting out the coalescing window must not hold a
+                    # session slot, or bursts are cut into max_session_calls
+                    result = await self._recorded_call(name, arguments)
                 else:
-                    return [TextContent(type="text", text=f"Unknown tool: {name}")]
-            except Exception as e:
-                logger.error(f"Tool {name} failed: {e}")
-                return [TextContent(type="text", text=f"Error: {e}")]
+                    async with state.semaphore:
+                        result = await self._recorded_call(name, arguments)
+        finally:
+            retry_safe.reset(token)
+        if _is_error(result):
+            state.errors += 1
+        return result
+
+    async def _recorded_call(
+        self, name: str, arguments: Dict[str, Any]
+    ) -> List[TextContent]:
+        if self.recorder is None:
+            return await self._dispatch(name, arguments)
+        call_id = self.recorder.next_id()
+        token = current_call.set(call_id)
+        start = time.perf_counter()
+        try:
+            result = await self._dispatch(name, arguments)
+        finally:
+            current_call.reset(token)
+        self.recorder.record_call(
+            call_id,
+            name,
+            arguments,
+            start,
+            time.perf_counter() - start,
+            not _is_error(result),
+            sum(len(r.text) for r in result),
+        )
+        return result
+
+    async def _dispatch(
+        self, name: str, arguments: Dict[str, Any]
+    ) -> List[TextContent]:
+        """Validate arguments and run the registered tool."""
+        spec = self.registry.get(name)
+        if spec is None:
+            return [TextContent(type="text", text=f"Unknown tool: {name}")]
+        try:
+            arguments = spec.validate(arguments)
+        except ToolArgumentError as e:
+            return [
+                TextContent(
+                    type="text", text=f"Error: invalid arguments for {name}: {e}"
+                )
+            ]
+        if (
+            self.edits is not None
+            and not self.edits.idle
+            and not self._coalesced(name, arguments)
+        ):
+            # Anything else may read what the queued edits change
+            await self.edits.flush()
+        try:
+            return await spec.handler(**arguments)
+        except Exception as e:
+            logger.error(f"Tool {name} failed: {e}")
+            return [TextContent(type="text", text=f"Error: {e}")]
 
-    async def _get_buffer_content(self, buffer_id: int = None) -> List[TextContent]:
+    async def _get_buffer_content(
+        self, buffer_id: int = None, snapshot_id: str = None
+    ) -> List[TextContent]:
         """Get buffer content."""
         try:
+            if snapshot_id is not None:
+                state = self.snapshots.get(snapshot_id).buffer(buffer_id)
+                return [TextContent(type="text", text="\n".join(state.lines))]
             # Run in thread to avoid blocking async event loop
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, self._sync_get_buffer_content, buffer_id
-            )
+            result = await self._run_sync(self._sync_get_buffer_content, buffer_id)
             return [TextContent(type="text", text=result)]
         except Exception as e:
             return [TextContent(type="text", text=f"Error getting buffer content: {e}")]
@@ -132,17 +892,83 @@ class NvimcpServer:
         buffer_id: int = None,
         line_start: int = None,
         line_end: int = None,
+        snapshot_id: str = None,
     ) -> List[TextContent]:
         """Edit buffer content."""
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                None, self._sync_edit_buffer, content, buffer_id, line_start, line_end
+            if snapshot_id is not None:
+                tick = await self._run_sync(
+                    self._sync_edit_if_unchanged,
+                    snapshot_id,
+                    content,
+                    buffer_id,
+                    line_start,
+                    line_end,
+                )
+                return [
+                    TextContent(
+                        type="text",
+                        text=f"Buffer updated successfully (changedtick {tick})",
+                    )
+                ]
+            if self.edits is not None and self._coalesced(
+                "edit_buffer", {"buffer_id": buffer_id, "line_start": line_start}
+            ):
+                start, end = self._edit_range(line_start, line_end)
+                await self.edits.submit(buffer_id, start, end, content.split("\n"))
+                return [TextContent(type="text", text="Buffer updated successfully")]
+            await self._run_sync(
+                self._sync_edit_buffer, content, buffer_id, line_start, line_end
             )
             return [TextContent(type="text", text="Buffer updated successfully")]
         except Exception as e:
             return [TextContent(type="text", text=f"Error editing buffer: {e}")]
 
+    @staticmethod
+    def _edit_range(line_start: Optional[int], line_end: Optional[int]):
+        """0-based, end-exclusive range replaced by edit_buffer (-1 = end)."""
+        if line_start is None:
+            return 0, -1
+        return line_start - 1, -1 if line_end is None else line_end
+
+    def _coalesced(self, name: str, arguments: Dict[str, Any]) -> bool:
+        """Whether a call goes through the edit coalescer."""
+        return (
+            name == "edit_buffer"
+            and arguments.get("buffer_id") is not None
+            and arguments.get("snapshot_id") is None
+            # Minimized whole-buffer edits must see the buffer as it is
+            and not (self.minimize_edits and arguments.get("line_start") is None)
+        )
+
+    async def _apply_edit_batch(self, buffer_id: int, edits: List[List[Any]]):
+        # Whichever call flushed the batch, it must not be replayed
+        retry_safe.set(False)
+        return await self._run_sync(self._lua, EDIT_BATCH_LUA, buffer_id, edits)
+
+    def _sync_edit_if_unchanged(
+        self,
+        snapshot_id: str,
+        content: str,
+        buffer_id: int = None,
+        line_start: int = None,
+        line_end: int = None,
+    ) -> int:
+        """Edit a buffer only if it still matches a snapshot; returns its new tick."""
+        snap = self.snapshots.get(snapshot_id)
+        bufnr = snap.current if buffer_id is None else buffer_id
+        state = snap.buffer(bufnr)
+        first, last = self._edit_range(line_start, line_end)
+        result = self._lua(
+            EDIT_IF_UNCHANGED_LUA, bufnr, state.tick, first, last, content.split("\n")
+        )
+        if not result["ok"]:
+            raise SnapshotError(
+                f"buffer {bufnr} changed since {snap.id} "
+                f"(changedtick {state.tick} -> {result['tick']})"
+            )
+        return result["tick"]
+
     def _sync_edit_buffer(
         self,
         content: str,
@@ -158,18 +984,49 @@ class NvimcpServer:
 
         lines = content.split("\n")
 
-        if line_start is not None and line_end is not None:
+        if self.minimize_edits and line_start is None:
+            self._sync_replace_minimal(buffer, lines)
+        elif line_start is not None and line_end is not None:
             buffer[line_start - 1 : line_end] = lines
         elif line_start is not None:
             buffer[line_start - 1 :] = lines
         else:
             buffer[:] = lines
 
+    def _sync_replace_minimal(self, buffer, lines: List[str]):
+        """
+        Replace a whole buffer by setting only the lines that differ.
+
+        The range is planned from line hashes; SPLICE_LUA checks the lines
+        around it and anything unexpected falls back to setting every line.
+        """
+        state = self.line_hashes.sync(self._lua, [buffer.number]).get(buffer.number)
+        if state is None:
+            buffer[:] = lines
+            return
+        start, old_end, new_end = minimal_splice(state.hashes, hash_lines(lines))
+        if start == old_end == new_end:
+            return
+        result = self._lua(
+            SPLICE_LUA,
+            buffer.number,
+            state.tick,
+            start,
+            old_end,
+            lines[start:new_end],
+            lines[start - 1] if start > 0 else None,
+            lines[new_end] if new_end < len(lines) else None,
+        )
+        if not result["ok"]:
+            if result.get("mismatch"):
+                # Hashes matched where the text does not; resync in full
+                self.line_hashes.drop_buffer(buffer.number)
+            buffer[:] = lines
+
     async def _run_command(self, command: str) -> List[TextContent]:
         """Execute Vim command."""
         try:
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(None, self._sync_run_command, command)
+            result = await self._run_sync(self._sync_run_command, command)
             return [
                 TextContent(type="text", text=result or "Command executed successfully")
             ]
@@ -183,40 +1040,870 @@ class NvimcpServer:
     async def _get_status(self) -> List[TextContent]:
         """Get Neovim status."""
         try:
-            # Run in thread executor to avoid event loop conflicts
-            import concurrent.futures
-            import threading
-
-            # Use a separate thread pool for Neovim operations
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(self._sync_get_status)
-                status = future.result(timeout=5.0)
-
+            status = await asyncio.wait_for(
+                self._run_sync(self._sync_get_status), timeout=5.0
+            )
             return [TextContent(type="text", text=status)]
         except Exception as e:
             return [TextContent(type="text", text=f"Error getting status: {e}")]
 
     def _sync_get_status(self) -> str:
         """Synchronous status retrieval."""
+        # Use direct request calls instead of convenience properties
+        info = {
+            "mode": self.nvim.request("nvim_get_mode"),
+            "current_buffer": self.nvim.request("nvim_get_current_buf"),
+            "buffer_count": len(self.nvim.request("nvim_list_bufs")),
+            "window_count": len(self.nvim.request("nvim_list_wins")),
+            "cursor_position": self.nvim.request("nvim_win_get_cursor", 0),
+            "working_directory": self.nvim.request("nvim_eval", "getcwd()"),
+        }
+        if self.connection is not None and self.connection.startup is not None:
+            info["startup"] = self.connection.startup.format()
+        return "\n".join(f"{k}: {v}" for k, v in info.items())
+
+    async def _list_buffers(self, include_unlisted: bool = False) -> List[TextContent]:
+        """List buffers from the event-patched inventory."""
+        try:
+            result = await self._run_sync(self._sync_list_buffers, include_unlisted)
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error listing buffers: {e}")]
+
+    def _sync_list_buffers(self, include_unlisted: bool = False) -> str:
+        self.events.drain(self._lua)
+        self.buffer_inventory.refresh(self._lua)
+        return format_buffers(self.buffer_inventory.buffers(include_unlisted))
+
+    async def _save_buffers(
+        self,
+        buffer_ids: Optional[List[int]] = None,
+        autocmds: bool = True,
+        direct_min_bytes: int = DIRECT_MIN_BYTES,
+        fsync: bool = True,
+    ) -> List[TextContent]:
+        """Write buffers, large ones from the server without holding nvim."""
+        try:
+            results = await self._run_sync(
+                self._lua, SAVE_LUA, buffer_ids, autocmds, direct_min_bytes, fsync
+            )
+            direct = [r for r in results if r.get("direct")]
+            if direct:
+                jobs = [
+                    (
+                        r["name"],
+                        encode_lines(
+                            r.pop("lines"), r["fileformat"], r["eol"], r["bomb"]
+                        ),
+                    )
+                    for r in direct
+                ]
+                errors = await self._in_executor(write_files, jobs, fsync)
+                del jobs
+                for r, error in zip(direct, errors):
+                    if error:
+                        r["error"] = error
+                written = [r for r in direct if not r.get("error")]
+                if written:
+                    marked = await self._run_sync(
+                        self._lua,
+                        MARK_SAVED_LUA,
+                        [[r["buf"], r["tick"]] for r in written],
+                    )
+                    for r, ok in zip(written, marked):
+                        r["written"] = True
+                        r["changed"] = not ok
+            return [TextContent(type="text", text=format_save_results(results))]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error saving buffers: {e}")]
+
+    async def _get_cache_stats(self) -> List[TextContent]:
+        """Report cache accounting."""
+        try:
+            text = format_cache_report(self.caches.report())
+            text += (
+                f"\nnvim events: {self.events.drained} drained, "
+                f"{self.events.resyncs} resyncs"
+            )
+            return [TextContent(type="text", text=text)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error getting cache stats: {e}")]
+
+    async def _apply_patch(
+        self,
+        patch: str,
+        strip: int = 1,
+        max_offset: int = -1,
+        strict: bool = False,
+    ) -> List[TextContent]:
+        """Apply a unified diff."""
+        try:
+            result = await self._run_sync(
+                self._sync_apply_patch, patch, strip, max_offset, strict
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error applying patch: {e}")]
+
+    def _sync_apply_patch(
+        self,
+        patch: str,
+        strip: int = 1,
+        max_offset: int = -1,
+        strict: bool = False,
+    ) -> str:
+        """Synchronous patch application, one nvim call for all files."""
+        patches = parse_unified_diff(patch, strip)
+        results = self._lua(
+            APPLY_PATCH_LUA, patches_to_lua(patches), max_offset, strict
+        )
+        return format_patch_results(results)
+
+    async def _replace(
+        self,
+        pattern: str,
+        replacement: str,
+        buffer_ids: List[int] = None,
+        files: List[str] = None,
+        use_arglist: bool = False,
+        engine: str = "vim",
+        dry_run: bool = False,
+        max_preview: int = 20,
+    ) -> List[TextContent]:
+        """Find and replace across buffers."""
         try:
-            # Use direct request calls instead of convenience properties
-            info = {
-                "mode": self.nvim.request("nvim_get_mode"),
-                "current_buffer": self.nvim.request("nvim_get_current_buf"),
-                "buffer_count": len(self.nvim.request("nvim_list_bufs")),
-                "window_count": len(self.nvim.request("nvim_list_wins")),
-                "cursor_position": self.nvim.request("nvim_win_get_cursor", 0),
-                "working_directory": self.nvim.request("nvim_eval", "getcwd()"),
+            result = await self._run_sync(
+                self._sync_replace,
+                pattern,
+                replacement,
+                buffer_ids,
+                files,
+                use_arglist,
+                engine,
+                dry_run,
+                max_preview,
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error replacing: {e}")]
+
+    def _sync_replace(
+        self,
+        pattern: str,
+        replacement: str,
+        buffer_ids: List[int] = None,
+        files: List[str] = None,
+        use_arglist: bool = False,
+        engine: str = "vim",
+        dry_run: bool = False,
+        max_preview: int = 20,
+    ) -> str:
+        """Synchronous find/replace, one nvim call for all buffers."""
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        if not pattern:
+            raise ValueError("Pattern must not be empty")
+        targets = build_targets(buffer_ids, files, use_arglist)
+        results = self._lua(
+            REPLACE_LUA,
+            targets,
+            pattern,
+            replacement,
+            engine,
+            dry_run,
+            max_preview,
+        )
+        return format_replace_results(results, dry_run)
+
+    async def _open_files(
+        self, paths: List[str], max_lines: int = 0, include_content: bool = True
+    ) -> List[TextContent]:
+        """Load files into scratch buffers."""
+        try:
+            result = await self._run_sync(
+                self._sync_open_files, paths, max_lines, include_content
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error opening files: {e}")]
+
+    def _sync_open_files(
+        self, paths: List[str], max_lines: int = 0, include_content: bool = True
+    ) -> str:
+        """Synchronous batch load and LRU eviction in one nvim call."""
+        result = self._lua(
+            LOAD_FILES_LUA,
+            paths,
+            max_lines,
+            include_content,
+            self.scratch.lru_order(),
+            self.scratch.capacity,
+        )
+        self.scratch.update(result)
+        return format_files(result, include_content)
+
+    async def _find_files(
+        self, query: str = "", mode: str = "fuzzy", limit: int = 50
+    ) -> List[TextContent]:
+        """Query the workspace file index."""
+        try:
+            # Not _run_sync: waiting for the index must not hold the nvim lock
+            result = await self._in_executor(self._sync_find_files, query, mode, limit)
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error finding files: {e}")]
+
+    def _sync_find_files(
+        self, query: str = "", mode: str = "fuzzy", limit: int = 50
+    ) -> str:
+        """Synchronous file index query."""
+        index = self._locked(self._sync_file_index)
+        complete = index.wait(timeout=10.0)
+        paths = index.query(query, mode, limit)
+        lines = list(paths) if paths else ["No matching files"]
+        if not complete:
+            lines.insert(0, "(index still building, results may be incomplete)")
+        return "\n".join(lines)
+
+    def _sync_file_index(self) -> FileIndex:
+        """Return the file index for the nvim cwd, (re)starting it if needed."""
+        root = os.path.abspath(self.nvim.request("nvim_eval", "getcwd()"))
+        with self._files_lock:
+            if self.files is None or self.files.root != root:
+                if self.files is not None:
+                    self.files.close()
+                self.files = FileIndex(root)
+                self.files.start()
+            return self.files
+
+    async def _search(
+        self,
+        pattern: str,
+        literal: bool = False,
+        ignore_case: bool = False,
+        include_files: bool = False,
+        max_results: int = 100,
+    ) -> List[TextContent]:
+        """Indexed text search."""
+        try:
+            result = await self._run_sync(
+                self._sync_search,
+                pattern,
+                literal,
+                ignore_case,
+                include_files,
+                max_results,
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error searching: {e}")]
+
+    def _sync_search(
+        self,
+        pattern: str,
+        literal: bool = False,
+        ignore_case: bool = False,
+        include_files: bool = False,
+        max_results: int = 100,
+    ) -> str:
+        """Narrow candidates with the trigram index, then confirm in nvim."""
+        if not pattern:
+            raise ValueError("Pattern must not be empty")
+        self._sync_index_buffers()
+        required = required_trigrams(pattern, literal)
+        bufs = [
+            int(k[len("buf:") :])
+            for k in self.search_index.candidates(required, "buf:")
+        ]
+        files = []
+        if include_files:
+            self.workspace_search.attach(self._sync_file_index())
+            files = self.workspace_search.candidates(required)
+        result = self._lua(
+            SEARCH_LUA,
+            bufs,
+            files,
+            vim_pattern(pattern, literal, ignore_case),
+            max_results,
+        )
+        lines = [f"{name}:{lnum}: {text}" for name, lnum, text in result["matches"]]
+        if not lines:
+            return "No matches"
+        if result.get("truncated"):
+            lines.append(f"(stopped after {max_results} matches)")
+        return "\n".join(lines)
+
+    def _sync_index_buffers(self):
+        """Re-index buffers whose changedtick moved, in one nvim call."""
+        known = {
+            int(k[len("buf:") :]): self.search_index.stamp(k)[0]
+            for k in self.search_index.keys("buf:")
+        }
+        items = self._lua(SYNC_BUFFERS_LUA, known, self.search_index.max_doc_bytes)
+        live = set()
+        for item in items:
+            key = f"buf:{item['bufnr']}"
+            live.add(key)
+            if "text" in item or item.get("large"):
+                self.search_index.add(key, item.get("text"), (item["tick"],))
+        for key in self.search_index.keys("buf:"):
+            if key not in live:
+                self.search_index.remove(key)
+
+    async def _snapshot(
+        self, buffer_ids: List[int] = None, include_content: bool = False
+    ) -> List[TextContent]:
+        """Capture several buffers in one atomic call."""
+        try:
+            result = await self._run_sync(self._lua, SNAPSHOT_LUA, buffer_ids)
+            snap = self.snapshots.add(result)
+            return [
+                TextContent(type="text", text=format_snapshot(snap, include_content))
+            ]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error taking snapshot: {e}")]
+
+    async def _diff(
+        self,
+        target: str = "disk",
+        buffer_ids: List[int] = None,
+        other_buffer_id: int = None,
+        snapshot_id: str = None,
+        context: int = 3,
+        algorithm: str = "myers",
+        ignore_whitespace: bool = False,
+        detect_moves: bool = False,
+    ) -> List[TextContent]:
+        """Diff buffers inside nvim."""
+        try:
+            if detect_moves and target == "disk":
+                raise ValueError("detect_moves needs target=buffer or snapshot")
+            snap = self.snapshots.get(snapshot_id) if snapshot_id else None
+            specs = build_diff_specs(target, buffer_ids, other_buffer_id, snap)
+            opts = {
+                "context": context,
+                "algorithm": algorithm,
+                "ignore_whitespace": ignore_whitespace,
             }
-            return "\n".join(f"{k}: {v}" for k, v in info.items())
+            result = await self._run_sync(
+                self._sync_diff, specs, opts, snap, detect_moves
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error computing diff: {e}")]
+
+    def _sync_diff(
+        self, specs, opts: Dict[str, Any], snapshot, detect_moves: bool = False
+    ) -> str:
+        """Diff in one call; snapshot lines are sent only for buffers that moved."""
+        results = self._lua(DIFF_LUA, specs, opts)
+        if snapshot is not None:
+            pending, resend = with_lines(specs, results, snapshot)
+            if pending:
+                retried = self._lua(DIFF_LUA, resend, opts)
+                for i, result in zip(pending, retried):
+                    results[i] = result
+        if detect_moves:
+            self._add_moves(specs, results, snapshot)
+        return format_diffs(results)
+
+    def _add_moves(self, specs, results, snapshot):
+        """Attach moved blocks to diffs with hunks, from line hashes."""
+        changed = [(s, r) for s, r in zip(specs, results) if r.get("hunks")]
+        bufs = {s["buf"] for s, _ in changed} | {
+            s["other"] for s, _ in changed if "other" in s
+        }
+        current = self.line_hashes.sync(self._lua, sorted(bufs))
+        for spec, result in changed:
+            new = current.get(spec.get("other", spec["buf"]))
+            if "other" in spec:
+                old = current.get(spec["buf"])
+                old = old.hashes if old is not None else None
+            else:
+                old = hash_lines(snapshot.buffer(spec["buf"]).lines)
+            if old is not None and new is not None:
+                result["moves"] = moved_blocks(old, new.hashes)
+
+    async def _find_duplicates(
+        self, buffer_ids: List[int] = None, min_lines: int = 4, limit: int = 20
+    ) -> List[TextContent]:
+        """Report repeated blocks; only the hash sync holds nvim."""
+        try:
+            hashes, names = await self._run_sync(self._sync_line_hashes, buffer_ids)
+            found = await self._in_executor(find_duplicates, hashes, min_lines, limit)
+            return [TextContent(type="text", text=format_duplicates(found, names))]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error finding duplicates: {e}")]
+
+    def _sync_line_hashes(self, buffer_ids: Optional[List[int]] = None):
+        """Line hashes and names of the given (or all loaded listed) buffers."""
+        self.events.drain(self._lua)
+        self.buffer_inventory.refresh(self._lua)
+        infos = {b["buf"]: b for b in self.buffer_inventory.buffers(True)}
+        if buffer_ids is None:
+            buffer_ids = [b for b, i in infos.items() if i["loaded"] and i["listed"]]
+        synced = self.line_hashes.sync(self._lua, buffer_ids)
+        hashes = {b: state.hashes for b, state in synced.items()}
+        names = {b: infos[b]["name"] for b in synced if infos.get(b, {}).get("name")}
+        return hashes, names
+
+    async def _get_quickfix(
+        self,
+        window: int = None,
+        list_id: int = None,
+        since_changedtick: int = None,
+        offset: int = 0,
+        limit: int = 200,
+    ) -> List[TextContent]:
+        """Read a page of a quickfix or location list."""
+        try:
+            result = await self._run_sync(
+                self._lua, GET_QF_LUA, window, list_id, since_changedtick, offset, limit
+            )
+            return [TextContent(type="text", text=format_list(result))]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error reading list: {e}")]
+
+    async def _set_quickfix(
+        self,
+        items: List[Dict[str, Any]],
+        action: str = "new",
+        title: str = None,
+        window: int = None,
+        list_id: int = None,
+    ) -> List[TextContent]:
+        """Write a quickfix or location list."""
+        try:
+            flag = action_flag(action)
+            result = await self._run_sync(
+                self._lua, SET_QF_LUA, window, list_id, flag, build_items(items), title
+            )
+            return [TextContent(type="text", text=format_list(result))]
         except Exception as e:
-            return f"Error getting status: {e}"
+            return [TextContent(type="text", text=f"Error writing list: {e}")]
+
+    async def _exec_lua(
+        self,
+        code: str = None,
+        handle: str = None,
+        args: List[Any] = None,
+        calls: List[Dict[str, Any]] = None,
+        stop_on_error: bool = False,
+    ) -> List[TextContent]:
+        """Register and call cached Lua chunks."""
+        try:
+            if code is not None:
+                handle = self.lua_chunks.add(code)
+            if calls is not None:
+                batch = [[c.get("handle", handle), c.get("args", [])] for c in calls]
+                if any(h is None for h, _ in batch):
+                    raise ValueError("every call needs a handle (or pass code)")
+            elif handle is None:
+                raise ValueError("pass code or handle")
+            elif code is not None and args is None:
+                batch = []
+            else:
+                batch = [[handle, args or []]]
+            result = await self._run_sync(
+                self._sync_exec_lua, handle, batch, stop_on_error
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error executing Lua: {e}")]
+
+    def _sync_exec_lua(
+        self, handle: Optional[str], batch: List[List[Any]], stop_on_error: bool
+    ) -> str:
+        if handle is not None and handle in self.lua_chunks:
+            self.lua_chunks.register(self.nvim.exec_lua, [handle])
+        results = (
+            self.lua_chunks.batch(self.nvim.exec_lua, batch, stop_on_error)
+            if batch
+            else []
+        )
+        return format_lua_results(handle, results)
+
+    async def _get_context(
+        self, max_tokens: int = None, max_bytes: int = None, all_windows: bool = True
+    ) -> List[TextContent]:
+        """Get budgeted context around the cursor and visible windows."""
+        try:
+            result = await self._run_sync(
+                self._sync_get_context, max_tokens, max_bytes, all_windows
+            )
+            return [TextContent(type="text", text=result)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error getting context: {e}")]
+
+    def _sync_get_context(
+        self, max_tokens: int = None, max_bytes: int = None, all_windows: bool = True
+    ) -> str:
+        """Synchronous context gathering in one nvim call."""
+        budget = budget_bytes(max_tokens, max_bytes)
+        return format_context(self._lua(CONTEXT_LUA, budget, all_windows))
+
+    async def _restart_nvim(self) -> List[TextContent]:
+        """Restart the embedded nvim."""
+        try:
+            await self._run_sync(self.connection.restart)
+            startup = self.connection.startup
+            text = f"Restarted nvim (generation {self.connection.generation})"
+            if startup is not None:
+                text += f": {startup.format()}"
+            return [TextContent(type="text", text=text)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error restarting nvim: {e}")]
+
+    async def _profile(
+        self,
+        action: str = "status",
+        nvim: bool = True,
+        sort: str = "tottime",
+        limit: int = 20,
+    ) -> List[TextContent]:
+        """Control the profiler."""
+        try:
+            if action == "start":
+                text = await self._profile_start(nvim)
+            elif action == "stop":
+                text = await self._profile_stop(sort, limit)
+            elif action == "status":
+                if self.profiler.active:
+                    text = f"Profiling for {self.profiler.elapsed():.2f}s"
+                else:
+                    text = "Profiling is not running"
+            else:
+                raise ValueError(f"Unknown action: {action}")
+            return [TextContent(type="text", text=text)]
+        except Exception as e:
+            return [TextContent(type="text", text=f"Error profiling: {e}")]
+
+    async def _profile_start(self, nvim: bool) -> str:
+        if self.profiler.active:
+            raise RuntimeError("Profiling is already running")
+        text = "Profiling started"
+        if nvim:
+            profile = NvimProfile()
+            try:
+                jit = await self._run_sync(
+                    self._lua, NVIM_PROFILE_LUA, "start", profile.log, profile.jit_log
+                )
+                self._nvim_profile = profile
+                if not jit:
+                    text += " (LuaJIT profiler unavailable)"
+            except Exception as e:
+                profile.cleanup()
+                text += f" (nvim profiling unavailable: {e})"
+        # Started last so the nvim setup above is not part of the profile
+        self.profiler.start()
+        return text
+
+    async def _profile_stop(self, sort: str, limit: int) -> str:
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        elapsed = self.profiler.elapsed()
+        tools = self.profiler.tool_totals()
+        stats = self.profiler.stop()
+        python = hot_spots(stats, sort, limit) if stats is not None else []
+        profile, self._nvim_profile = self._nvim_profile, None
+        lua: Dict[str, List[float]] = {}
+        vim_profile, jit_report, error = None, "", None
+        if profile is not None:
+            try:
+                result = await self._run_sync(self._lua, NVIM_PROFILE_LUA, "stop")
+                lua = {name: [calls, ns] for name, calls, ns in result["timings"]}
+                error = result.get("error")
+                vim_profile = parse_vim_profile(profile.read(profile.log), limit)
+                jit_report = profile.read(profile.jit_log)
+            except Exception as e:
+                error = str(e)
+            finally:
+                profile.cleanup()
+        return format_profile(
+            elapsed, tools, lua, python, vim_profile, jit_report, limit, error
+        )
+
+    async def _run_sync(self, func, *args):
+        """Run a blocking nvim operation in the executor, one at a time."""
+        return await self._in_executor(self._locked, func, *args)
+
+    async def run_sync(self, func, *args):
+        """
+        Run func(*args) with exclusive use of the nvim connection.
+
+        For plugin tool handlers; func runs on an executor thread and may
+        call self.nvim freely.
+        """
+        return await self._run_sync(func, *args)
+
+    async def _in_executor(self, func, *args):
+        """Run a blocking function in the executor with the caller's context."""
+        loop = asyncio.get_event_loop()
+        ctx = contextvars.copy_context()
+        if self.profiler.active:
+            func, args = self.profiler.run, (func, *args)
+        if not self.tracer.enabled:
+            return await loop.run_in_executor(None, ctx.run, func, *args)
+        submitted = time.perf_counter()
+
+        def traced():
+            started = time.perf_counter()
+            self.tracer.record(
+                "executor:queue", "executor", submitted, started - submitted
+            )
+            with self.tracer.span("executor:run", "executor"):
+                return func(*args)
+
+        return await loop.run_in_executor(None, ctx.run, traced)
+
+    def _locked(self, func, *args):
+        if not self.tracer.enabled:
+            with self._nvim_lock:
+                return self._supervised(func, *args)
+        start = time.perf_counter()
+        with self._nvim_lock:
+            self.tracer.record(
+                "nvim:lock_wait", "executor", start, time.perf_counter() - start
+            )
+            return self._supervised(func, *args)
+
+    def _supervised(self, func, *args):
+        """Call func, reconnecting if nvim went away; reads are retried once."""
+        if self.connection is None:
+            return func(*args)
+        generation = self.connection.generation
+        try:
+            return func(*args)
+        except Exception as e:
+            if not is_disconnect(e):
+                raise
+            logger.warning(f"Lost connection to nvim: {e}")
+            self.connection.reconnect(generation)
+            if not retry_safe.get():
+                raise NvimDisconnected(
+                    "nvim connection was lost and has been re-established; "
+                    "the call was not retried because it may modify state"
+                ) from e
+            return func(*args)
+
+    def _on_reconnect(self, nvim: pynvim.Nvim):
+        """Point at a new nvim and drop state that described the old one."""
+        self.nvim = nvim
+        if self.rpc_hooks.installed:
+            self.rpc_hooks.install(nvim)
+        self.scratch.clear()
+        for key in self.search_index.keys("buf:"):
+            self.search_index.remove(key)
+        self._nvim_profile = None
+        self.lua_chunks.reset()
+        self.snapshots.clear()
+        self.buffer_inventory.invalidate()
+        self.line_hashes.invalidate()
+
+    def _on_buffer_gone(self, event: str, bufnr: int):
+        self.caches.drop_buffer(bufnr)
+        if event == "BufWipeout":
+            self.scratch.discard(bufnr)
+
+    def _sync_maintain(self):
+        """Apply buffer events queued in nvim, then enforce cache limits."""
+        self.events.drain(self._lua)
+        self.caches.enforce()
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                await self._run_sync(self._sync_maintain)
+            except Exception as e:
+                logger.error(f"Cache maintenance error: {e}")
+
+    def _sync_ping(self):
+        """Health check; skipped while a tool call holds the connection."""
+        if not self._nvim_lock.acquire(blocking=False):
+            return
+        try:
+            generation = self.connection.generation
+            try:
+                self.nvim.request("nvim_get_mode")
+            except Exception as e:
+                if not is_disconnect(e):
+                    raise
+                logger.warning(f"nvim health check failed: {e}")
+                self.connection.reconnect(generation)
+        finally:
+            self._nvim_lock.release()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                await asyncio.wait_for(
+                    self._in_executor(self._sync_ping), timeout=self.ping_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("nvim did not answer the health check in time")
+            except Exception as e:
+                logger.error(f"nvim health check error: {e}")
+
+    def _lua(self, code: str, *args):
+        """Execute a Lua chunk inside nvim and return its result."""
+        if self._nvim_profile is not None and self.profiler.active:
+            tool = current_tool.get() or "(none)"
+            return self.nvim.exec_lua(TIMED_LUA, tool, code, list(args))
+        return self.nvim.exec_lua(code, *args)
+
+    def _session_state(self) -> Optional[SessionState]:
+        """State of the MCP session making the current request, if any."""
+        try:
+            session = self.server.request_context.session
+        except LookupError:
+            return None
+        state = self._sessions.get(session)
+        if state is None:
+            state = SessionState(asyncio.Semaphore(self.max_session_calls))
+            self._sessions[session] = state
+        return state
+
+    async def _startup(self):
+        """Start background work shared by all transports."""
+        if self.index_on_start:
+            try:
+                await self._run_sync(self._sync_file_index)
+            except Exception as e:
+                logger.warning(f"File index not started: {e}")
+        if self.connection is not None and self.ping_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+        if self.maintenance_interval > 0:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    def _shutdown(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        if self.connection is not None:
+            self.connection.close()
+        self.workspace_search.save()
+        if self.recorder is not None:
+            self.recorder.close()
+        self.tracer.close()
 
     async def run(self):
         """Run the MCP server via stdio."""
         from mcp.server.stdio import stdio_server
 
-        async with stdio_server() as (read_stream, write_stream):
-            await self.server.run(
-                read_stream, write_stream, self.server.create_initialization_options()
-            )
+        await self._startup()
+        try:
+            async with stdio_server() as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options(),
+                )
+        finally:
+            self._shutdown()
+
+    def http_app(
+        self,
+        max_sessions: Optional[int] = None,
+        allowed_hosts: Optional[List[str]] = None,
+        allowed_origins: Optional[List[str]] = None,
+    ):
+        """
+        Build an ASGI app serving many MCP sessions over this one server.
+
+        Streamable HTTP is served at /mcp and the legacy SSE transport at
+        /sse (with messages posted to /messages/). All sessions share the
+        nvim connection; see max_session_calls for the per-session limit.
+
+        Requests must carry a loopback Host header and, if any, a loopback
+        Origin; allowed_hosts and allowed_origins ("host:*" for any port)
+        add to those lists.
+        """
+        import contextlib
+        from mcp.server.sse import SseServerTransport
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+        from mcp.server.transport_security import (
+            TransportSecurityMiddleware,
+            TransportSecuritySettings,
+        )
+        from starlette.applications import Starlette
+        from starlette.responses import Response
+        from starlette.routing import Mount, Route
+
+        kwargs = {}
+        params = inspect.signature(StreamableHTTPSessionManager).parameters
+        if max_sessions is not None and "max_sessions" in params:
+            kwargs["max_sessions"] = max_sessions
+        elif max_sessions is not None:
+            logger.warning("Installed mcp does not support max_sessions; ignoring")
+        security = TransportSecuritySettings(
+            enable_dns_rebinding_protection=True,
+            allowed_hosts=LOOPBACK_HOSTS + list(allowed_hosts or []),
+            allowed_origins=LOOPBACK_ORIGINS + list(allowed_origins or []),
+        )
+        manager = StreamableHTTPSessionManager(
+            app=self.server, security_settings=security, **kwargs
+        )
+        sse = SseServerTransport("/messages/", security_settings=security)
+        sse_check = TransportSecurityMiddleware(security)
+
+        async def handle_streamable(scope, receive, send):
+            await manager.handle_request(scope, receive, send)
+
+        async def handle_sse(request):
+            # connect_sse raises after sending its own rejection; answer first
+            rejected = await sse_check.validate_request(request)
+            if rejected is not None:
+                return rejected
+            async with sse.connect_sse(
+                request.scope, request.receive, request._send
+            ) as (read_stream, write_stream):
+                await self.server.run(
+                    read_stream,
+                    write_stream,
+                    self.server.create_initialization_options(),
+                )
+            return Response()
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            await self._startup()
+            try:
+                async with manager.run():
+                    yield
+            finally:
+                self._shutdown()
+
+        return Starlette(
+            routes=[
+                Mount("/mcp", app=handle_streamable),
+                Route("/sse", endpoint=handle_sse, methods=["GET"]),
+                Mount("/messages/", app=sse.handle_post_message),
+            ],
+            lifespan=lifespan,
+        )
+
+    async def run_http(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        uds: Optional[str] = None,
+        max_sessions: Optional[int] = None,
+        allowed_hosts: Optional[List[str]] = None,
+        allowed_origins: Optional[List[str]] = None,
+    ):
+        """Run the MCP server over HTTP on a local port or Unix socket."""
+        import uvicorn
+
+        config = uvicorn.Config(
+            self.http_app(max_sessions, allowed_hosts, allowed_origins),
+            host=host,
+            port=port,
+            uds=uds,
+            log_level="warning",
+        )
+        await uvicorn.Server(config).serve()
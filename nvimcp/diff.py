@@ -0,0 +1,153 @@
+"""Unified diffs computed inside nvim with xdiff."""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+ALGORITHMS = ("myers", "minimal", "patience", "histogram")
+TARGETS = ("disk", "buffer", "snapshot")
+
+# Args: specs (nil = every modified buffer against disk), options.
+# Spec forms:
+#   {buf = N, disk = true}             file on disk -> buffer
+#   {buf = N, other = M}               buffer N -> buffer M
+#   {buf = N, tick = T, lines = nil}   snapshot -> buffer; lines are only
+#                                      sent once nvim reports the tick moved
+# Results, in order: {buf, old, new, hunks} or {buf, unchanged = true} or
+# {buf, need_lines = true} or {buf, error}.
+DIFF_LUA = r"""
+local specs, opts = ...
+local xdiff = (vim.text and vim.text.diff) or vim.diff
+
+local function label(b)
+  local name = vim.api.nvim_buf_get_name(b)
+  if name == "" then
+    return "buffer " .. b
+  end
+  return vim.fn.fnamemodify(name, ":.")
+end
+
+local function join(b, lines)
+  if #lines == 0 or (#lines == 1 and lines[1] == "") then
+    return ""
+  end
+  local text = table.concat(lines, "\n")
+  if vim.bo[b].eol or vim.bo[b].fixeol then
+    text = text .. "\n"
+  end
+  return text
+end
+
+local function buf_text(b)
+  return join(b, vim.api.nvim_buf_get_lines(b, 0, -1, false))
+end
+
+local function disk_text(b)
+  local name = vim.api.nvim_buf_get_name(b)
+  local f = name ~= "" and io.open(name, "rb")
+  if not f then
+    return "", "/dev/null"
+  end
+  local text = f:read("*a")
+  f:close()
+  if vim.bo[b].fileformat == "dos" then
+    text = text:gsub("\r\n", "\n")
+  end
+  return text, label(b)
+end
+
+if specs == nil or specs == vim.NIL then
+  specs = {}
+  for _, b in ipairs(vim.api.nvim_list_bufs()) do
+    if vim.api.nvim_buf_is_loaded(b) and vim.bo[b].modified then
+      specs[#specs + 1] = { buf = b, disk = true }
+    end
+  end
+end
+
+local diff_opts = {
+  result_type = "unified",
+  ctxlen = opts.context,
+  algorithm = opts.algorithm,
+  ignore_whitespace = opts.ignore_whitespace,
+}
+
+local results = {}
+for i, spec in ipairs(specs) do
+  local b = spec.buf
+  local result = { buf = b }
+  if not vim.api.nvim_buf_is_valid(b) or not vim.api.nvim_buf_is_loaded(b) then
+    result.error = "invalid or unloaded buffer"
+  elseif spec.other and not vim.api.nvim_buf_is_loaded(spec.other) then
+    result.error = "invalid or unloaded buffer " .. spec.other
+  elseif spec.tick and spec.tick == vim.api.nvim_buf_get_changedtick(b) then
+    result.unchanged = true
+  elseif spec.tick and spec.lines == nil then
+    result.need_lines = true
+  else
+    local old, new
+    if spec.disk then
+      old, result.old = disk_text(b)
+      new, result.new = buf_text(b), label(b)
+    elseif spec.other then
+      old, result.old = buf_text(b), label(b)
+      new, result.new = buf_text(spec.other), label(spec.other)
+    else
+      old, result.old = join(b, spec.lines), label(b) .. "@" .. spec.tick
+      new, result.new = buf_text(b), label(b)
+    end
+    result.hunks = xdiff(old, new, diff_opts)
+  end
+  results[i] = result
+end
+return results
+"""
+
+
+def build_specs(
+    target: str,
+    buffer_ids: Optional[List[int]],
+    other_buffer_id: Optional[int] = None,
+    snapshot=None,
+) -> Optional[List[Dict[str, Any]]]:
+    """DIFF_LUA specs; None lets nvim pick every modified buffer."""
+    if target == "disk":
+        if buffer_ids is None:
+            return None
+        return [{"buf": b, "disk": True} for b in buffer_ids]
+    if target == "buffer":
+        if other_buffer_id is None or not buffer_ids:
+            raise ValueError("buffer diffs need buffer_ids and other_buffer_id")
+        return [{"buf": b, "other": other_buffer_id} for b in buffer_ids]
+    if target == "snapshot":
+        if snapshot is None:
+            raise ValueError("snapshot diffs need snapshot_id")
+        ids = list(snapshot.buffers) if buffer_ids is None else buffer_ids
+        return [{"buf": b, "tick": snapshot.buffer(b).tick} for b in ids]
+    raise ValueError(f"Unknown diff target: {target}")
+
+
+def with_lines(specs, results, snapshot) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """Indexes nvim asked snapshot lines for, and their specs with lines."""
+    pending = [i for i, r in enumerate(results) if r.get("need_lines")]
+    return pending, [
+        dict(specs[i], lines=snapshot.buffer(specs[i]["buf"]).lines) for i in pending
+    ]
+
+
+def format_diffs(results: List[Dict[str, Any]]) -> str:
+    if not results:
+        return "No modified buffers"
+    out = []
+    for r in results:
+        if "error" in r:
+            out.append(f"buffer {r['buf']}: {r['error']}")
+        elif r.get("unchanged") or not r.get("hunks"):
+            name = r.get("new") or f"buffer {r['buf']}"
+            out.append(f"{name}: no differences")
+        else:
+            out.append(f"--- {r['old']}\n+++ {r['new']}\n{r['hunks'].rstrip()}")
+            for old, new, length in r.get("moves") or ():
+                out.append(
+                    f"moved: {length} lines from {old + 1}-{old + length} "
+                    f"to {new + 1}-{new + length}"
+                )
+    return "\n".join(out)
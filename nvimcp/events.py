@@ -0,0 +1,158 @@
+"""Autocmd events queued inside nvim and drained by the server."""
+
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+# pynvim only delivers rpcnotify messages from a running event loop, which
+# the server's synchronous calls do not use; events wait in nvim instead,
+# each (event, buffer) at most once per drain. "BufChanged" is not an
+# autocmd: it comes from nvim_buf_attach and so also sees API changes to
+# buffers other than the current one, which TextChanged misses.
+# The first drain (and the first after a reconnect or a change of events)
+# installs the hooks and reports `installed`, as does an overflow with
+# `lost`: anything mirrored from nvim must then be rebuilt.
+# Args: event names, queue limit. Returns {items = {{event, buf}, ...}}.
+DRAIN_LUA = r"""
+local events, limit = ...
+local key = table.concat(events, ",")
+local q = package.loaded["nvimcp.events"]
+if q ~= nil and q.key == key then
+  q.limit = limit
+  local items, lost = q.items, q.lost
+  q.items, q.seen, q.lost = {}, {}, false
+  return { items = items, lost = lost }
+end
+
+q = { key = key, items = {}, seen = {}, lost = false, limit = limit }
+package.loaded["nvimcp.events"] = q
+
+local function push(event, buf)
+  local id = event .. ":" .. buf
+  if q.seen[id] then
+    return
+  end
+  if #q.items >= q.limit then
+    q.lost = true
+    return
+  end
+  q.seen[id] = true
+  q.items[#q.items + 1] = { event, buf }
+end
+
+local autocmds, changes = {}, false
+for _, e in ipairs(events) do
+  if e == "BufChanged" then
+    changes = true
+  else
+    autocmds[#autocmds + 1] = e
+  end
+end
+
+local group = vim.api.nvim_create_augroup("nvimcp_events", { clear = true })
+if #autocmds > 0 then
+  vim.api.nvim_create_autocmd(autocmds, {
+    group = group,
+    callback = function(ev)
+      push(ev.event, ev.buf)
+    end,
+  })
+end
+
+if changes then
+  local attached = {}
+  local function on_change(_, buf)
+    if package.loaded["nvimcp.events"] ~= q then
+      return true
+    end
+    push("BufChanged", buf)
+  end
+  local function attach(buf)
+    if attached[buf] or not vim.api.nvim_buf_is_loaded(buf) then
+      return
+    end
+    attached[buf] = pcall(vim.api.nvim_buf_attach, buf, false, {
+      on_lines = on_change,
+      on_changedtick = on_change,
+      on_reload = on_change,
+      on_detach = function(_, b)
+        attached[b] = nil
+      end,
+    }) or nil
+  end
+  for _, b in ipairs(vim.api.nvim_list_bufs()) do
+    attach(b)
+  end
+  vim.api.nvim_create_autocmd({ "BufNew", "BufReadPost", "BufNewFile", "BufEnter" }, {
+    group = group,
+    callback = function(ev)
+      attach(ev.buf)
+      -- Buffers created through the API are loaded after BufNew
+      vim.schedule(function()
+        attach(ev.buf)
+      end)
+    end,
+  })
+end
+return { items = {}, installed = true }
+"""
+
+# listener(event, bufnr)
+EventListener = Callable[[str, int], None]
+
+
+class EventQueue:
+    """
+    Dispatches nvim autocmd events to listeners on every drain().
+
+    Listeners subscribe to event names; resync callbacks run when events
+    may have been missed (first install, reconnect, queue overflow).
+    """
+
+    def __init__(self, limit: int = 10000):
+        self.limit = limit
+        self.drained = 0
+        self.resyncs = 0
+        self._listeners: Dict[str, List[EventListener]] = {}
+        self._resync: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def events(self) -> List[str]:
+        return sorted(self._listeners)
+
+    def subscribe(
+        self,
+        events: Iterable[str],
+        listener: EventListener,
+        resync: Callable[[], None] = None,
+    ):
+        with self._lock:
+            for event in events:
+                self._listeners.setdefault(event, []).append(listener)
+            if resync is not None:
+                self._resync.append(resync)
+
+    def drain(self, exec_lua: Callable) -> int:
+        """Fetch queued events and dispatch them; returns how many."""
+        if not self._listeners:
+            return 0
+        result = exec_lua(DRAIN_LUA, self.events, self.limit)
+        if result.get("installed") or result.get("lost"):
+            self.resyncs += 1
+            for resync in list(self._resync):
+                try:
+                    resync()
+                except Exception as e:
+                    logger.error(f"Event resync failed: {e}")
+        items = result.get("items") or []
+        for event, bufnr in items:
+            for listener in self._listeners.get(event, ()):
+                try:
+                    listener(event, bufnr)
+                except Exception as e:
+                    logger.error(f"Event listener for {event} failed: {e}")
+        self.drained += len(items)
+        return len(items)
@@ -0,0 +1,422 @@
+"""Workspace file index for nvimcp server."""
+
+import bisect
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import re
+import select
+import struct
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_MODES = ("fuzzy", "prefix", "glob")
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore-style glob to a regex body (no anchors)."""
+    out = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("(?:/.*)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = end + 1
+        elif c == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+def compile_glob(pattern: str) -> "re.Pattern":
+    """Compile a glob; patterns without a slash match at any depth."""
+    anchored = "/" in pattern.rstrip("/")
+    body = glob_to_regex(pattern.lstrip("/"))
+    return re.compile(f"^{body}$" if anchored else f"^(?:.*/)?{body}$")
+
+
+class IgnoreRules:
+    """Matcher for .gitignore files, including nested ones."""
+
+    def __init__(self):
+        # (base directory, regex, negated, directory only), in file order
+        self._rules: List[Tuple[str, "re.Pattern", bool, bool]] = []
+
+    def add_file(self, path: str, base: str = ""):
+        """Load patterns from an ignore file that applies below `base`."""
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated or line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if line:
+                self._rules.append((base, compile_glob(line), negated, dir_only))
+
+    def _match(self, rel: str, is_dir: bool) -> bool:
+        ignored = False
+        for base, regex, negated, dir_only in self._rules:
+            if base:
+                if not rel.startswith(base + "/"):
+                    continue
+                sub = rel[len(base) + 1 :]
+            else:
+                sub = rel
+            if dir_only and not is_dir:
+                continue
+            if regex.match(sub):
+                ignored = not negated
+        return ignored
+
+    def is_ignored(self, rel: str, is_dir: bool = False) -> bool:
+        """Check a path relative to the root, including its parent directories."""
+        parts = rel.split("/")
+        if ".git" in parts:
+            return True
+        for i in range(1, len(parts)):
+            if self._match("/".join(parts[:i]), True):
+                return True
+        return self._match(rel, is_dir)
+
+
+def fuzzy_score(query: str, path: str) -> Optional[float]:
+    """Score a subsequence match of `query` in `path`, None if no match."""
+    p = path.lower()
+    base = p.rfind("/") + 1
+    pos, prev, score = -1, -2, 0.0
+    for ch in query.lower():
+        pos = p.find(ch, pos + 1)
+        if pos < 0:
+            return None
+        if pos == prev + 1:
+            score += 5
+        if pos == 0 or p[pos - 1] in "/_-. ":
+            score += 3
+        if pos >= base:
+            score += 1
+        prev = pos
+    return score - len(p) * 0.01
+
+
+class _Inotify:
+    """Minimal inotify binding via ctypes (Linux only)."""
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = (
+        IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_ONLYDIR
+    )
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._rm = libc.inotify_rm_watch
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add(self.fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {path}")
+        return wd
+
+    def read(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """Return (wd, mask, name) events, waiting at most `timeout` seconds."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FileIndex:
+    """
+    In-process index of the files below a root directory.
+
+    The index is built on a background thread, honours .gitignore files and
+    is kept current with inotify on Linux. Listeners receive
+    ("added" | "removed" | "modified", relative path) notifications.
+    """
+
+    def __init__(self, root: str, watch: bool = True):
+        self.root = os.path.abspath(root)
+        self.watch = watch and sys.platform.startswith("linux")
+        self.ready = threading.Event()
+        self._paths: List[str] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._rules = IgnoreRules()
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, str] = {}
+        self._watches_full = False
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def add_listener(self, callback: Callable[[str, str], None]):
+        self._listeners.append(callback)
+
+    def start(self):
+        """Build the index and start watching, in the background."""
+        self._thread = threading.Thread(
+            target=self._run, name="nvimcp-file-index", daemon=True
+        )
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.ready.wait(timeout)
+
+    def paths(self) -> List[str]:
+        with self._lock:
+            return list(self._paths)
+
+    def _run(self):
+        if self.watch:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify unavailable, index will not auto-update: {e}")
+        try:
+            self.rebuild()
+            if self._inotify:
+                self._watch_loop()
+        except Exception as e:
+            logger.error(f"File index failed: {e}")
+        finally:
+            self.ready.set()
+            if self._inotify:
+                self._inotify.close()
+
+    def rebuild(self):
+        """Walk the whole tree again."""
+        self._rules = IgnoreRules()
+        self._rules.add_file(os.path.join(self.root, ".git", "info", "exclude"))
+        self._watches.clear()
+        self._watches_full = False
+        paths = self._scan("")
+        paths.sort()
+        with self._lock:
+            self._paths = paths
+        self.ready.set()
+        logger.info(f"Indexed {len(paths)} files under {self.root}")
+
+    def _scan(self, rel_dir: str) -> List[str]:
+        """Collect files below `rel_dir`, adding ignore rules and watches."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(
+            os.path.join(self.root, rel_dir) if rel_dir else self.root
+        ):
+            if self._stop.is_set():
+                break
+            rel = os.path.relpath(dirpath, self.root)
+            rel = "" if rel == "." else rel.replace(os.sep, "/")
+            if ".gitignore" in filenames:
+                self._rules.add_file(os.path.join(dirpath, ".gitignore"), rel)
+            self._add_watch(dirpath, rel)
+            prefix = rel + "/" if rel else ""
+            dirnames[:] = [
+                d for d in dirnames if not self._rules.is_ignored(prefix + d, True)
+            ]
+            for name in filenames:
+                path = prefix + name
+                if not self._rules.is_ignored(path):
+                    found.append(path)
+        return found
+
+    def _add_watch(self, abs_dir: str, rel_dir: str):
+        if not self._inotify or self._watches_full:
+            return
+        try:
+            self._watches[self._inotify.add_watch(abs_dir)] = rel_dir
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                # Out of fs.inotify.max_user_watches: keep what is watched
+                self._watches_full = True
+                logger.warning(
+                    f"inotify watch limit reached at {abs_dir}; directories "
+                    f"not yet watched ({len(self._watches)} are) may go stale"
+                )
+            else:
+                logger.info(f"Cannot watch {abs_dir} ({e}); it may go stale")
+
+    def _insert(self, paths: List[str]):
+        with self._lock:
+            for path in paths:
+                i = bisect.bisect_left(self._paths, path)
+                if i == len(self._paths) or self._paths[i] != path:
+                    self._paths.insert(i, path)
+        for path in paths:
+            self._notify("added", path)
+
+    def _remove_prefix(self, prefix: str, exact: str):
+        """Drop `exact` and everything under `prefix`."""
+        with self._lock:
+            i = bisect.bisect_left(self._paths, exact)
+            removed = []
+            if i < len(self._paths) and self._paths[i] == exact:
+                removed.append(self._paths.pop(i))
+            i = bisect.bisect_left(self._paths, prefix)
+            j = i
+            while j < len(self._paths) and self._paths[j].startswith(prefix):
+                j += 1
+            removed.extend(self._paths[i:j])
+            del self._paths[i:j]
+        for path in removed:
+            self._notify("removed", path)
+
+    def _notify(self, event: str, path: str):
+        for callback in self._listeners:
+            try:
+                callback(event, path)
+            except Exception as e:
+                logger.error(f"File index listener failed: {e}")
+
+    def _watch_loop(self):
+        ino = _Inotify
+        while not self._stop.is_set() and self._inotify:
+            for wd, mask, name in self._inotify.read(0.5):
+                if mask & ino.IN_Q_OVERFLOW:
+                    self.rebuild()
+                    break
+                rel_dir = self._watches.get(wd)
+                if rel_dir is None or mask & ino.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    continue
+                if not name:
+                    continue
+                rel = f"{rel_dir}/{name}" if rel_dir else name
+                is_dir = bool(mask & ino.IN_ISDIR)
+                if name == ".gitignore" and not is_dir:
+                    self.rebuild()
+                    break
+                if mask & (ino.IN_DELETE | ino.IN_MOVED_FROM):
+                    self._remove_prefix(rel + "/", rel)
+                elif self._rules.is_ignored(rel, is_dir):
+                    continue
+                elif is_dir and mask & (ino.IN_CREATE | ino.IN_MOVED_TO):
+                    self._insert(self._scan(rel))
+                elif mask & (ino.IN_CREATE | ino.IN_MOVED_TO):
+                    self._insert([rel])
+                elif mask & ino.IN_CLOSE_WRITE:
+                    self._notify("modified", rel)
+
+    def query(self, query: str = "", mode: str = "fuzzy", limit: int = 50) -> List[str]:
+        """
+        Find indexed files.
+
+        Args:
+            query: Path prefix, glob, or fuzzy subsequence
+            mode: One of "fuzzy", "prefix" or "glob"
+            limit: Maximum number of results
+
+        Returns:
+            Matching paths relative to the root, best first for fuzzy queries
+        """
+        if mode not in QUERY_MODES:
+            raise ValueError(f"Unknown query mode: {mode}")
+        with self._lock:
+            paths = self._paths
+            if mode == "prefix" or not query:
+                i = bisect.bisect_left(paths, query)
+                out = []
+                while i < len(paths) and len(out) < limit:
+                    if not paths[i].startswith(query):
+                        break
+                    out.append(paths[i])
+                    i += 1
+                return out
+            if mode == "glob":
+                regex = compile_glob(query)
+                out = []
+                for path in paths:
+                    if regex.match(path):
+                        out.append(path)
+                        if len(out) >= limit:
+                            break
+                return out
+            scored = []
+            for path in paths:
+                score = fuzzy_score(query, path)
+                if score is not None:
+                    scored.append((-score, path))
+        scored.sort()
+        return [path for _, path in scored[:limit]]
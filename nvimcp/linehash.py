@@ -0,0 +1,497 @@
+"""Per-buffer arrays of line hashes, kept in step with nvim's line changes."""
+
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .cache import CacheStats
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when numpy is absent
+    np = None
+
+# Lines are hashed with Python's str hash: 64 bits, computed in C and
+# stable for the life of the process, which is as long as the arrays live.
+BLANK = hash("")
+
+# Below this many items the pure Python paths beat converting to numpy
+NUMPY_MIN = 256
+
+_MASK = (1 << 64) - 1
+_PRIME = 0x100000001B3
+
+# Each tracked buffer is attached with nvim_buf_attach; its on_lines events
+# shrink an untouched prefix and suffix, so a sync sends only the lines in
+# between. Args: {{buf, tick}, ...} with the changedtick the server last
+# synced (-1 = none, which always sends the whole buffer). Results, in
+# order: {buf, tick, full = true, lines} or {buf, tick, prefix, suffix,
+# lines} or {buf, tick} when nothing changed, or {buf, error}.
+SYNC_LUA = r"""
+local wanted = ...
+local st = package.loaded["nvimcp.linehash"]
+if st == nil then
+  st = { bufs = {} }
+  package.loaded["nvimcp.linehash"] = st
+end
+
+local function track(b)
+  local s = { full = true }
+  local ok = pcall(vim.api.nvim_buf_attach, b, false, {
+    on_lines = function(_, buf, _, first, _, new_last)
+      if st.bufs[buf] ~= s then
+        return true
+      end
+      local tail = vim.api.nvim_buf_line_count(buf) - new_last
+      if s.prefix == nil then
+        s.prefix, s.suffix = first, tail
+      else
+        s.prefix = math.min(s.prefix, first)
+        s.suffix = math.min(s.suffix, tail)
+      end
+    end,
+    on_reload = function()
+      s.full = true
+    end,
+    on_detach = function(_, buf)
+      if st.bufs[buf] == s then
+        st.bufs[buf] = nil
+      end
+    end,
+  })
+  if ok then
+    st.bufs[b] = s
+  end
+  return s
+end
+
+local out = {}
+for i, w in ipairs(wanted) do
+  local b, known = w[1], w[2]
+  local r = { buf = b }
+  if not vim.api.nvim_buf_is_valid(b) or not vim.api.nvim_buf_is_loaded(b) then
+    r.error = "invalid or unloaded buffer"
+  else
+    local s = st.bufs[b] or track(b)
+    r.tick = vim.api.nvim_buf_get_changedtick(b)
+    if s.full or known ~= s.tick then
+      r.full = true
+      r.lines = vim.api.nvim_buf_get_lines(b, 0, -1, false)
+    elseif s.prefix ~= nil then
+      local count = vim.api.nvim_buf_line_count(b)
+      r.prefix, r.suffix = s.prefix, s.suffix
+      r.lines = vim.api.nvim_buf_get_lines(b, s.prefix, count - s.suffix, false)
+    end
+    s.full, s.prefix, s.suffix, s.tick = false, nil, nil, r.tick
+  end
+  out[i] = r
+end
+return out
+"""
+
+# Sets buffer lines [first, last) if the buffer is still at `tick` and the
+# lines next to the range are `before` (line first - 1) and `after` (line
+# last); nil skips a check at the buffer's start or end. Returns {ok, tick},
+# with mismatch = true when a neighbour differs.
+#
+# A splice planned from hashes trusts the rest of the common prefix and
+# suffix to hash equality without comparing text. str hashes are SipHash
+# keyed per process, so file contents cannot arrange a collision and a
+# chance one is about 2^-64 per line; checking the neighbours is free in
+# the same request and catches the splice edges planned on a bad match.
+SPLICE_LUA = r"""
+local buf, tick, first, last, lines, before, after = ...
+if not vim.api.nvim_buf_is_valid(buf) then
+  error("invalid buffer " .. buf, 0)
+end
+local now = vim.api.nvim_buf_get_changedtick(buf)
+if now ~= tick then
+  return { ok = false, tick = now }
+end
+local function line(i)
+  return vim.api.nvim_buf_get_lines(buf, i, i + 1, false)[1]
+end
+if (before ~= nil and before ~= vim.NIL and line(first - 1) ~= before)
+    or (after ~= nil and after ~= vim.NIL and line(last) ~= after) then
+  return { ok = false, tick = now, mismatch = true }
+end
+vim.api.nvim_buf_set_lines(buf, first, last, false, lines)
+return { ok = true, tick = vim.api.nvim_buf_get_changedtick(buf) }
+"""
+
+
+def hash_lines(lines: Sequence[str]) -> array:
+    return array("q", map(hash, lines))
+
+
+def _np(hashes: Sequence[int]):
+    if isinstance(hashes, array):
+        return np.frombuffer(hashes, dtype=np.int64)
+    return np.asarray(hashes, dtype=np.int64)
+
+
+def _use_numpy(n: int) -> bool:
+    return np is not None and n >= NUMPY_MIN
+
+
+def common_affixes(a: Sequence[int], b: Sequence[int]) -> Tuple[int, int]:
+    """Lengths of the common prefix and of the common suffix after it."""
+    n = min(len(a), len(b))
+    if _use_numpy(n):
+        x, y = _np(a), _np(b)
+        diff = np.flatnonzero(x[:n] != y[:n])
+        prefix = int(diff[0]) if len(diff) else n
+        rest = n - prefix
+        diff = np.flatnonzero(x[len(x) - rest :][::-1] != y[len(y) - rest :][::-1])
+        return prefix, int(diff[0]) if len(diff) else rest
+    prefix = 0
+    while prefix < n and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix, rest = 0, n - prefix
+    while suffix < rest and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def minimal_splice(old: Sequence[int], new: Sequence[int]) -> Tuple[int, int, int]:
+    """
+    Smallest single replacement turning old into new.
+
+    Returns (start, old_end, new_end): old[start:old_end] becomes
+    new[start:new_end]; start == old_end == new_end means no change.
+    """
+    prefix, suffix = common_affixes(old, new)
+    return prefix, len(old) - suffix, len(new) - suffix
+
+
+def window_keys(hashes: Sequence[int], k: int):
+    """One key per run of k consecutive lines; equal runs get equal keys."""
+    m = len(hashes) - k + 1
+    if m <= 0:
+        return []
+    if _use_numpy(len(hashes)):
+        h = _np(hashes).view(np.uint64)
+        keys = np.zeros(m, dtype=np.uint64)
+        prime = np.uint64(_PRIME)
+        for j in range(k):
+            keys = keys * prime + h[j : j + m]
+        return keys
+    top = pow(_PRIME, k - 1, 1 << 64)
+    key = 0
+    for x in hashes[:k]:
+        key = (key * _PRIME + (x & _MASK)) & _MASK
+    keys = [key]
+    for i in range(1, m):
+        key = (key - (hashes[i - 1] & _MASK) * top) & _MASK
+        key = (key * _PRIME + (hashes[i + k - 1] & _MASK)) & _MASK
+        keys.append(key)
+    return keys
+
+
+def _trivial_windows(hashes: Sequence[int], k: int):
+    """
+    Whether each window of k lines is one line repeated (blank, "}", ...).
+
+    Such windows match everywhere and say nothing about moved or copied
+    code; with k == 1 only blank lines count.
+    """
+    m = len(hashes) - k + 1
+    if m <= 0:
+        return []
+    if k == 1:
+        return [x == BLANK for x in hashes]
+    if _use_numpy(len(hashes)):
+        h = _np(hashes)
+        same = np.concatenate(([0], np.cumsum(h[1:] == h[:-1])))
+        return (same[k - 1 :] - same[:m]) == k - 1
+    out, run = [], 1
+    for i in range(len(hashes)):
+        run = run + 1 if i and hashes[i] == hashes[i - 1] else 1
+        if i >= k - 1:
+            out.append(run >= k)
+    return out
+
+
+def _duplicate_groups(
+    buffers: Dict[int, Sequence[int]], k: int
+) -> List[List[Tuple[int, int]]]:
+    """(buf, pos) of windows sharing a key, in groups of two or more."""
+    if _use_numpy(sum(len(h) for h in buffers.values())):
+        keys, bufs, positions = [], [], []
+        for buf, hashes in sorted(buffers.items()):
+            if len(hashes) < k:
+                continue
+            idx = np.flatnonzero(~np.asarray(_trivial_windows(hashes, k), dtype=bool))
+            keys.append(np.asarray(window_keys(hashes, k), dtype=np.uint64)[idx])
+            bufs.append(np.full(len(idx), buf, dtype=np.int64))
+            positions.append(idx)
+        if not keys:
+            return []
+        keys, bufs, positions = map(np.concatenate, (keys, bufs, positions))
+        order = np.lexsort((positions, bufs, keys))
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+        bounds = np.concatenate(([0], starts, [len(order)]))
+        groups = []
+        for g in np.flatnonzero(np.diff(bounds) > 1):
+            members = order[bounds[g] : bounds[g + 1]]
+            groups.append(
+                list(zip(bufs[members].tolist(), positions[members].tolist()))
+            )
+        return groups
+    found: Dict[int, List[Tuple[int, int]]] = {}
+    for buf, hashes in sorted(buffers.items()):
+        trivial = _trivial_windows(hashes, k)
+        for i, key in enumerate(window_keys(hashes, k)):
+            if not trivial[i]:
+                found.setdefault(key, []).append((buf, i))
+    return [g for g in found.values() if len(g) > 1]
+
+
+@dataclass
+class Duplicate:
+    """A block of lines found at several places; positions are 0-based."""
+
+    lines: int
+    locations: List[Tuple[int, int]] = field(default_factory=list)
+
+
+def find_duplicates(
+    buffers: Dict[int, Sequence[int]], min_lines: int = 4, limit: int = 50
+) -> List[Duplicate]:
+    """
+    Blocks of at least min_lines identical lines within or across buffers.
+
+    Windows of min_lines lines are matched by key, then runs of matching
+    windows at the same distance are merged into maximal blocks. Largest
+    blocks come first.
+    """
+    k = max(min_lines, 1)
+    # Each window pairs with the first place it occurs, so a line repeated
+    # n times costs n pairs, not n squared
+    pairs: Dict[Tuple[int, int, int], List[int]] = {}
+    for group in _duplicate_groups(buffers, k):
+        cb, ci = group[0]
+        first = buffers[cb][ci : ci + k]
+        for ob, oi in group[1:]:
+            if buffers[ob][oi : oi + k] != first:
+                continue
+            pairs.setdefault((cb, ob, oi - ci), []).append(ci)
+
+    blocks: Dict[Tuple[int, int, int], Duplicate] = {}
+    for (cb, ob, delta), starts in pairs.items():
+        starts.sort()
+        run_start = prev = starts[0]
+        for ci in starts[1:] + [None]:
+            if ci is not None and ci == prev + 1:
+                prev = ci
+                continue
+            length = prev - run_start + k
+            if cb != ob or abs(delta) >= length:
+                dup = blocks.setdefault(
+                    (cb, run_start, length), Duplicate(length, [(cb, run_start)])
+                )
+                dup.locations.append((ob, run_start + delta))
+            if ci is not None:
+                run_start = prev = ci
+    for dup in blocks.values():
+        dup.locations.sort()
+    found = sorted(
+        blocks.values(), key=lambda d: (-d.lines * len(d.locations), d.locations)
+    )
+    return found[:limit]
+
+
+def _unique_positions(keys, trivial) -> Dict[int, int]:
+    """Positions of keys that occur exactly once, trivial windows left out."""
+    seen: Dict[int, int] = {}
+    repeated = set()
+    for i, key in enumerate(keys):
+        if trivial[i]:
+            continue
+        key = int(key)
+        if key in seen:
+            repeated.add(key)
+        else:
+            seen[key] = i
+    return {key: i for key, i in seen.items() if key not in repeated}
+
+
+def moved_blocks(
+    old: Sequence[int], new: Sequence[int], min_lines: int = 3
+) -> List[Tuple[int, int, int]]:
+    """
+    Blocks of old lines that reappear elsewhere in new, as (old, new, length).
+
+    Windows unique to both sides anchor the match, as in patience diff;
+    the heaviest chain of blocks in the same order on both sides is what
+    stayed put, and every other block moved. Positions are 0-based.
+    """
+    k = max(min_lines, 1)
+    if _use_numpy(min(len(old), len(new))):
+        keys_old = np.asarray(window_keys(old, k), dtype=np.uint64)
+        keys_new = np.asarray(window_keys(new, k), dtype=np.uint64)
+        uo, io, co = np.unique(keys_old, return_index=True, return_counts=True)
+        un, in_, cn = np.unique(keys_new, return_index=True, return_counts=True)
+        _, ao, an = np.intersect1d(
+            uo[co == 1], un[cn == 1], assume_unique=True, return_indices=True
+        )
+        i_old, i_new = io[co == 1][ao], in_[cn == 1][an]
+        keep = ~np.asarray(_trivial_windows(old, k), dtype=bool)[i_old]
+        anchors = sorted(zip(i_old[keep].tolist(), i_new[keep].tolist()))
+    else:
+        in_old = _unique_positions(window_keys(old, k), _trivial_windows(old, k))
+        in_new = _unique_positions(window_keys(new, k), _trivial_windows(new, k))
+        anchors = sorted((i, in_new[key]) for key, i in in_old.items() if key in in_new)
+    if not anchors:
+        return []
+
+    # Consecutive anchors on both sides form one block of windows
+    blocks = []
+    start_o, start_n = anchors[0]
+    prev_o, prev_n = anchors[0]
+    for i, j in anchors[1:] + [(None, None)]:
+        if i is not None and i == prev_o + 1 and j == prev_n + 1:
+            prev_o, prev_n = i, j
+            continue
+        blocks.append((start_o, start_n, prev_o - start_o + k))
+        if i is not None:
+            start_o = prev_o = i
+            start_n = prev_n = j
+
+    # Heaviest chain increasing in both positions (blocks come sorted by old)
+    order = sorted(range(len(blocks)), key=lambda b: blocks[b][1])
+    rank = {b: r for r, b in enumerate(order)}
+    tree = [(0, -1)] * (len(blocks) + 1)
+    best: List[Tuple[int, int]] = [(0, -1)] * len(blocks)
+    for b, (_, _, length) in enumerate(blocks):
+        r = rank[b]
+        top, i = (0, -1), r
+        while i > 0:
+            top = max(top, tree[i])
+            i -= i & -i
+        best[b] = (top[0] + length, top[1])
+        i = r + 1
+        while i <= len(blocks):
+            tree[i] = max(tree[i], (best[b][0], b))
+            i += i & -i
+    stayed = set()
+    b = max(range(len(blocks)), key=lambda b: best[b][0])
+    while b != -1:
+        stayed.add(b)
+        b = best[b][1]
+    return [block for b, block in enumerate(blocks) if b not in stayed]
+
+
+@dataclass
+class LineHashes:
+    tick: int
+    hashes: array
+
+
+# Per-buffer overhead besides the hashes themselves (entry, dataclass, array)
+_ENTRY_BYTES = 200
+
+
+class LineHashIndex:
+    """
+    Line hash arrays of tracked buffers, least recently used first.
+
+    sync() brings the requested buffers up to date in one call and sends
+    only the lines changed since the previous sync.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self.synced_lines = 0
+        self._buffers: "OrderedDict[int, LineHashes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def __contains__(self, bufnr: int) -> bool:
+        return bufnr in self._buffers
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            _ENTRY_BYTES + h.hashes.itemsize * len(h.hashes)
+            for h in self._buffers.values()
+        )
+
+    def sync(self, exec_lua: Callable, bufnrs: Sequence[int]) -> Dict[int, LineHashes]:
+        """Up-to-date hashes of the given buffers; invalid ones are left out."""
+        with self._lock:
+            known = [
+                [b, self._buffers[b].tick if b in self._buffers else -1] for b in bufnrs
+            ]
+        results = exec_lua(SYNC_LUA, known)
+        out = {}
+        with self._lock:
+            for r in results:
+                bufnr = r["buf"]
+                if r.get("error"):
+                    self._buffers.pop(bufnr, None)
+                    continue
+                entry = self._buffers.get(bufnr)
+                lines = r.get("lines")
+                if r.get("full") or entry is None:
+                    self.stats.misses += 1
+                    hashes = hash_lines(lines or [])
+                elif lines is None:
+                    self.stats.hits += 1
+                    hashes = entry.hashes
+                else:
+                    self.stats.hits += 1
+                    old = entry.hashes
+                    hashes = (
+                        old[: r["prefix"]]
+                        + hash_lines(lines)
+                        + old[len(old) - r["suffix"] :]
+                    )
+                self.synced_lines += len(lines or ())
+                entry = self._buffers[bufnr] = LineHashes(r["tick"], hashes)
+                self._buffers.move_to_end(bufnr)
+                out[bufnr] = entry
+        return out
+
+    def drop_buffer(self, bufnr: int) -> int:
+        with self._lock:
+            entry = self._buffers.pop(bufnr, None)
+        if entry is None:
+            return 0
+        return _ENTRY_BYTES + entry.hashes.itemsize * len(entry.hashes)
+
+    def evict(self, target_bytes: int) -> int:
+        """Forget least recently synced buffers; they are resent in full."""
+        freed = count = 0
+        with self._lock:
+            while self._buffers and self.nbytes > target_bytes:
+                _, entry = self._buffers.popitem(last=False)
+                freed += _ENTRY_BYTES + entry.hashes.itemsize * len(entry.hashes)
+                count += 1
+        self.stats.evicted(count, freed)
+        return freed
+
+    def invalidate(self):
+        with self._lock:
+            self._buffers.clear()
+
+
+def format_duplicates(
+    duplicates: List[Duplicate], names: Optional[Dict[int, str]] = None
+) -> str:
+    if not duplicates:
+        return "No duplicate blocks"
+    names = names or {}
+    out = []
+    for dup in duplicates:
+        places = ", ".join(
+            f"{names.get(b) or f'buffer {b}'}:{i + 1}-{i + dup.lines}"
+            for b, i in dup.locations
+        )
+        out.append(f"{dup.lines} lines x{len(dup.locations)}: {places}")
+    return "\n".join(out)
@@ -0,0 +1,215 @@
+"""Lua chunks compiled once inside nvim and called by content hash."""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .cache import CacheStats
+
+# Compiled chunks live in package.loaded so they survive as long as the nvim
+# instance and can be inspected with :lua =package.loaded["nvimcp.chunks"].
+_CHUNKS = 'local chunks = package.loaded["nvimcp.chunks"] or {}\npackage.loaded["nvimcp.chunks"] = chunks\n'
+
+_COMPILE = r"""
+local function compile(id, code)
+  local fn, err = (loadstring or load)(code, "=nvimcp:" .. id:sub(1, 8))
+  if not fn then
+    error(err, 0)
+  end
+  chunks[id] = fn
+  return fn
+end
+
+local function unpack_args(args, n)
+  args = args or {}
+  n = n or #args
+  for i = 1, n do
+    if args[i] == vim.NIL then
+      args[i] = nil
+    end
+  end
+  return unpack(args, 1, n)
+end
+"""
+
+# Registers chunks sent with their code and forgets evicted ones.
+# Args: {{id, code}, ...}, {id, ...}
+REGISTER_LUA = _CHUNKS + _COMPILE + r"""
+local add, drop = ...
+for _, id in ipairs(drop) do
+  chunks[id] = nil
+end
+for _, chunk in ipairs(add) do
+  if not chunks[chunk[1]] then
+    compile(chunk[1], chunk[2])
+  end
+end
+return true
+"""
+
+# Runs many calls in one request. Args: {{id, args, nargs}, ...}, stop_on_error.
+# Each result is {ok = true, value = ...}, {ok = false, error = ...} or
+# {ok = false, missing = true}; stopping early leaves later results out.
+BATCH_LUA = _CHUNKS + _COMPILE + r"""
+local calls, stop = ...
+local results = {}
+for i, call in ipairs(calls) do
+  local fn = chunks[call[1]]
+  local result
+  if not fn then
+    result = { ok = false, missing = true, error = "unknown handle " .. call[1] }
+  else
+    local ok, value = pcall(fn, unpack_args(call[2], call[3]))
+    if ok then
+      result = { ok = true, value = value }
+    else
+      result = { ok = false, error = tostring(value) }
+    end
+  end
+  results[i] = result
+  if stop and not result.ok then
+    break
+  end
+end
+return results
+"""
+
+
+def chunk_id(code: str) -> str:
+    """Handle of a chunk: a hash of its code."""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()[:32]
+
+
+# Rough per-chunk overhead: handle, dict slot and the compiled function
+_ENTRY_BYTES = 300
+
+
+class LuaChunks:
+    """
+    Lua chunks known to the server and which of them nvim has compiled,
+    least recently used first.
+
+    Code is kept by handle so chunks can be compiled again transparently
+    when nvim no longer has them (a reconnect, or a cleared table).
+    Evicted chunks become unknown handles; nvim forgets them on the next
+    register.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self._code: "OrderedDict[str, str]" = OrderedDict()
+        self._compiled: Set[str] = set()
+        self._dropped: Set[str] = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._code)
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._code
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def add(self, code: str) -> str:
+        handle = chunk_id(code)
+        with self._lock:
+            if handle in self._code:
+                self._code.move_to_end(handle)
+            else:
+                self._code[handle] = code
+                self._bytes += _ENTRY_BYTES + len(code)
+                self._dropped.discard(handle)
+        return handle
+
+    def code(self, handle: str) -> Optional[str]:
+        return self._code.get(handle)
+
+    def reset(self):
+        """Forget what nvim has compiled, e.g. after reconnecting."""
+        with self._lock:
+            self._compiled.clear()
+            self._dropped.clear()
+
+    def evict(self, target_bytes: int) -> int:
+        """Forget least recently used chunks; their handles become unknown."""
+        freed = count = 0
+        with self._lock:
+            while self._code and self._bytes > target_bytes:
+                handle, code = self._code.popitem(last=False)
+                self._bytes -= _ENTRY_BYTES + len(code)
+                freed += _ENTRY_BYTES + len(code)
+                count += 1
+                if handle in self._compiled:
+                    self._compiled.discard(handle)
+                    self._dropped.add(handle)
+        self.stats.evicted(count, freed)
+        return freed
+
+    def register(self, exec_lua: Callable, handles: List[str]):
+        """Compile the given chunks in nvim unless already done."""
+        with self._lock:
+            pending = [
+                [h, self._code[h]]
+                for h in handles
+                if h in self._code and h not in self._compiled
+            ]
+            drop = list(self._dropped)
+        if pending or drop:
+            exec_lua(REGISTER_LUA, pending, drop)
+            with self._lock:
+                self._compiled.update(h for h, _ in pending)
+                self._dropped.difference_update(drop)
+
+    def batch(
+        self, exec_lua: Callable, calls: List[List[Any]], stop_on_error: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Run [handle, args] calls in one request.
+
+        Unknown handles are reported per call; calls whose chunk nvim
+        lost are compiled again and retried once.
+        """
+        with self._lock:
+            unknown = {c[0] for c in calls if c[0] not in self._code}
+            for handle, _ in calls:
+                if handle not in unknown:
+                    self._code.move_to_end(handle)
+            misses = sum(c[0] in unknown for c in calls)
+            self.stats.hits += len(calls) - misses
+            self.stats.misses += misses
+        self.register(exec_lua, list({c[0] for c in calls} - unknown))
+        payload = [[h, list(args), len(args)] for h, args in calls]
+        results = exec_lua(BATCH_LUA, payload, stop_on_error)
+        missing = [
+            i
+            for i, r in enumerate(results)
+            if r.get("missing") and calls[i][0] not in unknown
+        ]
+        if not missing:
+            return results
+        # Only calls that never ran are retried
+        lost = {calls[i][0] for i in missing}
+        with self._lock:
+            self._compiled.difference_update(lost)
+        self.register(exec_lua, list(lost))
+        if stop_on_error:
+            first = missing[0]
+            return results[:first] + exec_lua(BATCH_LUA, payload[first:], True)
+        retried = exec_lua(BATCH_LUA, [payload[i] for i in missing], False)
+        for i, result in zip(missing, retried):
+            results[i] = result
+        return results
+
+
+def format_results(handle: Optional[str], results: List[Dict[str, Any]]) -> str:
+    """JSON text of exec_lua results."""
+    out: Dict[str, Any] = {}
+    if handle is not None:
+        out["handle"] = handle
+    out["results"] = [{k: v for k, v in r.items() if k != "missing"} for r in results]
+    return json.dumps(out, default=repr)
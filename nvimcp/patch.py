@@ -0,0 +1,273 @@
+"""Unified diff parsing and in-nvim patch application for nvimcp server."""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+DEV_NULL = "/dev/null"
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class PatchError(Exception):
+    """Raised when a unified diff cannot be parsed."""
+
+    pass
+
+
+@dataclass
+class Hunk:
+    """A single hunk of a unified diff."""
+
+    old_start: int
+    old_lines: List[str] = field(default_factory=list)
+    new_lines: List[str] = field(default_factory=list)
+
+    def to_lua(self) -> Dict[str, Any]:
+        """Convert to the table shape expected by APPLY_PATCH_LUA."""
+        return {"start": self.old_start, "old": self.old_lines, "new": self.new_lines}
+
+
+@dataclass
+class FilePatch:
+    """All hunks of a unified diff that target one file."""
+
+    old_path: str
+    new_path: str
+    hunks: List[Hunk] = field(default_factory=list)
+
+    @property
+    def path(self) -> str:
+        """Path the patch applies to."""
+        return self.old_path if self.new_path == DEV_NULL else self.new_path
+
+    @property
+    def is_new_file(self) -> bool:
+        return self.old_path == DEV_NULL
+
+    @property
+    def is_deletion(self) -> bool:
+        return self.new_path == DEV_NULL
+
+
+def _strip_path(raw: str, strip: int) -> str:
+    """Drop the timestamp and leading path components from a header path."""
+    path = raw.split("\t", 1)[0].strip()
+    if path == DEV_NULL:
+        return path
+    if strip:
+        parts = path.split("/")
+        if len(parts) > strip:
+            path = "/".join(parts[strip:])
+    return path
+
+
+def parse_unified_diff(text: str, strip: int = 1) -> List[FilePatch]:
+    """
+    Parse a single or multi-file unified diff.
+
+    Args:
+        text: Diff text as produced by ``diff -u`` or ``git diff``
+        strip: Number of leading path components to drop (like ``patch -p``)
+
+    Returns:
+        One FilePatch per file in the diff
+
+    Raises:
+        PatchError: If the diff is malformed
+    """
+    # Only \n ends a diff line; splitlines() would also split content lines
+    # at form feeds, \x1c-\x1e, \x85, \u2028, ...
+    lines = [line[:-1] if line.endswith("\r") else line for line in text.split("\n")]
+    if lines and lines[-1] == "":
+        lines.pop()
+    patches: List[FilePatch] = []
+    current: Optional[FilePatch] = None
+    i = 0
+
+    while i < len(lines):
+        line = lines[i]
+
+        if line.startswith("--- ") and i + 1 < len(lines):
+            if lines[i + 1].startswith("+++ "):
+                current = FilePatch(
+                    old_path=_strip_path(line[4:], strip),
+                    new_path=_strip_path(lines[i + 1][4:], strip),
+                )
+                patches.append(current)
+                i += 2
+                continue
+
+        match = _HUNK_HEADER.match(line)
+        if match:
+            if current is None:
+                raise PatchError(f"Hunk without file header at line {i + 1}")
+            old_count = int(match.group(2)) if match.group(2) is not None else 1
+            new_count = int(match.group(4)) if match.group(4) is not None else 1
+            hunk = Hunk(old_start=int(match.group(1)))
+            i += 1
+            while (old_count > 0 or new_count > 0) and i < len(lines):
+                body = lines[i]
+                tag, content = body[:1], body[1:]
+                if tag == " " or body == "":
+                    hunk.old_lines.append(content)
+                    hunk.new_lines.append(content)
+                    old_count -= 1
+                    new_count -= 1
+                elif tag == "-":
+                    hunk.old_lines.append(content)
+                    old_count -= 1
+                elif tag == "+":
+                    hunk.new_lines.append(content)
+                    new_count -= 1
+                elif tag != "\\":
+                    raise PatchError(f"Unexpected line in hunk at line {i + 1}")
+                i += 1
+            if old_count > 0 or new_count > 0:
+                raise PatchError(f"Truncated hunk for {current.path}")
+            current.hunks.append(hunk)
+            continue
+
+        i += 1
+
+    if not patches:
+        raise PatchError("No file headers found in diff")
+    return patches
+
+
+# Runs entirely inside nvim so buffer contents never cross the RPC channel.
+# Every hunk is located against the original lines first (exact match, then
+# whitespace-insensitive), then the matches are applied bottom-up in one
+# undo block.
+APPLY_PATCH_LUA = r"""
+local files, max_offset, strict = ...
+local function trim(s) return (s:gsub('^%s+', ''):gsub('%s+$', '')) end
+
+local function matches_at(lines, old, pos, fuzzy)
+  if pos < 0 or pos + #old > #lines then return false end
+  for j, want in ipairs(old) do
+    local have = lines[pos + j]
+    if fuzzy then
+      if trim(have) ~= trim(want) then return false end
+    elseif have ~= want then
+      return false
+    end
+  end
+  return true
+end
+
+local function locate(lines, old, expected, lower, fuzzy)
+  local limit = max_offset
+  if limit < 0 then limit = #lines end
+  for off = 0, limit do
+    for _, pos in ipairs(off == 0 and {expected} or {expected + off, expected - off}) do
+      if pos >= lower and matches_at(lines, old, pos, fuzzy) then
+        return pos
+      end
+    end
+  end
+  return nil
+end
+
+local out = {}
+for _, f in ipairs(files) do
+  local res = {path = f.path, hunks = {}}
+  table.insert(out, res)
+  if f.deletion then
+    res.error = 'file deletion is not supported'
+  else
+    local buf = vim.fn.bufadd(f.path)
+    if not vim.api.nvim_buf_is_loaded(buf) then
+      vim.fn.bufload(buf)
+      vim.bo[buf].buflisted = true
+    end
+    res.bufnr = buf
+    local lines = vim.api.nvim_buf_get_lines(buf, 0, -1, false)
+    local fresh = #lines == 1 and lines[1] == ''
+    local planned, failed = {}, false
+    local drift, lower = 0, 0
+    for i, h in ipairs(f.hunks) do
+      local expected = math.max(h.start - 1, 0) + drift
+      if #h.old == 0 then expected = h.start + drift end
+      local pos, fuzz = nil, 0
+      if #h.old == 0 then
+        pos = math.min(math.max(expected, lower), #lines)
+      else
+        pos = locate(lines, h.old, expected, lower, false)
+        if pos == nil then
+          pos, fuzz = locate(lines, h.old, expected, lower, true), 1
+        end
+      end
+      if pos == nil then
+        failed = true
+        res.hunks[i] = {index = i, status = 'failed', message = 'context not found'}
+      else
+        local base = #h.old == 0 and h.start or math.max(h.start - 1, 0)
+        drift = pos - base
+        lower = pos + #h.old
+        res.hunks[i] = {index = i, status = 'applied', line = pos + 1,
+                        offset = drift, fuzz = fuzz}
+        table.insert(planned, {pos = pos, old = h.old, new = h.new})
+      end
+    end
+    if failed and strict then
+      for _, h in pairs(res.hunks) do
+        if h.status == 'applied' then
+          h.status = 'skipped'
+          h.message = 'another hunk failed'
+        end
+      end
+    elseif #planned > 0 then
+      vim.api.nvim_buf_call(buf, function()
+        for k = #planned, 1, -1 do
+          local p = planned[k]
+          if k < #planned then pcall(vim.cmd, 'undojoin') end
+          if f.new_file and fresh and k == 1 and p.pos == 0 then
+            vim.api.nvim_buf_set_lines(buf, 0, -1, false, p.new)
+          else
+            vim.api.nvim_buf_set_lines(buf, p.pos, p.pos + #p.old, false, p.new)
+          end
+        end
+      end)
+    end
+  end
+end
+return out
+"""
+
+
+def patches_to_lua(patches: List[FilePatch]) -> List[Dict[str, Any]]:
+    """Convert parsed patches to the argument shape of APPLY_PATCH_LUA."""
+    return [
+        {
+            "path": p.path,
+            "new_file": p.is_new_file,
+            "deletion": p.is_deletion,
+            "hunks": [h.to_lua() for h in p.hunks],
+        }
+        for p in patches
+    ]
+
+
+def format_patch_results(results: List[Dict[str, Any]]) -> str:
+    """Render APPLY_PATCH_LUA results as a per-hunk report."""
+    out = []
+    for res in results:
+        if res.get("error"):
+            out.append(f"{res['path']}: {res['error']}")
+            continue
+        out.append(f"{res['path']} (buffer {res.get('bufnr')}):")
+        hunks = res.get("hunks") or []
+        if isinstance(hunks, dict):
+            hunks = [hunks[k] for k in sorted(hunks, key=int)]
+        for h in hunks:
+            if h["status"] == "applied":
+                detail = f"applied at line {h['line']}"
+                if h.get("offset"):
+                    detail += f" (offset {h['offset']:+d})"
+                if h.get("fuzz"):
+                    detail += " (whitespace fuzz)"
+            else:
+                detail = f"{h['status']}: {h.get('message', '')}"
+            out.append(f"  hunk {h['index']}: {detail}")
+    return "\n".join(out)
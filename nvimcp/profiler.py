@@ -0,0 +1,288 @@
+"""On-demand profiling of the server process and of nvim."""
+
+import contextlib
+import contextvars
+import cProfile
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+SORT_KEYS = ("tottime", "cumtime")
+
+# Name of the tool being profiled, propagated into executor threads.
+current_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "nvimcp_profiled_tool", default=None
+)
+
+# Starts/stops :profile and the LuaJIT sampling profiler, and collects the
+# per-tool Lua chunk timings accumulated by TIMED_LUA.
+NVIM_PROFILE_LUA = r"""
+local action, log, jit_log = ...
+if action == "start" then
+  _G._nvimcp_profile = {}
+  vim.cmd("profile start " .. vim.fn.fnameescape(log))
+  vim.cmd("profile func *")
+  vim.cmd("profile file *")
+  local ok, jp = pcall(require, "jit.p")
+  _G._nvimcp_jitp = ok and jp or nil
+  if ok then
+    jp.start("Fi1", jit_log)
+  end
+  return ok
+end
+
+if _G._nvimcp_jitp then
+  pcall(_G._nvimcp_jitp.stop)
+  _G._nvimcp_jitp = nil
+end
+local ok, err = pcall(vim.cmd, "profile stop")
+local timings = {}
+for name, e in pairs(_G._nvimcp_profile or {}) do
+  timings[#timings + 1] = { name, e[1], e[2] }
+end
+_G._nvimcp_profile = nil
+return { timings = timings, error = (not ok) and tostring(err) or nil }
+"""
+
+# Runs a chunk and adds its nvim-side duration to the current tool's total.
+TIMED_LUA = r"""
+local name, code, args = ...
+local fn = assert((loadstring or load)(code, "=nvimcp"))
+local hrtime = (vim.uv or vim.loop).hrtime
+local t0 = hrtime()
+local result = fn(unpack(args))
+local p = _G._nvimcp_profile
+if p then
+  local e = p[name] or { 0, 0 }
+  e[1] = e[1] + 1
+  e[2] = e[2] + hrtime() - t0
+  p[name] = e
+end
+return result
+"""
+
+# Event loop idle waits dominate a wall-clock profile and say nothing.
+_IDLE = ("'select.", "<built-in method select.select>")
+
+
+def parse_vim_profile(text: str, limit: int = 20) -> Dict[str, List[Tuple]]:
+    """
+    Extract function and script totals from a :profile log.
+
+    Returns {"functions": [(count, total, self, name)],
+             "scripts": [(total, path)]}, most expensive first.
+    """
+    functions: List[Tuple] = []
+    scripts: List[Tuple] = []
+    lines = text.splitlines()
+    script = None
+    for i, line in enumerate(lines):
+        if line.startswith("SCRIPT "):
+            script = line[len("SCRIPT ") :].strip()
+        elif script and line.startswith("Total time:"):
+            scripts.append((float(line.split(":", 1)[1]), script))
+            script = None
+        elif line.startswith("FUNCTIONS SORTED ON TOTAL TIME"):
+            for row in lines[i + 2 :]:
+                if not row.strip():
+                    break
+                parts = row.split()
+                # Rows have an empty count/total for functions never finished
+                if len(parts) < 4:
+                    continue
+                count, total, self_time = parts[0], parts[1], parts[2]
+                functions.append(
+                    (int(count), float(total), float(self_time), " ".join(parts[3:]))
+                )
+            break
+    scripts.sort(reverse=True)
+    return {"functions": functions[:limit], "scripts": scripts[:limit]}
+
+
+def _func_name(key: Tuple[str, int, str]) -> str:
+    filename, line, name = key
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def hot_spots(
+    stats: pstats.Stats, sort: str = "tottime", limit: int = 20
+) -> List[Tuple[int, float, float, str]]:
+    """Top functions of merged profiles as (ncalls, tottime, cumtime, name)."""
+    rows = []
+    for key, (_, ncalls, tottime, cumtime, _) in stats.stats.items():
+        name = _func_name(key)
+        if any(idle in name for idle in _IDLE):
+            continue
+        rows.append((ncalls, tottime, cumtime, name))
+    index = 1 if sort == "tottime" else 2
+    rows.sort(key=lambda r: r[index], reverse=True)
+    return rows[:limit]
+
+
+class Profiler:
+    """
+    Toggleable cProfile of the event loop thread and executor threads.
+
+    cProfile only observes the thread that enabled it, so each executor
+    thread gets its own profile, enabled just around the work it runs for
+    a tool call; the profiles are merged when profiling stops. On Pythons
+    where cProfile is process wide the extra profiles fail to enable and
+    the loop thread's profile already sees everything.
+
+    start() and stop() must be called from the event loop thread.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.started = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles: List[cProfile.Profile] = []
+        self._main: Optional[cProfile.Profile] = None
+        self._tools: Dict[str, List[float]] = {}
+
+    def start(self):
+        with self._lock:
+            if self.active:
+                raise RuntimeError("Profiling is already running")
+            self._local = threading.local()
+            self._profiles = []
+            self._tools = {}
+            self._main = cProfile.Profile()
+            self._main.enable()
+            self.started = time.perf_counter()
+            self.active = True
+
+    def stop(self) -> Optional[pstats.Stats]:
+        """Stop profiling and return the merged Python statistics."""
+        with self._lock:
+            if not self.active:
+                raise RuntimeError("Profiling is not running")
+            self.active = False
+            self._main.disable()
+            profiles = [self._main] + self._profiles
+            self._main = None
+            self._profiles = []
+        stats = None
+        for profile in profiles:
+            # Profiles that never ran anything have no stats to load
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue
+        return stats
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started if self.active else 0.0
+
+    def run(self, func, *args):
+        """Run func(*args) on an executor thread under that thread's profile."""
+        if not self.active:
+            return func(*args)
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args)
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+
+    @contextlib.contextmanager
+    def measure(self, tool: str) -> Iterator[None]:
+        """Time a tool call and tag nvim-side work with its name."""
+        if not self.active:
+            yield
+            return
+        token = current_tool.set(tool)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            current_tool.reset(token)
+            duration = time.perf_counter() - start
+            with self._lock:
+                totals = self._tools.setdefault(tool, [0, 0.0])
+                totals[0] += 1
+                totals[1] += duration
+
+    def tool_totals(self) -> Dict[str, List[float]]:
+        """{tool: [calls, seconds]} since profiling started."""
+        with self._lock:
+            return {k: list(v) for k, v in self._tools.items()}
+
+
+class NvimProfile:
+    """Log files of one nvim-side profiling run."""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp(prefix="nvimcp-profile-")
+        self.log = os.path.join(self.dir, "profile.log")
+        self.jit_log = os.path.join(self.dir, "jit.log")
+
+    def read(self, path: str) -> str:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                return f.read()
+        except OSError:
+            return ""
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def format_profile(
+    elapsed: float,
+    tools: Dict[str, List[float]],
+    lua: Dict[str, List[float]],
+    python: List[Tuple[int, float, float, str]],
+    vim_profile: Optional[Dict[str, List[Tuple]]],
+    jit_report: str,
+    limit: int = 20,
+    nvim_error: Optional[str] = None,
+) -> str:
+    lines = [f"Profiled {elapsed:.2f}s"]
+    if tools:
+        lines.append("\nTools (calls, total, mean, nvim Lua):")
+        for tool, (calls, total) in sorted(
+            tools.items(), key=lambda t: t[1][1], reverse=True
+        ):
+            lua_calls, lua_ns = lua.get(tool, (0, 0))
+            lines.append(
+                f"  {tool}: {calls}, {total * 1000:.1f}ms, "
+                f"{total * 1000 / calls:.2f}ms, {lua_ns / 1e6:.1f}ms"
+                f" in {lua_calls} chunks"
+            )
+    if python:
+        lines.append("\nPython hot spots (ncalls, tottime, cumtime):")
+        for ncalls, tottime, cumtime, name in python:
+            lines.append(f"  {ncalls:>7} {tottime:>8.4f}s {cumtime:>8.4f}s  {name}")
+    if vim_profile and vim_profile["functions"]:
+        lines.append("\nnvim functions (count, total, self):")
+        for count, total, self_time, name in vim_profile["functions"]:
+            lines.append(f"  {count:>7} {total:>8.4f}s {self_time:>8.4f}s  {name}")
+    if vim_profile and vim_profile["scripts"]:
+        lines.append("\nnvim scripts (total):")
+        for total, path in vim_profile["scripts"]:
+            lines.append(f"  {total:>8.4f}s  {path}")
+    report = [l for l in jit_report.splitlines() if l.strip()][:limit]
+    if report:
+        lines.append("\nLuaJIT samples:")
+        lines.extend(f"  {l.strip()}" for l in report)
+    if nvim_error:
+        lines.append(f"\nnvim profiling failed: {nvim_error}")
+    return "\n".join(lines)
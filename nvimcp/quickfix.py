@@ -0,0 +1,136 @@
+"""Structured, paged access to quickfix and location lists."""
+
+import json
+from typing import Any, Dict, List
+
+ACTIONS = {"replace": "r", "append": "a", "new": " "}
+
+_PRELUDE = r"""
+local function opt(v)
+  if v == vim.NIL then
+    return nil
+  end
+  return v
+end
+
+local function getter(win)
+  if win then
+    return function(what)
+      return vim.fn.getloclist(win, what)
+    end
+  end
+  return vim.fn.getqflist
+end
+
+local function summary(get, id)
+  local info = get({ id = id or 0, changedtick = 1, size = 1, title = 1, idx = 1, nr = 1 })
+  return {
+    id = info.id,
+    changedtick = info.changedtick,
+    size = info.size,
+    title = info.title,
+    idx = info.idx,
+    nr = info.nr,
+  }
+end
+"""
+
+# Args: window (nil for quickfix), list id (nil for current), changedtick the
+# caller already has (or nil), offset, limit.
+GET_QF_LUA = _PRELUDE + r"""
+local win, id, since, offset, limit = ...
+win, id, since = opt(win), opt(id), opt(since)
+local get = getter(win)
+local out = summary(get, id)
+if out.id == 0 then
+  return out
+end
+if since and out.changedtick == since then
+  out.unchanged = true
+  return out
+end
+
+local items = {}
+local last = math.min(out.size, offset + limit)
+if last > offset then
+  -- getqflist() has no range query; only the page crosses the RPC boundary
+  local all = get({ id = out.id, items = 1 }).items
+  local names = {}
+  for i = offset + 1, last do
+    local it = all[i]
+    local name = names[it.bufnr]
+    if name == nil then
+      name = it.bufnr > 0 and vim.fn.bufname(it.bufnr) or ""
+      names[it.bufnr] = name
+    end
+    local item = { filename = name, lnum = it.lnum, col = it.col, text = it.text }
+    if (it.end_lnum or 0) > 0 then
+      item.end_lnum = it.end_lnum
+    end
+    if (it.end_col or 0) > 0 then
+      item.end_col = it.end_col
+    end
+    if it.type ~= "" then
+      item.type = it.type
+    end
+    if (it.nr or 0) > 0 then
+      item.nr = it.nr
+    end
+    if it.valid == 0 then
+      item.valid = false
+    end
+    items[#items + 1] = item
+  end
+end
+out.items = items
+if last < out.size then
+  out.next_offset = last
+end
+return out
+"""
+
+# Args: window (nil for quickfix), list id (nil for current), action flag,
+# items, title (or nil).
+SET_QF_LUA = _PRELUDE + r"""
+local win, id, action, items, title = ...
+win, id, title = opt(win), opt(id), opt(title)
+for _, it in ipairs(items) do
+  if type(it.valid) == "boolean" then
+    it.valid = it.valid and 1 or 0
+  end
+end
+local what = { items = items, title = title, id = id }
+local rc
+if win then
+  rc = vim.fn.setloclist(win, {}, action, what)
+else
+  rc = vim.fn.setqflist({}, action, what)
+end
+if rc ~= 0 then
+  error("could not update the list (does it exist?)", 0)
+end
+-- A new list becomes the current one
+return summary(getter(win), action ~= " " and id or nil)
+"""
+
+
+def format_list(result: Dict[str, Any]) -> str:
+    return json.dumps(result, separators=(",", ":"))
+
+
+def build_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Quickfix items as setqflist() expects them."""
+    out = []
+    for item in items:
+        it = {k: v for k, v in item.items() if v is not None}
+        if "filename" not in it and "bufnr" not in it:
+            raise ValueError("each item needs a filename or bufnr")
+        out.append(it)
+    return out
+
+
+def action_flag(action: str) -> str:
+    try:
+        return ACTIONS[action]
+    except KeyError:
+        raise ValueError(f"Unknown action: {action}") from None
@@ -0,0 +1,136 @@
+"""Session recording for performance regression testing."""
+
+import contextvars
+import itertools
+import json
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+import msgpack
+
+TRACE_VERSION = 1
+
+# Id of the tool call being executed, propagated into executor threads.
+current_call: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    "nvimcp_current_call", default=None
+)
+
+
+def _plain(value: Any) -> Any:
+    """Reduce RPC arguments to JSON/msgpack friendly values."""
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    handle = getattr(value, "handle", None)
+    if isinstance(handle, int):
+        return {"remote": type(value).__name__, "handle": handle}
+    return repr(value)
+
+
+class SessionRecorder:
+    """
+    Opt-in recorder of tool calls and the nvim RPCs they make.
+
+    Writes one event per line as JSON, or as a msgpack stream when the path
+    ends in ".msgpack". Events:
+
+        {"t": "meta", "version": 1, "started": <epoch seconds>}
+        {"t": "call", "id": 1, "tool": ..., "args": {...}, "ts": <offset>,
+         "dur": <seconds>, "ok": true, "out": <result chars>}
+        {"t": "rpc", "call": 1, "m": "nvim_exec_lua", "ts": ..., "dur": ...,
+         "ok": true}
+
+    Offsets are seconds since the recorder was created.
+    """
+
+    def __init__(self, path: str, include_rpc: bool = True, rpc_args: bool = False):
+        self.path = path
+        self.include_rpc = include_rpc
+        self.rpc_args = rpc_args
+        self._binary = path.endswith(".msgpack")
+        self._file = open(
+            path,
+            "wb" if self._binary else "w",
+            encoding=None if self._binary else "utf-8",
+        )
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._t0 = time.perf_counter()
+        self._write({"t": "meta", "version": TRACE_VERSION, "started": time.time()})
+
+    def _write(self, event: Dict[str, Any]):
+        with self._lock:
+            if self._file.closed:
+                return
+            if self._binary:
+                self._file.write(msgpack.packb(event, use_bin_type=True))
+            else:
+                self._file.write(json.dumps(event, separators=(",", ":")) + "\n")
+            self._file.flush()
+
+    def offset(self, perf_time: float) -> float:
+        return perf_time - self._t0
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def record_call(
+        self,
+        call_id: int,
+        tool: str,
+        arguments: Dict[str, Any],
+        start: float,
+        duration: float,
+        ok: bool,
+        out: int,
+    ):
+        self._write(
+            {
+                "t": "call",
+                "id": call_id,
+                "tool": tool,
+                "args": _plain(arguments),
+                "ts": round(self.offset(start), 6),
+                "dur": round(duration, 6),
+                "ok": ok,
+                "out": out,
+            }
+        )
+
+    def record_rpc(self, method, args, start, duration, error):
+        """RpcHooks observer."""
+        if not self.include_rpc:
+            return
+        event = {
+            "t": "rpc",
+            "call": current_call.get(),
+            "m": method.decode() if isinstance(method, bytes) else method,
+            "ts": round(self.offset(start), 6),
+            "dur": round(duration, 6),
+            "ok": error is None,
+        }
+        if self.rpc_args:
+            event["args"] = _plain(args)
+        self._write(event)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """Iterate over the events of a recorded trace."""
+    if path.endswith(".msgpack"):
+        with open(path, "rb") as f:
+            yield from msgpack.Unpacker(f, raw=False)
+    else:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
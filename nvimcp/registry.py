@@ -0,0 +1,251 @@
+"""Declarative tool registry with cached schemas and compiled validators."""
+
+import logging
+from dataclasses import dataclass, field
+from importlib.metadata import entry_points
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from mcp.types import TextContent, Tool
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "nvimcp.tools"
+
+ToolHandler = Callable[..., Awaitable[List[TextContent]]]
+Validator = Callable[[Any, str], Any]
+
+
+class ToolArgumentError(ValueError):
+    """Raised when tool arguments do not match the tool's input schema."""
+
+    pass
+
+
+def _is_integer(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": _is_integer,
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def compile_schema(schema: Dict[str, Any], closed: bool = False) -> Validator:
+    """
+    Compile the JSON schema subset tools use into a validating function.
+
+    Supports type (single or list), enum, properties, required,
+    additionalProperties, items, minimum/maximum and minItems/maxItems;
+    other keywords are ignored. The returned function takes (value, path)
+    and returns the value, with integral floats coerced for "integer";
+    it raises ToolArgumentError on mismatch.
+
+    Args:
+        schema: JSON schema
+        closed: Reject unknown properties even without
+            additionalProperties: false (tool handlers take keywords)
+    """
+    checks: List[Validator] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        preds = [_TYPE_CHECKS[t] for t in names if t in _TYPE_CHECKS]
+        wants_int = "integer" in names
+        expected = " or ".join(names)
+
+        def check_type(value, path):
+            if any(p(value) for p in preds):
+                return value
+            if wants_int and isinstance(value, float) and value.is_integer():
+                return int(value)
+            raise ToolArgumentError(
+                f"{path} must be {expected}, got {type(value).__name__}"
+            )
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value, path):
+            if value not in allowed:
+                raise ToolArgumentError(
+                    f"{path} must be one of {', '.join(map(repr, allowed))}"
+                )
+            return value
+
+        checks.append(check_enum)
+
+    low, high = schema.get("minimum"), schema.get("maximum")
+    if low is not None or high is not None:
+
+        def check_range(value, path):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                if low is not None and value < low:
+                    raise ToolArgumentError(f"{path} must be >= {low}")
+                if high is not None and value > high:
+                    raise ToolArgumentError(f"{path} must be <= {high}")
+            return value
+
+        checks.append(check_range)
+
+    items = schema.get("items")
+    min_items, max_items = schema.get("minItems"), schema.get("maxItems")
+    if isinstance(items, dict) or min_items is not None or max_items is not None:
+        item = compile_schema(items) if isinstance(items, dict) else None
+
+        def check_items(value, path):
+            if not isinstance(value, list):
+                return value
+            if min_items is not None and len(value) < min_items:
+                raise ToolArgumentError(f"{path} needs at least {min_items} items")
+            if max_items is not None and len(value) > max_items:
+                raise ToolArgumentError(f"{path} allows at most {max_items} items")
+            if item is None:
+                return value
+            return [item(v, f"{path}[{i}]") for i, v in enumerate(value)]
+
+        checks.append(check_items)
+
+    props = schema.get("properties")
+    required = schema.get("required", [])
+    extra = schema.get("additionalProperties", not closed)
+    if props is not None or required or extra is not True:
+        fields = {k: compile_schema(v) for k, v in (props or {}).items()}
+        extra_check = compile_schema(extra) if isinstance(extra, dict) else None
+
+        def check_object(value, path):
+            if not isinstance(value, dict):
+                return value
+            missing = [k for k in required if k not in value]
+            if missing:
+                raise ToolArgumentError(
+                    f"missing required argument{'s' if len(missing) > 1 else ''}: "
+                    f"{', '.join(missing)}"
+                    if path == "arguments"
+                    else f"{path} is missing {', '.join(missing)}"
+                )
+            out = {}
+            for k, v in value.items():
+                sub = f"{k}" if path == "arguments" else f"{path}.{k}"
+                check = fields.get(k, extra_check)
+                if check is not None:
+                    out[k] = check(v, sub)
+                elif extra is False:
+                    raise ToolArgumentError(f"unexpected argument: {sub}")
+                else:
+                    out[k] = v
+            return out
+
+        checks.append(check_object)
+
+    if not checks:
+        return lambda value, path: value
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value, path):
+        for check in checks:
+            value = check(value, path)
+        return value
+
+    return check_all
+
+
+@dataclass
+class ToolSpec:
+    """
+    A tool: its MCP metadata, handler and call semantics.
+
+    The handler is awaited with the validated arguments as keywords and
+    returns a list of TextContent. read_only tools only inspect state, so
+    they may be replayed, e.g. after a reconnect.
+    """
+
+    name: str
+    description: str
+    handler: ToolHandler
+    input_schema: Dict[str, Any] = field(
+        default_factory=lambda: {"type": "object", "properties": {}}
+    )
+    read_only: bool = False
+    validator: Validator = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.validator = compile_schema(self.input_schema, closed=True)
+
+    def tool(self) -> Tool:
+        return Tool(
+            name=self.name, description=self.description, inputSchema=self.input_schema
+        )
+
+    def validate(self, arguments: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return self.validator(arguments or {}, "arguments")
+
+
+class ToolRegistry:
+    """
+    Tools by name, with the MCP tool list built once per change.
+
+    Plugins are callables taking the server and returning ToolSpecs,
+    either passed to load_plugin() or advertised as entry points in the
+    "nvimcp.tools" group.
+    """
+
+    def __init__(self):
+        self._specs: Dict[str, ToolSpec] = {}
+        self._tools: Optional[List[Tool]] = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    def __len__(self) -> int:
+        return len(self._specs)
+
+    def register(self, spec: ToolSpec, replace: bool = False):
+        if spec.name in self._specs and not replace:
+            raise ValueError(f"Tool already registered: {spec.name}")
+        self._specs[spec.name] = spec
+        self._tools = None
+
+    def unregister(self, name: str):
+        if self._specs.pop(name, None) is not None:
+            self._tools = None
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._specs.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def read_only(self, name: str) -> bool:
+        spec = self._specs.get(name)
+        return spec is not None and spec.read_only
+
+    def tools(self) -> List[Tool]:
+        """MCP tool list, cached until the registry changes."""
+        if self._tools is None:
+            self._tools = [spec.tool() for spec in self._specs.values()]
+        return self._tools
+
+    def load_plugin(self, plugin: Callable[[Any], Iterable[ToolSpec]], server: Any):
+        for spec in plugin(server) or ():
+            self.register(spec)
+
+    def load_entry_points(self, server: Any, group: str = ENTRY_POINT_GROUP) -> int:
+        """Register tools from installed plugins; returns how many loaded."""
+        loaded = 0
+        for ep in entry_points(group=group):
+            try:
+                self.load_plugin(ep.load(), server)
+                loaded += 1
+            except Exception as e:
+                logger.error(f"Failed to load tool plugin {ep.name}: {e}")
+        return loaded
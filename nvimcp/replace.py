@@ -0,0 +1,140 @@
+"""In-nvim find/replace across buffers for nvimcp server."""
+
+from typing import Any, Dict, List
+
+ENGINES = ("vim", "lua")
+
+# Runs entirely inside nvim: only counts, previews and changed-line numbers
+# are returned. The "vim" engine uses Vim regex via substitute() (same
+# semantics as :substitute with the g flag), counting matches with a
+# callback so anchors count as they replace; the "lua" engine uses
+# string.gsub with Lua patterns. A dry run leaves files it had to load
+# unlisted and unloads (or wipes) them again.
+REPLACE_LUA = r"""
+local targets, pattern, repl, engine, dry_run, max_preview = ...
+
+local bufs, seen = {}, {}
+local function add(buf)
+  if not seen[buf] then
+    seen[buf] = true
+    table.insert(bufs, buf)
+  end
+end
+local loaded_here = {}
+local function add_file(path)
+  local existed = vim.fn.bufexists(path) == 1
+  local buf = vim.fn.bufadd(path)
+  if not vim.api.nvim_buf_is_loaded(buf) then
+    vim.fn.bufload(buf)
+    if dry_run then
+      loaded_here[buf] = existed and 'unload' or 'wipe'
+    else
+      vim.bo[buf].buflisted = true
+    end
+  end
+  add(buf)
+end
+for _, b in ipairs(targets.buffers or {}) do
+  add(b == 0 and vim.api.nvim_get_current_buf() or b)
+end
+for _, f in ipairs(targets.files or {}) do add_file(f) end
+if targets.arglist then
+  for _, f in ipairs(vim.fn.argv()) do add_file(f) end
+end
+if #bufs == 0 then add(vim.api.nvim_get_current_buf()) end
+
+local function count_vim(line)
+  local n = 0
+  vim.fn.substitute(line, pattern, function()
+    n = n + 1
+    return ''
+  end, 'g')
+  return n
+end
+
+local function replace_line(line)
+  if engine == 'lua' then
+    return line:gsub(pattern, repl)
+  end
+  local n = count_vim(line)
+  if n == 0 then return line, 0 end
+  return vim.fn.substitute(line, pattern, repl, 'g'), n
+end
+
+local out = {}
+for _, buf in ipairs(bufs) do
+  local res = {bufnr = buf, name = vim.api.nvim_buf_get_name(buf),
+               matches = 0, lines = 0, preview = {}}
+  table.insert(out, res)
+  if not vim.api.nvim_buf_is_valid(buf) then
+    res.error = 'invalid buffer'
+  else
+    local lines = vim.api.nvim_buf_get_lines(buf, 0, -1, false)
+    local changed = {}
+    for i, line in ipairs(lines) do
+      local ok, new, n = pcall(replace_line, line)
+      if not ok then
+        res.error = tostring(new)
+        break
+      end
+      if n > 0 then
+        res.matches = res.matches + n
+        res.lines = res.lines + 1
+        if #res.preview < max_preview then
+          table.insert(res.preview, {line = i, old = line, new = new})
+        end
+        if new ~= line then
+          table.insert(changed, {i, vim.split(new, '\n', {plain = true})})
+        end
+      end
+    end
+    if not res.error and not dry_run and #changed > 0 then
+      if not vim.bo[buf].modifiable then
+        res.error = 'buffer is not modifiable'
+      else
+        vim.api.nvim_buf_call(buf, function()
+          for k = #changed, 1, -1 do
+            local c = changed[k]
+            if k < #changed then pcall(vim.cmd, 'undojoin') end
+            vim.api.nvim_buf_set_lines(buf, c[1] - 1, c[1], false, c[2])
+          end
+        end)
+      end
+    end
+  end
+end
+for buf, how in pairs(loaded_here) do
+  pcall(vim.api.nvim_buf_delete, buf, {unload = how == 'unload'})
+end
+return out
+"""
+
+
+def build_targets(
+    buffer_ids: List[int] = None, files: List[str] = None, use_arglist: bool = False
+) -> Dict[str, Any]:
+    """Build the target description passed to REPLACE_LUA."""
+    return {
+        "buffers": list(buffer_ids or []),
+        "files": list(files or []),
+        "arglist": bool(use_arglist),
+    }
+
+
+def format_replace_results(results: List[Dict[str, Any]], dry_run: bool) -> str:
+    """Render REPLACE_LUA results as a per-buffer report."""
+    verb = "would replace" if dry_run else "replaced"
+    out = []
+    total = 0
+    for res in results:
+        label = f"{res.get('name') or '[No Name]'} (buffer {res['bufnr']})"
+        if res.get("error"):
+            out.append(f"{label}: error: {res['error']}")
+            continue
+        total += res["matches"]
+        out.append(f"{label}: {verb} {res['matches']} matches on {res['lines']} lines")
+        for p in res.get("preview") or []:
+            out.append(f"  {p['line']}: {p['old']}")
+            out.append(f"  {p['line']}> {p['new']}")
+    out.append(f"total: {total} matches in {len(results)} buffers")
+    return "\n".join(out)
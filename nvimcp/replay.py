@@ -0,0 +1,166 @@
+"""Replay recorded sessions against a fresh embedded nvim and compare latency."""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .connection import LEAN_NVIM_ARGS, connect_neovim
+from .core import NvimcpServer, _is_error
+from .recorder import read_trace
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NVIM_ARGS = LEAN_NVIM_ARGS
+
+
+@dataclass
+class ReplayResult:
+    """Outcome of replaying one recorded tool call."""
+
+    tool: str
+    recorded: float
+    replayed: float
+    ok: bool
+
+
+def load_calls(path: str) -> List[Dict[str, Any]]:
+    """Recorded tool calls of a trace, ordered by start time."""
+    calls = [e for e in read_trace(path) if e.get("t") == "call"]
+    calls.sort(key=lambda e: e["ts"])
+    return calls
+
+
+async def replay(
+    server, calls: List[Dict[str, Any]], speed: Optional[float] = None
+) -> List[ReplayResult]:
+    """
+    Drive `server` through recorded calls.
+
+    Args:
+        server: NvimcpServer to call tools on
+        calls: Events from load_calls()
+        speed: None replays back to back as fast as possible; otherwise
+            calls start at their recorded offsets divided by `speed` and
+            may overlap as they did originally
+
+    Returns:
+        One ReplayResult per call, in trace order
+    """
+
+    async def run(call: Dict[str, Any]) -> ReplayResult:
+        start = time.perf_counter()
+        result = await server.call_tool(call["tool"], call.get("args") or {})
+        return ReplayResult(
+            call["tool"],
+            call["dur"],
+            time.perf_counter() - start,
+            not _is_error(result),
+        )
+
+    if speed is None:
+        return [await run(call) for call in calls]
+
+    t0 = time.perf_counter()
+    base = calls[0]["ts"] if calls else 0.0
+    tasks = []
+    for call in calls:
+        delay = (call["ts"] - base) / speed - (time.perf_counter() - t0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run(call)))
+    return list(await asyncio.gather(*tasks))
+
+
+def _p(values: List[float], q: float) -> float:
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(q) - 1]
+
+
+def summarize(results: List[ReplayResult]) -> Dict[str, Dict[str, float]]:
+    """Per-tool latency percentiles (milliseconds) and relative delta."""
+    by_tool: Dict[str, List[ReplayResult]] = {}
+    for r in results:
+        by_tool.setdefault(r.tool, []).append(r)
+    summary = {}
+    for tool, rs in sorted(by_tool.items()):
+        rec = [r.recorded * 1000 for r in rs]
+        rep = [r.replayed * 1000 for r in rs]
+        rec_p50, rep_p50 = _p(rec, 50), _p(rep, 50)
+        summary[tool] = {
+            "count": len(rs),
+            "failed": sum(not r.ok for r in rs),
+            "recorded_p50": rec_p50,
+            "recorded_p95": _p(rec, 95),
+            "replayed_p50": rep_p50,
+            "replayed_p95": _p(rep, 95),
+            "delta": (rep_p50 - rec_p50) / rec_p50 if rec_p50 else 0.0,
+        }
+    return summary
+
+
+def format_summary(summary: Dict[str, Dict[str, float]]) -> str:
+    lines = [
+        f"{'tool':<20} {'n':>5} {'fail':>4} {'rec p50':>9} {'rep p50':>9} "
+        f"{'rec p95':>9} {'rep p95':>9} {'delta':>7}"
+    ]
+    for tool, s in summary.items():
+        lines.append(
+            f"{tool:<20} {s['count']:>5} {s['failed']:>4} "
+            f"{s['recorded_p50']:>7.2f}ms {s['replayed_p50']:>7.2f}ms "
+            f"{s['recorded_p95']:>7.2f}ms {s['replayed_p95']:>7.2f}ms "
+            f"{s['delta']:>+6.0%}"
+        )
+    return "\n".join(lines)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded nvimcp trace")
+    parser.add_argument("trace", help="Trace written by standalone.py --record")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        help="Replay at recorded timing divided by SPEED (default: max speed)",
+    )
+    parser.add_argument(
+        "--nvim-arg",
+        action="append",
+        dest="nvim_args",
+        help=f"Embedded nvim argv (repeatable, default: {' '.join(DEFAULT_NVIM_ARGS)})",
+    )
+    parser.add_argument(
+        "--fail-over",
+        type=float,
+        metavar="RATIO",
+        help="Exit non-zero if any tool's p50 delta exceeds RATIO (e.g. 0.2)",
+    )
+    args = parser.parse_args(argv)
+
+    calls = load_calls(args.trace)
+    nvim = connect_neovim(
+        mode="embedded", nvim_args=args.nvim_args or DEFAULT_NVIM_ARGS
+    )
+    try:
+        server = NvimcpServer(nvim)
+        results = await replay(server, calls, args.speed)
+    finally:
+        nvim.close()
+
+    summary = summarize(results)
+    print(format_summary(summary))
+    if args.fail_over is not None:
+        regressed = [t for t, s in summary.items() if s["delta"] > args.fail_over]
+        if regressed:
+            print(f"Latency regression in: {', '.join(regressed)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
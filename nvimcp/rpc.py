@@ -0,0 +1,77 @@
+"""Observation hooks for the msgpack-rpc requests pynvim sends to nvim."""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# observer(method, args, start, duration, error)
+RpcObserver = Callable[[str, tuple, float, float, Optional[BaseException]], None]
+
+
+class RpcHooks:
+    """
+    Wraps the request method of a pynvim session and notifies observers.
+
+    Every API call made through a pynvim.Nvim (including buffer, window
+    and `current` helpers) funnels into its session's request method, so
+    one wrapper sees all of them. Observers run on the calling thread.
+    """
+
+    def __init__(self):
+        self._observers: List[RpcObserver] = []
+        self._lock = threading.Lock()
+        self._session = None
+        self._original = None
+
+    @property
+    def installed(self) -> bool:
+        return self._session is not None
+
+    def install(self, nvim: Any) -> bool:
+        """Start observing `nvim`; returns False if it has no session."""
+        session = getattr(nvim, "_session", None)
+        if session is None or not hasattr(session, "request"):
+            return False
+        if self._session is session:
+            return True
+        self.uninstall()
+        original = session.request
+
+        def request(method, *args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return original(method, *args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                self._notify(method, args, start, time.perf_counter() - start, error)
+
+        session.request = request
+        self._session, self._original = session, original
+        return True
+
+    def uninstall(self):
+        if self._session is not None:
+            self._session.request = self._original
+            self._session = self._original = None
+
+    def add(self, observer: RpcObserver):
+        with self._lock:
+            self._observers.append(observer)
+
+    def remove(self, observer: RpcObserver):
+        with self._lock:
+            if observer in self._observers:
+                self._observers.remove(observer)
+
+    def _notify(self, method, args, start, duration, error):
+        for observer in list(self._observers):
+            try:
+                observer(method, args, start, duration, error)
+            except Exception as e:
+                logger.error(f"RPC observer failed: {e}")
@@ -0,0 +1,194 @@
+"""Saving many buffers at once, large ones written by the server itself."""
+
+import os
+import secrets
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+# Buffers of at least this many bytes are written directly when autocmds
+# are skipped; below it one more :write in nvim is cheaper than the transfer
+DIRECT_MIN_BYTES = 1 << 20
+
+# Args: buffer ids (nil = every modified file buffer), run autocmds,
+# direct_min (bytes, negative = never direct), fsync.
+# Buffers nvim can write as-is are written here with :write (or
+# :noautocmd write); the rest come back with their lines and changedtick
+# for the server to write. 'fsync' is set for the duration only.
+SAVE_LUA = r"""
+local ids, autocmds, direct_min, fsync = ...
+if ids == nil or ids == vim.NIL then
+  ids = {}
+  for _, b in ipairs(vim.api.nvim_list_bufs()) do
+    if vim.api.nvim_buf_is_loaded(b) and vim.bo[b].modified
+        and vim.bo[b].buftype == "" and vim.api.nvim_buf_get_name(b) ~= "" then
+      ids[#ids + 1] = b
+    end
+  end
+end
+
+local write = (autocmds and "" or "noautocmd ") .. "silent write"
+local saved_fsync = vim.o.fsync
+vim.o.fsync = fsync
+local out = {}
+for i, b in ipairs(ids) do
+  local r = { buf = b }
+  if not vim.api.nvim_buf_is_valid(b) or not vim.api.nvim_buf_is_loaded(b) then
+    r.error = "invalid or unloaded buffer"
+  elseif vim.bo[b].buftype ~= "" then
+    r.error = "not a file buffer"
+  elseif vim.api.nvim_buf_get_name(b) == "" then
+    r.error = "no file name"
+  else
+    r.name = vim.api.nvim_buf_get_name(b)
+    local count = vim.api.nvim_buf_line_count(b)
+    local size = vim.api.nvim_buf_get_offset(b, count)
+    local fenc = vim.bo[b].fileencoding
+    if not autocmds and direct_min >= 0 and size >= direct_min
+        and not vim.bo[b].binary and (fenc == "" or fenc == "utf-8") then
+      r.direct = true
+      r.tick = vim.api.nvim_buf_get_changedtick(b)
+      r.lines = size > 0 and vim.api.nvim_buf_get_lines(b, 0, -1, false) or {}
+      r.fileformat = vim.bo[b].fileformat
+      r.eol = vim.bo[b].eol or vim.bo[b].fixeol
+      r.bomb = vim.bo[b].bomb
+    else
+      local ok, err = pcall(vim.api.nvim_buf_call, b, function()
+        vim.cmd(write)
+      end)
+      if ok then
+        r.written = true
+      else
+        r.error = tostring(err)
+      end
+    end
+  end
+  out[i] = r
+end
+vim.o.fsync = saved_fsync
+return out
+"""
+
+# Args: {{buf, changedtick}, ...} of buffers written by the server.
+# Buffers still at that changedtick are marked unmodified; the file is newer
+# than nvim's record of it, so a checktime under a no-op FileChangedShell
+# updates the record instead of warning on the next focus.
+# Returns a list of booleans, false where the buffer changed meanwhile.
+MARK_SAVED_LUA = r"""
+local saved = ...
+local group = vim.api.nvim_create_augroup("nvimcp_saved", { clear = true })
+vim.api.nvim_create_autocmd("FileChangedShell", {
+  group = group,
+  callback = function()
+    vim.v.fcs_choice = ""
+  end,
+})
+local out = {}
+for i, s in ipairs(saved) do
+  local b, tick = s[1], s[2]
+  if vim.api.nvim_buf_is_valid(b) and vim.api.nvim_buf_get_changedtick(b) == tick then
+    pcall(vim.cmd, "checktime " .. b)
+    vim.bo[b].modified = false
+    out[i] = true
+  else
+    out[i] = false
+  end
+end
+vim.api.nvim_del_augroup_by_id(group)
+return out
+"""
+
+_SEPARATORS = {"unix": "\n", "dos": "\r\n", "mac": "\r"}
+
+
+def encode_lines(
+    lines: List[str], fileformat: str = "unix", eol: bool = True, bomb: bool = False
+) -> bytes:
+    """File contents nvim would write for `lines` with these options (UTF-8)."""
+    sep = _SEPARATORS.get(fileformat, "\n")
+    text = sep.join(lines)
+    if lines and eol:
+        text += sep
+    # pynvim decodes invalid UTF-8 with surrogateescape; write it back as-is
+    data = text.encode("utf-8", "surrogateescape")
+    return b"\xef\xbb\xbf" + data if bomb else data
+
+
+def write_file(path: str, data: bytes, fsync: bool = True):
+    """
+    Replace `path` with `data` so a crash leaves the old or the new file.
+
+    The data goes to a temporary file next to it, which takes over the
+    old mode and owner and is renamed into place; symlinks are followed,
+    hard links to the old file keep the old contents.
+    """
+    path = os.path.realpath(path)
+    directory, name = os.path.split(path)
+    try:
+        old = os.stat(path)
+    except FileNotFoundError:
+        old = None
+    tmp = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.nvimcp~")
+    fd = os.open(
+        tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666 if old is None else 0o600
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if old is not None:
+                new = os.fstat(f.fileno())
+                if (new.st_uid, new.st_gid) != (old.st_uid, old.st_gid):
+                    os.fchown(f.fileno(), old.st_uid, old.st_gid)
+                os.fchmod(f.fileno(), stat.S_IMODE(old.st_mode))
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    if fsync:
+        # The rename itself is only durable once the directory is synced
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_files(
+    jobs: List[Tuple[str, bytes]], fsync: bool = True, workers: int = 8
+) -> List[Optional[str]]:
+    """Write (path, data) jobs in parallel; returns an error or None per job."""
+
+    def run(job):
+        try:
+            write_file(job[0], job[1], fsync)
+            return None
+        except OSError as e:
+            return str(e)
+
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(run, jobs))
+
+
+def format_save_results(results: List[Dict[str, Any]]) -> str:
+    saved = [r for r in results if r.get("written")]
+    direct = sum(1 for r in saved if r.get("direct"))
+    lines = [f"Saved {len(saved)} of {len(results)} buffers"]
+    if direct:
+        lines[0] += f" ({direct} written directly)"
+    for r in results:
+        label = f"buffer {r['buf']}"
+        if r.get("name"):
+            label += f" ({r['name']})"
+        if r.get("error"):
+            lines.append(f"{label}: {r['error']}")
+        elif r.get("changed"):
+            lines.append(f"{label}: written, but changed meanwhile; left modified")
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""Hidden scratch buffers for cheap bulk file reads."""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+# Loads files into unlisted, hidden buffers with every autocmd ignored, so
+# no filetype detection, syntax, ftplugins, treesitter or LSP attach runs.
+# Buffers the user already has are never adopted: loaded ones are read
+# as-is, unloaded ones (from a session, :badd or the arglist) are loaded
+# for the read and unloaded again with their options untouched.
+# Afterwards the least recently used scratch buffers beyond `capacity` are
+# wiped, skipping any the request touched or the user has since adopted.
+LOAD_FILES_LUA = r"""
+local paths, max_lines, with_content, lru, capacity = ...
+local saved_ei = vim.o.eventignore
+vim.o.eventignore = 'all'
+
+local out, ours, touched = {}, {}, {}
+for _, b in ipairs(lru) do ours[b] = true end
+
+local ok, err = pcall(function()
+  for _, path in ipairs(paths) do
+    local res = {path = path}
+    table.insert(out, res)
+    if vim.fn.filereadable(path) == 0 then
+      res.error = 'file not readable'
+    else
+      local existed = vim.fn.bufexists(path) == 1
+      local buf = vim.fn.bufadd(path)
+      res.bufnr = buf
+      res.name = vim.api.nvim_buf_get_name(buf)
+      local unload = false
+      if not vim.api.nvim_buf_is_loaded(buf) then
+        if existed and not ours[buf] then
+          unload = true
+        else
+          vim.bo[buf].buflisted = false
+          vim.bo[buf].bufhidden = 'hide'
+          vim.bo[buf].swapfile = false
+          ours[buf] = true
+        end
+        vim.fn.bufload(buf)
+      end
+      res.scratch = ours[buf] == true
+      touched[buf] = true
+      res.line_count = vim.api.nvim_buf_line_count(buf)
+      if with_content then
+        local stop = max_lines > 0 and math.min(max_lines, res.line_count) or -1
+        res.lines = vim.api.nvim_buf_get_lines(buf, 0, stop, false)
+      end
+      if unload then
+        vim.api.nvim_buf_delete(buf, {unload = true})
+      end
+    end
+  end
+
+  local count = 0
+  for _ in pairs(ours) do count = count + 1 end
+  local evicted, adopted = {}, {}
+  for _, b in ipairs(lru) do
+    if count <= capacity then break end
+    if not touched[b] then
+      count = count - 1
+      if not vim.api.nvim_buf_is_valid(b) then
+        table.insert(evicted, b)
+      elseif vim.bo[b].buflisted or vim.bo[b].modified or vim.fn.bufwinid(b) ~= -1 then
+        table.insert(adopted, b)
+      else
+        vim.api.nvim_buf_delete(b, {force = true})
+        table.insert(evicted, b)
+      end
+    end
+  end
+  out = {files = out, evicted = evicted, adopted = adopted}
+end)
+
+vim.o.eventignore = saved_ei
+if not ok then error(err) end
+return out
+"""
+
+
+class ScratchPool:
+    """LRU bookkeeping for scratch buffers created by open_files."""
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self._buffers: "OrderedDict[int, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffers)
+
+    def __contains__(self, bufnr: int) -> bool:
+        return bufnr in self._buffers
+
+    def lru_order(self) -> List[int]:
+        """Buffer numbers, least recently used first."""
+        with self._lock:
+            return list(self._buffers)
+
+    def touch(self, bufnr: int, name: str):
+        """Mark a scratch buffer as most recently used."""
+        with self._lock:
+            self._buffers.pop(bufnr, None)
+            self._buffers[bufnr] = name
+
+    def discard(self, bufnr: int):
+        """Forget a buffer that was evicted or adopted by the user."""
+        with self._lock:
+            self._buffers.pop(bufnr, None)
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def update(self, result: Dict[str, Any]):
+        """Apply the outcome of a LOAD_FILES_LUA call."""
+        for bufnr in list(result.get("evicted") or []) + list(
+            result.get("adopted") or []
+        ):
+            self.discard(bufnr)
+        for res in result.get("files") or []:
+            if res.get("scratch"):
+                self.touch(res["bufnr"], res.get("name", res["path"]))
+
+
+def format_files(result: Dict[str, Any], include_content: bool) -> str:
+    """Render LOAD_FILES_LUA results, one section per file."""
+    out = []
+    for res in result.get("files") or []:
+        if res.get("error"):
+            out.append(f"==> {res['path']} <== error: {res['error']}")
+            continue
+        header = (
+            f"==> {res['path']} <== buffer {res['bufnr']}, {res['line_count']} lines"
+        )
+        out.append(header)
+        if include_content:
+            lines = list(res.get("lines") or [])
+            out.extend(lines)
+            if len(lines) < res["line_count"]:
+                out.append(f"... ({res['line_count'] - len(lines)} more lines)")
+    return "\n".join(out)
@@ -0,0 +1,501 @@
+"""Trigram index for cross-buffer and workspace text search."""
+
+import hashlib
+import logging
+import os
+import pickle
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .cache import CacheStats
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# Characters that are special in a Vim "magic" pattern.
+_MAGIC = set(".*[]~^$")
+# Backslash escapes that still stand for the literal character.
+_LITERAL_ESCAPES = set(".*[]~^$/\\")
+# Backslash escapes that make the preceding atom optional.
+_OPTIONAL_QUANTIFIERS = set("=?{")
+
+
+def trigrams(text: str) -> Set[str]:
+    """Lowercased trigrams of every line of `text`."""
+    out: Set[str] = set()
+    for line in text.lower().split("\n"):
+        out.update(line[i : i + 3] for i in range(len(line) - 2))
+    return out
+
+
+def required_trigrams(pattern: str, literal: bool = False) -> Set[str]:
+    """
+    Trigrams every match of a Vim regex must contain.
+
+    The extraction is conservative: only runs of plain characters are used,
+    and patterns with alternation, a changed magic level or a \\@ or \\%
+    construct (other than \\%( groups) yield an empty set (no narrowing).
+    """
+    if literal:
+        return trigrams(pattern)
+    if "\\|" in pattern or any(f"\\{c}" in pattern for c in "vVM"):
+        return set()
+    runs: List[str] = []
+    run: List[str] = []
+    depth = 0
+
+    def end_run():
+        if len(run) >= 3:
+            runs.append("".join(run))
+        run.clear()
+
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\" and i + 1 < len(pattern):
+            nxt = pattern[i + 1]
+            i += 2
+            if nxt in _LITERAL_ESCAPES and depth == 0:
+                run.append(nxt)
+                continue
+            if nxt in _OPTIONAL_QUANTIFIERS and run:
+                run.pop()
+            if nxt == "{":
+                close = pattern.find("}", i)
+                i = len(pattern) if close < 0 else close + 1
+            elif nxt == "(":
+                depth += 1
+            elif nxt == ")":
+                depth = max(depth - 1, 0)
+            elif nxt == "%" and pattern.startswith("(", i):
+                # \%( only groups, like \(
+                depth += 1
+                i += 1
+            elif nxt == "z" and pattern.startswith(("s", "e"), i):
+                i += 1
+            elif nxt == "_":
+                # \_x classes and \_[...] collections also match a newline
+                if pattern.startswith("[", i):
+                    close = pattern.find("]", i + 2)
+                    i = len(pattern) if close < 0 else close + 1
+                else:
+                    i += 1
+            elif nxt in "%@z":
+                # Lookarounds, positions, code points, ...: the text that
+                # follows is not literal and \@! negates the atom before
+                return set()
+            if nxt not in "cC":
+                end_run()
+            continue
+        if c == "*" and run:
+            run.pop()
+        if c == "[":
+            close = pattern.find("]", i + 2)
+            i = len(pattern) if close < 0 else close + 1
+            end_run()
+            continue
+        if c in _MAGIC or depth:
+            end_run()
+        else:
+            run.append(c)
+        i += 1
+    end_run()
+
+    out: Set[str] = set()
+    for r in runs:
+        out.update(trigrams(r))
+    return out
+
+
+@dataclass
+class _Doc:
+    """Index entry; `grams` is None when the document is not indexed."""
+
+    stamp: Tuple
+    grams: Optional[FrozenSet[str]]
+
+
+# Approximate memory per posting: the trigram in the document's frozenset
+# plus the key in the trigram's posting set (CPython 3.11, 64-bit).
+POSTING_BYTES = 176
+
+
+class TrigramIndex:
+    """
+    Memory-bounded trigram index over buffers and workspace files.
+
+    Documents are keyed "buf:<bufnr>" or "file:<relative path>" and carry a
+    stamp (changedtick, or mtime and size) used to detect staleness. When
+    the total number of postings exceeds `max_postings`, the least recently
+    used documents lose their trigrams and are treated as candidates for
+    every query, so narrowing never drops a match.
+    """
+
+    def __init__(self, max_postings: int = 5_000_000, max_doc_bytes: int = 1 << 20):
+        self.max_postings = max_postings
+        self.max_doc_bytes = max_doc_bytes
+        self.postings_count = 0
+        self.stats = CacheStats()
+        self._docs: "OrderedDict[str, _Doc]" = OrderedDict()
+        self._postings: Dict[str, Set[str]] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._docs
+
+    def stamp(self, key: str) -> Optional[Tuple]:
+        doc = self._docs.get(key)
+        return doc.stamp if doc else None
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            return [k for k in self._docs if k.startswith(prefix)]
+
+    def add(self, key: str, text: Optional[str], stamp: Tuple):
+        """Index (or re-index) a document; None or oversized text is not indexed."""
+        grams = None
+        if text is not None and len(text) <= self.max_doc_bytes:
+            grams = frozenset(trigrams(text))
+        with self._lock:
+            self._drop_postings(key)
+            self._docs[key] = _Doc(stamp, grams)
+            self._docs.move_to_end(key)
+            if grams:
+                for g in grams:
+                    self._postings.setdefault(g, set()).add(key)
+                self.postings_count += len(grams)
+                self._evict()
+
+    def invalidate(self, key: str):
+        """Keep a document but treat it as a candidate until re-indexed."""
+        with self._lock:
+            self._drop_postings(key)
+            doc = self._docs.get(key)
+            if doc is not None:
+                doc.stamp = ()
+
+    def remove(self, key: str):
+        with self._lock:
+            self._drop_postings(key)
+            self._docs.pop(key, None)
+
+    def _drop_postings(self, key: str):
+        doc = self._docs.get(key)
+        if doc is None or not doc.grams:
+            return
+        for g in doc.grams:
+            keys = self._postings.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[g]
+        self.postings_count -= len(doc.grams)
+        doc.grams = None
+
+    @property
+    def nbytes(self) -> int:
+        return self.postings_count * POSTING_BYTES
+
+    def _evict(self, max_postings: Optional[int] = None) -> int:
+        limit = self.max_postings if max_postings is None else max_postings
+        before, count = self.postings_count, 0
+        for key in list(self._docs):
+            if self.postings_count <= limit:
+                break
+            if self._docs[key].grams:
+                self._drop_postings(key)
+                count += 1
+        freed = (before - self.postings_count) * POSTING_BYTES
+        self.stats.evicted(count, freed)
+        return freed
+
+    def evict(self, target_bytes: int) -> int:
+        """Unindex least recently used documents down to target_bytes."""
+        with self._lock:
+            return self._evict(target_bytes // POSTING_BYTES)
+
+    def drop_buffer(self, bufnr: int) -> int:
+        key = f"buf:{bufnr}"
+        with self._lock:
+            before = self.postings_count
+            self.remove(key)
+            return (before - self.postings_count) * POSTING_BYTES
+
+    def candidates(self, required: Iterable[str], prefix: str = "") -> List[str]:
+        """Documents (with keys starting with `prefix`) that may match."""
+        required = list(required)
+        with self._lock:
+            keys = [k for k in self._docs if k.startswith(prefix)]
+            if not required:
+                return keys
+            sets = sorted((self._postings.get(g, set()) for g in required), key=len)
+            hits = set.intersection(*sets) if sets else set()
+            out = []
+            for k in keys:
+                doc = self._docs[k]
+                if doc.grams is None:
+                    self.stats.misses += 1
+                else:
+                    self.stats.hits += 1
+                if doc.grams is None or k in hits:
+                    out.append(k)
+                    self._docs.move_to_end(k)
+            return out
+
+    def save(self, path: str, prefix: str = "file:"):
+        """Persist documents with keys starting with `prefix`."""
+        with self._lock:
+            docs = {
+                k: (d.stamp, d.grams)
+                for k, d in self._docs.items()
+                if k.startswith(prefix) and d.grams is not None
+            }
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump({"version": CACHE_VERSION, "docs": docs}, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        """Load persisted documents; returns how many were loaded."""
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.info(f"No usable search index cache at {path}: {e}")
+            return 0
+        if data.get("version") != CACHE_VERSION:
+            return 0
+        with self._lock:
+            for key, (stamp, grams) in data["docs"].items():
+                self._drop_postings(key)
+                self._docs[key] = _Doc(stamp, grams)
+                for g in grams:
+                    self._postings.setdefault(g, set()).add(key)
+                self.postings_count += len(grams)
+            self._evict()
+        return len(data["docs"])
+
+
+def default_cache_path(root: str) -> str:
+    """Per-workspace cache file under $XDG_CACHE_HOME/nvimcp."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    digest = hashlib.sha1(os.path.abspath(root).encode()).hexdigest()[:16]
+    return os.path.join(base, "nvimcp", f"trigrams-{digest}.pickle")
+
+
+def file_stamp(path: str) -> Optional[Tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_text(path: str, max_bytes: int) -> Optional[str]:
+    """Read a text file for indexing; None for binary or oversized files."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return None
+    if len(data) > max_bytes or b"\0" in data[:8192]:
+        return None
+    return data.decode("utf-8", errors="replace")
+
+
+class WorkspaceSearch:
+    """
+    Keeps the "file:" documents of a TrigramIndex in sync with a FileIndex.
+
+    A background thread indexes every workspace file whose stamp changed
+    (warm-started from the on-disk cache), then re-indexes files reported
+    by the FileIndex listener.
+    """
+
+    def __init__(self, index: TrigramIndex, cache_path=default_cache_path):
+        self.index = index
+        self.cache_path = cache_path
+        self.files = None
+        self.indexed = threading.Event()
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def root(self) -> Optional[str]:
+        return self.files.root if self.files is not None else None
+
+    def attach(self, files):
+        """Index the workspace of `files` (a FileIndex), if not already."""
+        with self._lock:
+            if self.files is files:
+                return
+            self.close()
+            for key in self.index.keys("file:"):
+                self.index.remove(key)
+            self.files = files
+            self.indexed = threading.Event()
+            self._queue = queue.Queue()
+            self._stop = threading.Event()
+            files.add_listener(self._on_file_event)
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(files, self._queue, self._stop, self.indexed),
+                name="nvimcp-search-index",
+                daemon=True,
+            )
+            self._thread.start()
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._queue.put(None)
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _on_file_event(self, event: str, rel: str):
+        if self._stop.is_set():
+            return
+        key = f"file:{rel}"
+        if event == "removed":
+            self.index.remove(key)
+        else:
+            if key in self.index:
+                self.index.invalidate(key)
+            self._queue.put(rel)
+
+    def _index_file(self, root: str, rel: str):
+        path = os.path.join(root, rel)
+        stamp = file_stamp(path)
+        if stamp is None:
+            self.index.remove(f"file:{rel}")
+        elif self.index.stamp(f"file:{rel}") != stamp:
+            text = read_text(path, self.index.max_doc_bytes)
+            self.index.add(f"file:{rel}", text, stamp)
+
+    def _run(
+        self,
+        files,
+        work: "queue.Queue",
+        stop: threading.Event,
+        indexed: threading.Event,
+    ):
+        root = files.root
+        self.index.load(self.cache_path(root))
+        files.wait()
+        live = set()
+        for rel in files.paths():
+            if stop.is_set():
+                return
+            live.add(f"file:{rel}")
+            self._index_file(root, rel)
+        for key in self.index.keys("file:"):
+            if key not in live:
+                self.index.remove(key)
+        indexed.set()
+        self.save()
+        while True:
+            rel = work.get()
+            if rel is None:
+                return
+            self._index_file(root, rel)
+
+    def candidates(self, required: Iterable[str]) -> List[str]:
+        """Absolute paths of workspace files that may match."""
+        root = self.root
+        if root is None:
+            return []
+        keys = self.index.candidates(required, "file:")
+        paths = [k[len("file:") :] for k in keys]
+        if not self.indexed.is_set():
+            known = set(paths) | {k[len("file:") :] for k in self.index.keys("file:")}
+            paths.extend(p for p in self.files.paths() if p not in known)
+        return [os.path.join(root, p) for p in paths]
+
+    def save(self):
+        """Persist the file documents for a warm restart."""
+        root = self.root
+        if root is not None:
+            try:
+                self.index.save(self.cache_path(root))
+            except OSError as e:
+                logger.warning(f"Cannot save search index: {e}")
+
+
+# Returns every loaded buffer with its changedtick, plus the text of buffers
+# whose tick differs from the one the server has indexed.
+SYNC_BUFFERS_LUA = r"""
+local known, max_bytes = ...
+local out = {}
+for _, b in ipairs(vim.api.nvim_list_bufs()) do
+  if vim.api.nvim_buf_is_loaded(b) then
+    local tick = vim.api.nvim_buf_get_changedtick(b)
+    local item = {bufnr = b, tick = tick}
+    if known[b] ~= tick then
+      local n = vim.api.nvim_buf_line_count(b)
+      if vim.api.nvim_buf_get_offset(b, n) > max_bytes then
+        item.large = true
+      else
+        item.text = table.concat(vim.api.nvim_buf_get_lines(b, 0, -1, false), '\n')
+      end
+    end
+    table.insert(out, item)
+  end
+end
+return out
+"""
+
+# Confirms candidates with a Vim regex. Files that are loaded in a buffer
+# are skipped: the buffer is authoritative.
+SEARCH_LUA = r"""
+local bufs, files, pattern, max_results = ...
+local ok, re = pcall(vim.regex, pattern)
+if not ok then error('invalid pattern: ' .. tostring(re)) end
+local out, truncated = {}, false
+
+local function scan(name, lines)
+  for i, line in ipairs(lines) do
+    if re:match_str(line) then
+      if #out >= max_results then
+        truncated = true
+        return false
+      end
+      table.insert(out, {name, i, line})
+    end
+  end
+  return true
+end
+
+for _, b in ipairs(bufs) do
+  if vim.api.nvim_buf_is_loaded(b) then
+    local name = vim.api.nvim_buf_get_name(b)
+    if name == '' then name = '[buffer ' .. b .. ']' end
+    if not scan(name, vim.api.nvim_buf_get_lines(b, 0, -1, false)) then break end
+  end
+end
+if not truncated then
+  for _, f in ipairs(files) do
+    if vim.fn.bufloaded(f) == 0 then
+      local ok_read, lines = pcall(vim.fn.readfile, f)
+      if ok_read and not scan(f, lines) then break end
+    end
+  end
+end
+return {matches = out, truncated = truncated}
+"""
+
+
+def vim_pattern(pattern: str, literal: bool, ignore_case: bool) -> str:
+    """Build the Vim regex used to confirm candidates."""
+    if literal:
+        pattern = "\\V" + pattern.replace("\\", "\\\\")
+    return ("\\c" if ignore_case else "\\C") + pattern
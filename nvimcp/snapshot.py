@@ -0,0 +1,181 @@
+"""Atomic multi-buffer snapshots served from a server-side cache."""
+
+import itertools
+import threading
+from functools import cached_property
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .cache import CacheStats
+
+# One Lua call is atomic with respect to user input, so every buffer is
+# captured at the same instant. Args: buffer ids (nil = loaded listed buffers).
+SNAPSHOT_LUA = r"""
+local ids = ...
+if ids == nil or ids == vim.NIL then
+  ids = {}
+  for _, b in ipairs(vim.api.nvim_list_bufs()) do
+    if vim.api.nvim_buf_is_loaded(b) and vim.bo[b].buflisted then
+      ids[#ids + 1] = b
+    end
+  end
+end
+local bufs = {}
+for _, b in ipairs(ids) do
+  if vim.api.nvim_buf_is_valid(b) and vim.api.nvim_buf_is_loaded(b) then
+    bufs[#bufs + 1] = {
+      buf = b,
+      name = vim.api.nvim_buf_get_name(b),
+      tick = vim.api.nvim_buf_get_changedtick(b),
+      lines = vim.api.nvim_buf_get_lines(b, 0, -1, false),
+    }
+  else
+    bufs[#bufs + 1] = { buf = b, error = "invalid or unloaded buffer" }
+  end
+end
+return { current = vim.api.nvim_get_current_buf(), buffers = bufs }
+"""
+
+# Sets lines only if the buffer is still at the expected changedtick.
+# Args: buffer, tick, start, end (0-based, exclusive, -1 = end), lines.
+EDIT_IF_UNCHANGED_LUA = r"""
+local buf, tick, first, last, lines = ...
+if not vim.api.nvim_buf_is_valid(buf) then
+  error("invalid buffer " .. buf, 0)
+end
+local now = vim.api.nvim_buf_get_changedtick(buf)
+if now ~= tick then
+  return { ok = false, tick = now }
+end
+vim.api.nvim_buf_set_lines(buf, first, last, false, lines)
+return { ok = true, tick = vim.api.nvim_buf_get_changedtick(buf) }
+"""
+
+
+class SnapshotError(Exception):
+    """Raised for unknown snapshots or buffers missing from a snapshot."""
+
+    pass
+
+
+@dataclass
+class BufferState:
+    name: str
+    tick: int
+    lines: List[str]
+
+    @property
+    def size(self) -> int:
+        return sum(len(line) + 1 for line in self.lines)
+
+
+@dataclass
+class Snapshot:
+    id: str
+    current: int
+    buffers: Dict[int, BufferState]
+    errors: Dict[int, str] = field(default_factory=dict)
+    created: float = field(default_factory=time.time)
+
+    @cached_property
+    def size(self) -> int:
+        return sum(b.size for b in self.buffers.values())
+
+    def buffer(self, buffer_id: Optional[int] = None) -> BufferState:
+        """A buffer's captured state; None means the then-current buffer."""
+        bufnr = self.current if buffer_id is None else buffer_id
+        state = self.buffers.get(bufnr)
+        if state is None:
+            raise SnapshotError(f"Buffer {bufnr} is not in snapshot {self.id}")
+        return state
+
+
+class SnapshotStore:
+    """
+    Recent snapshots, bounded by count and total line bytes (LRU).
+
+    Thread-safe; snapshots are immutable once added.
+    """
+
+    def __init__(self, max_snapshots: int = 32, max_bytes: int = 64 << 20):
+        self.max_snapshots = max_snapshots
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.stats = CacheStats()
+        self._snapshots: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    def add(self, result: Dict[str, Any]) -> Snapshot:
+        """Store the result of SNAPSHOT_LUA."""
+        buffers, errors = {}, {}
+        for b in result["buffers"]:
+            if "error" in b:
+                errors[b["buf"]] = b["error"]
+            else:
+                buffers[b["buf"]] = BufferState(b["name"], b["tick"], b["lines"])
+        with self._lock:
+            snap = Snapshot(
+                f"snap-{next(self._ids)}", result["current"], buffers, errors
+            )
+            self._snapshots[snap.id] = snap
+            self.bytes += snap.size
+            while self._snapshots and (
+                len(self._snapshots) > self.max_snapshots or self.bytes > self.max_bytes
+            ):
+                if next(iter(self._snapshots)) == snap.id:
+                    break
+                _, old = self._snapshots.popitem(last=False)
+                self.bytes -= old.size
+                self.stats.evicted(1, old.size)
+        return snap
+
+    def get(self, snapshot_id: str) -> Snapshot:
+        with self._lock:
+            snap = self._snapshots.get(snapshot_id)
+            if snap is None:
+                self.stats.misses += 1
+                raise SnapshotError(f"Unknown or expired snapshot: {snapshot_id}")
+            self._snapshots.move_to_end(snapshot_id)
+            self.stats.hits += 1
+            return snap
+
+    @property
+    def nbytes(self) -> int:
+        return self.bytes
+
+    def evict(self, target_bytes: int) -> int:
+        """Drop least recently used snapshots down to target_bytes."""
+        freed = count = 0
+        with self._lock:
+            while self._snapshots and self.bytes > target_bytes:
+                _, old = self._snapshots.popitem(last=False)
+                self.bytes -= old.size
+                freed += old.size
+                count += 1
+            self.stats.evicted(count, freed)
+        return freed
+
+    def clear(self):
+        with self._lock:
+            self._snapshots.clear()
+            self.bytes = 0
+
+
+def format_snapshot(snap: Snapshot, include_content: bool = False) -> str:
+    lines = [f"Snapshot {snap.id} (current buffer {snap.current})"]
+    for bufnr, state in snap.buffers.items():
+        lines.append(
+            f"buffer {bufnr}: {state.name or '[No Name]'} "
+            f"changedtick={state.tick} lines={len(state.lines)}"
+        )
+        if include_content:
+            lines.extend(state.lines)
+    for bufnr, error in snap.errors.items():
+        lines.append(f"buffer {bufnr}: {error}")
+    return "\n".join(lines)
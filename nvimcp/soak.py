@@ -0,0 +1,307 @@
+"""Soak test: many concurrent clients against one server and a real nvim."""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .cache import format_bytes, rss_bytes
+from .connection import LEAN_NVIM_ARGS, connect_neovim
+from .core import NvimcpServer, _is_error
+
+logger = logging.getLogger(__name__)
+
+# Relative frequency of each operation a client performs
+DEFAULT_MIX = {"read": 5, "edit": 3, "command": 1, "status": 1, "snapshot": 1}
+
+BUFFER_LINES = 200
+
+
+@dataclass
+class SoakConfig:
+    clients: int = 8
+    duration: float = 60.0
+    interval: float = 1.0
+    # Samples in the first `warmup` fraction of the run are not compared
+    warmup: float = 0.2
+    mix: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    seed: int = 0
+    max_rss_growth: int = 64 << 20
+    max_thread_growth: int = 4
+    max_fd_growth: int = 8
+    # p95 latency at the end over p95 after warmup, minus one
+    max_latency_drift: float = 1.0
+    max_error_rate: float = 0.0
+
+
+@dataclass
+class Sample:
+    """Process state and latency over one sampling interval."""
+
+    t: float
+    rss: Optional[int]
+    threads: int
+    fds: Optional[int]
+    queue: Optional[int]
+    calls: int
+    errors: int
+    p50: float
+    p95: float
+
+
+@dataclass
+class SoakReport:
+    samples: List[Sample]
+    calls: int
+    errors: int
+    failures: List[str]
+
+
+def open_fds() -> Optional[int]:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def executor_queue(loop: asyncio.AbstractEventLoop) -> Optional[int]:
+    """Jobs waiting for a thread in the loop's default executor."""
+    queue = getattr(getattr(loop, "_default_executor", None), "_work_queue", None)
+    return queue.qsize() if queue is not None else None
+
+
+def _percentile(values: List[float], q: int) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+class _Window:
+    """Latencies and errors since the last sample."""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.calls = 0
+        self.errors_total = 0
+
+    def add(self, latency: float, ok: bool):
+        self.latencies.append(latency)
+        if not ok:
+            self.errors += 1
+
+    def take(self):
+        latencies, errors = self.latencies, self.errors
+        self.latencies, self.errors = [], 0
+        self.calls += len(latencies)
+        self.errors_total += errors
+        return latencies, errors
+
+
+def _setup_buffers(nvim, count: int) -> List[int]:
+    """One scratch buffer per client, so edits do not contend on content."""
+    return nvim.exec_lua(
+        r"""
+        local count, lines = ...
+        local bufs = {}
+        for i = 1, count do
+          local b = vim.api.nvim_create_buf(true, true)
+          local content = {}
+          for l = 1, lines do
+            content[l] = "soak " .. i .. " line " .. l
+          end
+          vim.api.nvim_buf_set_lines(b, 0, -1, false, content)
+          bufs[i] = b
+        end
+        return bufs
+        """,
+        count,
+        BUFFER_LINES,
+    )
+
+
+def _request(op: str, bufnr: int, rng: random.Random):
+    line = rng.randint(1, BUFFER_LINES)
+    if op == "read":
+        return "get_buffer_content", {"buffer_id": bufnr}
+    if op == "edit":
+        return "edit_buffer", {
+            "buffer_id": bufnr,
+            "content": f"edited {rng.random():.6f}",
+            "line_start": line,
+            "line_end": line,
+        }
+    if op == "command":
+        return "run_command", {"command": f"let g:nvimcp_soak = {line}"}
+    if op == "status":
+        return "get_status", {}
+    if op == "snapshot":
+        return "snapshot", {"buffer_ids": [bufnr]}
+    raise ValueError(f"Unknown soak operation: {op}")
+
+
+async def _client(server, bufnr, rng, ops, weights, deadline, window):
+    while time.monotonic() < deadline:
+        name, args = _request(rng.choices(ops, weights)[0], bufnr, rng)
+        start = time.perf_counter()
+        result = await server.call_tool(name, args)
+        window.add(time.perf_counter() - start, not _is_error(result))
+
+
+def _sample(t, loop, window) -> Sample:
+    latencies, errors = window.take()
+    return Sample(
+        t=t,
+        rss=rss_bytes(),
+        threads=threading.active_count(),
+        fds=open_fds(),
+        queue=executor_queue(loop),
+        calls=len(latencies),
+        errors=errors,
+        p50=_percentile(latencies, 50) * 1000,
+        p95=_percentile(latencies, 95) * 1000,
+    )
+
+
+async def run_soak(server: NvimcpServer, config: SoakConfig) -> SoakReport:
+    """Drive `server` with config.clients concurrent clients and judge the run."""
+    loop = asyncio.get_running_loop()
+    bufs = await server.run_sync(_setup_buffers, server.nvim, config.clients)
+    ops = list(config.mix)
+    weights = [config.mix[op] for op in ops]
+    window = _Window()
+    start = time.monotonic()
+    deadline = start + config.duration
+    clients = [
+        asyncio.create_task(
+            _client(
+                server,
+                bufnr,
+                random.Random(config.seed + i),
+                ops,
+                weights,
+                deadline,
+                window,
+            )
+        )
+        for i, bufnr in enumerate(bufs)
+    ]
+    samples = [_sample(0.0, loop, window)]
+    try:
+        while time.monotonic() < deadline:
+            await asyncio.sleep(min(config.interval, deadline - time.monotonic()))
+            samples.append(_sample(time.monotonic() - start, loop, window))
+        await asyncio.gather(*clients)
+    finally:
+        for task in clients:
+            task.cancel()
+    samples.append(_sample(time.monotonic() - start, loop, window))
+    calls, errors = window.calls, window.errors_total
+    return SoakReport(samples, calls, errors, check(samples, calls, errors, config))
+
+
+def _growth(samples: List[Sample], attr: str) -> Optional[float]:
+    """Median of the last quarter minus median of the first quarter."""
+    values = [getattr(s, attr) for s in samples if getattr(s, attr) is not None]
+    if len(values) < 2:
+        return None
+    q = max(len(values) // 4, 1)
+    return statistics.median(values[-q:]) - statistics.median(values[:q])
+
+
+def check(
+    samples: List[Sample], calls: int, errors: int, config: SoakConfig
+) -> List[str]:
+    """Threshold violations of a run; empty when it passed."""
+    failures = []
+    if calls and errors / calls > config.max_error_rate:
+        failures.append(f"{errors} of {calls} calls failed")
+    end = samples[-1].t if samples else 0.0
+    steady = [s for s in samples if s.t >= end * config.warmup]
+    limits = [
+        ("rss", config.max_rss_growth, format_bytes),
+        ("threads", config.max_thread_growth, str),
+        ("fds", config.max_fd_growth, str),
+    ]
+    for attr, limit, fmt in limits:
+        growth = _growth(steady, attr)
+        if growth is not None and growth > limit:
+            failures.append(f"{attr} grew by {fmt(int(growth))} (limit {fmt(limit)})")
+    timed = [s for s in steady if s.calls]
+    if len(timed) >= 2:
+        q = max(len(timed) // 4, 1)
+        first = statistics.median(s.p95 for s in timed[:q])
+        last = statistics.median(s.p95 for s in timed[-q:])
+        if first > 0 and last / first - 1 > config.max_latency_drift:
+            failures.append(
+                f"p95 latency drifted from {first:.2f}ms to {last:.2f}ms "
+                f"(limit +{config.max_latency_drift:.0%})"
+            )
+    return failures
+
+
+def format_report(report: SoakReport) -> str:
+    lines = [
+        f"{'t':>7} {'calls':>6} {'err':>4} {'p50':>9} {'p95':>9} "
+        f"{'rss':>10} {'thr':>4} {'fds':>4} {'queue':>5}"
+    ]
+    for s in report.samples:
+        lines.append(
+            f"{s.t:>6.1f}s {s.calls:>6} {s.errors:>4} {s.p50:>7.2f}ms "
+            f"{s.p95:>7.2f}ms {format_bytes(s.rss):>10} {s.threads:>4} "
+            f"{s.fds if s.fds is not None else '-':>4} "
+            f"{s.queue if s.queue is not None else '-':>5}"
+        )
+    lines.append(f"{report.calls} calls, {report.errors} errors")
+    lines.extend(f"FAIL: {f}" for f in report.failures)
+    if not report.failures:
+        lines.append("PASS")
+    return "\n".join(lines)
+
+
+async def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Soak test nvimcp with many clients")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds")
+    parser.add_argument("--interval", type=float, default=1.0, help="Sample period")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-rss-growth-mb", type=float, default=64.0)
+    parser.add_argument("--max-latency-drift", type=float, default=1.0)
+    parser.add_argument(
+        "--nvim-arg",
+        action="append",
+        dest="nvim_args",
+        help=f"Embedded nvim argv (repeatable, default: {' '.join(LEAN_NVIM_ARGS)})",
+    )
+    args = parser.parse_args(argv)
+
+    config = SoakConfig(
+        clients=args.clients,
+        duration=args.duration,
+        interval=args.interval,
+        seed=args.seed,
+        max_rss_growth=int(args.max_rss_growth_mb * (1 << 20)),
+        max_latency_drift=args.max_latency_drift,
+    )
+    nvim = connect_neovim(mode="embedded", nvim_args=args.nvim_args or LEAN_NVIM_ARGS)
+    try:
+        server = NvimcpServer(nvim)
+        report = await run_soak(server, config)
+    finally:
+        nvim.close()
+    print(format_report(report))
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,286 @@
+"""Span tracing for tool calls, executor hops and nvim RPCs."""
+
+import contextlib
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+
+@dataclass
+class Span:
+    """A finished span; times are time.perf_counter() seconds."""
+
+    trace_id: int
+    span_id: int
+    parent_id: Optional[int]
+    name: str
+    cat: str
+    start: float
+    end: float
+    tid: int
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Context:
+    trace_id: int
+    span_id: int
+
+
+# Sentinel stored while inside an unsampled trace, so children skip cheaply.
+_UNSAMPLED = _Context(0, 0)
+
+_current: contextvars.ContextVar[Optional[_Context]] = contextvars.ContextVar(
+    "nvimcp_span", default=None
+)
+
+
+class ChromeTraceExporter:
+    """
+    Streams spans to a Chrome trace_event file (JSON array format).
+
+    The closing bracket is optional in this format, so the file can be
+    opened in chrome://tracing or Perfetto while the server is running.
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[\n")
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        # perf_counter has an arbitrary epoch; anchor it to wall time
+        self._offset = time.time() - time.perf_counter()
+
+    def export(self, span: Span):
+        event = {
+            "name": span.name,
+            "cat": span.cat,
+            "ph": "X",
+            "ts": round((span.start + self._offset) * 1e6, 3),
+            "dur": round((span.end - span.start) * 1e6, 3),
+            "pid": self._pid,
+            "tid": span.tid,
+            "args": dict(span.attrs, trace=f"{span.trace_id:032x}"),
+        }
+        line = json.dumps(event, separators=(",", ":"), default=str) + ",\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write("{}]\n")
+                self._file.close()
+
+
+class OtlpFileExporter:
+    """
+    Writes spans as OTLP/JSON lines, one ExportTraceServiceRequest per trace.
+
+    This is the format of the OpenTelemetry collector file exporter, so the
+    file can be replayed into any OTLP backend; no network is used.
+
+    Children wait for their root span. A child finishing after its root
+    (an executor job outliving a timed-out call) is written on its own, and
+    at most max_pending unfinished traces are held; the oldest is written
+    incomplete beyond that.
+    """
+
+    def __init__(
+        self, path: str, service_name: str = "nvimcp", max_pending: int = 1024
+    ):
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[int, List[Span]]" = OrderedDict()
+        # Recently written traces, so late children are not held forever
+        self._done: "OrderedDict[int, None]" = OrderedDict()
+        self._service = service_name
+        self._offset = time.time() - time.perf_counter()
+
+    def _nanos(self, t: float) -> str:
+        return str(int((t + self._offset) * 1e9))
+
+    @staticmethod
+    def _attr(key: str, value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"key": key, "value": {"boolValue": value}}
+        if isinstance(value, int):
+            return {"key": key, "value": {"intValue": str(value)}}
+        if isinstance(value, float):
+            return {"key": key, "value": {"doubleValue": value}}
+        return {"key": key, "value": {"stringValue": str(value)}}
+
+    def export(self, span: Span):
+        ready = []
+        with self._lock:
+            if span.trace_id in self._done:
+                ready.append([span])
+            else:
+                self._pending.setdefault(span.trace_id, []).append(span)
+                if span.parent_id is None:
+                    ready.append(self._pending.pop(span.trace_id))
+                    self._done[span.trace_id] = None
+                    if len(self._done) > self.max_pending:
+                        self._done.popitem(last=False)
+                while len(self._pending) > self.max_pending:
+                    ready.append(self._pending.popitem(last=False)[1])
+        for spans in ready:
+            self._write(spans)
+
+    def _write(self, spans: List[Span]):
+        otlp = [
+            {
+                "traceId": f"{s.trace_id:032x}",
+                "spanId": f"{s.span_id:016x}",
+                "parentSpanId": f"{s.parent_id:016x}" if s.parent_id else "",
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": self._nanos(s.start),
+                "endTimeUnixNano": self._nanos(s.end),
+                "attributes": [
+                    self._attr("category", s.cat),
+                    self._attr("thread.id", s.tid),
+                ]
+                + [self._attr(k, v) for k, v in s.attrs.items()],
+            }
+            for s in spans
+        ]
+        request = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [self._attr("service.name", self._service)]
+                    },
+                    "scopeSpans": [{"scope": {"name": "nvimcp"}, "spans": otlp}],
+                }
+            ]
+        }
+        line = json.dumps(request, separators=(",", ":")) + "\n"
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for spans in pending:
+            self._write(spans)
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    """
+    Head-sampled tracer.
+
+    The sampling decision is made when a root span starts and is inherited
+    by all of its children, including those recorded on executor threads
+    (the context must be propagated, as NvimcpServer._in_executor does).
+    With sample_rate 0 or no exporter, spans cost one contextvar lookup.
+    """
+
+    def __init__(self, exporter=None, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate if exporter is not None else 0.0
+        self._random = random.Random()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def _ids(self) -> int:
+        return self._random.getrandbits(64) or 1
+
+    @contextlib.contextmanager
+    def span(self, name: str, cat: str = "nvimcp", **attrs) -> Iterator[None]:
+        """Time the enclosed block as a span."""
+        parent = _current.get()
+        if parent is _UNSAMPLED or not self.enabled:
+            yield
+            return
+        if parent is None and self._random.random() >= self.sample_rate:
+            token = _current.set(_UNSAMPLED)
+            try:
+                yield
+            finally:
+                _current.reset(token)
+            return
+        ctx = _Context(
+            parent.trace_id if parent else self._ids() << 64 | self._ids(),
+            self._ids(),
+        )
+        token = _current.set(ctx)
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            attrs["error"] = repr(e)
+            raise
+        finally:
+            end = time.perf_counter()
+            _current.reset(token)
+            self.exporter.export(
+                Span(
+                    ctx.trace_id,
+                    ctx.span_id,
+                    parent.span_id if parent else None,
+                    name,
+                    cat,
+                    start,
+                    end,
+                    threading.get_ident(),
+                    attrs,
+                )
+            )
+
+    def record(self, name: str, cat: str, start: float, duration: float, **attrs):
+        """Export an already measured span as a child of the current one."""
+        parent = _current.get()
+        if parent is None or parent is _UNSAMPLED or not self.enabled:
+            return
+        self.exporter.export(
+            Span(
+                parent.trace_id,
+                self._ids(),
+                parent.span_id,
+                name,
+                cat,
+                start,
+                start + duration,
+                threading.get_ident(),
+                attrs,
+            )
+        )
+
+    def record_rpc(self, method, args, start, duration, error):
+        """RpcHooks observer."""
+        if isinstance(method, bytes):
+            method = method.decode()
+        attrs = {"error": repr(error)} if error is not None else {}
+        self.record(f"rpc:{method}", "rpc", start, duration, **attrs)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+def make_exporter(path: str, fmt: str = "chrome"):
+    """Create a file exporter for one of TRACE_FORMATS."""
+    if fmt == "chrome":
+        return ChromeTraceExporter(path)
+    if fmt == "otlp":
+        return OtlpFileExporter(path)
+    raise ValueError(f"Unknown trace format: {fmt}")
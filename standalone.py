@@ -5,8 +5,16 @@ import argparse
 import asyncio
 import logging
 import sys
-from nvimcp.connection import connect_neovim, ConnectionError
+from nvimcp.connection import (
+    ConnectionManager,
+    ConnectionError,
+    StandbyPool,
+    connect_neovim,
+    lean_nvim_args,
+)
 from nvimcp.core import NvimcpServer
+from nvimcp.recorder import SessionRecorder
+from nvimcp.tracing import TRACE_FORMATS, Tracer, make_exporter
 
 
 def setup_logging(level: str = "INFO"):
@@ -31,6 +39,144 @@ async def main():
         default="/tmp/nvim.sock",
         help="Socket path for socket mode (default: /tmp/nvim.sock)",
     )
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        default="stdio",
+        help="MCP transport (default: stdio)",
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Host to bind for http transport (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--allow-host",
+        action="append",
+        default=[],
+        metavar="HOST",
+        help="Extra Host header the http transport accepts, e.g. myhost:* "
+        "(repeatable; needed when --host is not loopback)",
+    )
+    parser.add_argument(
+        "--allow-origin",
+        action="append",
+        default=[],
+        metavar="ORIGIN",
+        help="Extra Origin header the http transport accepts, e.g. "
+        "http://myhost:* (repeatable)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="Port to bind for http transport (default: 8765)",
+    )
+    parser.add_argument(
+        "--uds",
+        help="Unix socket to bind for http transport (overrides host/port)",
+    )
+    parser.add_argument(
+        "--max-sessions",
+        type=int,
+        help="Maximum concurrent http sessions (default: mcp default)",
+    )
+    parser.add_argument(
+        "--max-session-calls",
+        type=int,
+        default=4,
+        help="Maximum in-flight tool calls per session (default: 4)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Record tool calls and nvim RPCs to a trace (.jsonl or .msgpack)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Export spans for tool calls, executor hops and RPCs to PATH",
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=TRACE_FORMATS,
+        default="chrome",
+        help="Span file format: Chrome trace_event or OTLP/JSON (default: chrome)",
+    )
+    parser.add_argument(
+        "--trace-sample-rate",
+        type=float,
+        default=1.0,
+        help="Fraction of tool calls to trace (default: 1.0)",
+    )
+    parser.add_argument(
+        "--enable-profile-tool",
+        action="store_true",
+        help="Expose the profile tool (cProfile and nvim :profile on demand)",
+    )
+    parser.add_argument(
+        "--lean",
+        action="store_true",
+        help="Start embedded nvim with --clean, no swap files and no shada",
+    )
+    parser.add_argument(
+        "--allow-plugin",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="Plugin directory to load in a lean embedded nvim (repeatable)",
+    )
+    parser.add_argument(
+        "--standby",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Keep N embedded nvim instances started ahead for restarts (default: 0)",
+    )
+    parser.add_argument(
+        "--no-reconnect",
+        action="store_true",
+        help="Do not reconnect when nvim goes away",
+    )
+    parser.add_argument(
+        "--ping-interval",
+        type=float,
+        default=5.0,
+        help="Seconds between nvim health checks, 0 to disable (default: 5)",
+    )
+    parser.add_argument(
+        "--coalesce-window",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Batch edit_buffer calls per buffer arriving within SECONDS (default: off)",
+    )
+    parser.add_argument(
+        "--index-on-start",
+        action="store_true",
+        help="Build and watch the file index at startup instead of on first use",
+    )
+    parser.add_argument(
+        "--minimize-edits",
+        action="store_true",
+        help="Whole-buffer edit_buffer calls only set the lines that differ",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=float,
+        default=256.0,
+        help="Memory budget shared by the server's caches (default: 256)",
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=float,
+        help="Evict cached data while the process RSS is above this (default: off)",
+    )
+    parser.add_argument(
+        "--no-plugins",
+        action="store_true",
+        help="Do not load tool plugins from the nvimcp.tools entry point group",
+    )
     parser.add_argument(
         "--log-level",
         choices=["DEBUG", "INFO", "WARNING", "ERROR"],
@@ -39,22 +185,82 @@ async def main():
     )
 
     args = parser.parse_args()
+    loopback = args.host in ("127.0.0.1", "localhost", "::1")
+    if (args.allow_host or args.allow_origin) and loopback and not args.uds:
+        parser.error("--allow-host/--allow-origin need a non-loopback --host")
     setup_logging(args.log_level)
 
     logger = logging.getLogger(__name__)
+    if args.transport == "http" and not loopback and not args.allow_host:
+        logger.warning(
+            f"--host {args.host} without --allow-host: only loopback Host "
+            "headers are accepted"
+        )
     logger.info("Starting nvimcp server")
 
     try:
         # Connect to Neovim
         logger.info(f"Connecting to nvim (mode: {args.mode})")
-        nvim = connect_neovim(mode=args.mode, socket_path=args.socket_path)
+        nvim_args = None
+        if args.lean or args.allow_plugin:
+            nvim_args = lean_nvim_args(args.allow_plugin)
+        if args.no_reconnect:
+            connection = None
+            nvim = connect_neovim(
+                mode=args.mode, socket_path=args.socket_path, nvim_args=nvim_args
+            )
+        else:
+            standby = None
+            if args.standby > 0:
+                standby = StandbyPool(nvim_args, size=args.standby)
+            connection = ConnectionManager(
+                mode=args.mode,
+                socket_path=args.socket_path,
+                nvim_args=nvim_args,
+                standby=standby,
+            )
+            nvim = connection.connect()
+            if connection.startup is not None:
+                logger.info(f"nvim startup: {connection.startup.format()}")
 
         # Create and run MCP server
-        server = NvimcpServer(nvim)
+        recorder = SessionRecorder(args.record) if args.record else None
+        tracer = None
+        if args.trace:
+            tracer = Tracer(
+                make_exporter(args.trace, args.trace_format),
+                sample_rate=args.trace_sample_rate,
+            )
+        server = NvimcpServer(
+            nvim,
+            max_session_calls=args.max_session_calls,
+            recorder=recorder,
+            tracer=tracer,
+            enable_profile=args.enable_profile_tool,
+            connection=connection,
+            ping_interval=args.ping_interval,
+            load_plugins=not args.no_plugins,
+            coalesce_window=args.coalesce_window,
+            cache_max_bytes=int(args.cache_max_mb * (1 << 20)),
+            max_rss=int(args.max_rss_mb * (1 << 20)) if args.max_rss_mb else None,
+            minimize_edits=args.minimize_edits,
+            index_on_start=args.index_on_start,
+        )
         logger.info("nvimcp server ready")
 
         # Run MCP server
-        await server.run()
+        if args.transport == "http":
+            logger.info(f"Serving http on {args.uds or f'{args.host}:{args.port}'}")
+            await server.run_http(
+                host=args.host,
+                port=args.port,
+                uds=args.uds,
+                max_sessions=args.max_sessions,
+                allowed_hosts=args.allow_host,
+                allowed_origins=args.allow_origin,
+            )
+        else:
+            await server.run()
 
     except ConnectionError as e:
         logger.error(f"Failed to connect to nvim: {e}")
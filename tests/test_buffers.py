@@ -0,0 +1,119 @@
+"""Tests for the buffer inventory and list_buffers."""
+
+import json
+
+import pytest
+from unittest.mock import Mock
+
+from nvimcp.buffers import BUFFER_INFO_LUA, BufferInventory
+from nvimcp.core import NvimcpServer
+from nvimcp.events import DRAIN_LUA
+
+
+def info(buf, **kw):
+    out = {
+        "buf": buf,
+        "name": f"/src/{buf}.py",
+        "filetype": "python",
+        "buftype": "",
+        "lines": 10,
+        "bytes": 100,
+        "modified": False,
+        "listed": True,
+        "loaded": True,
+        "changedtick": 1,
+    }
+    out.update(kw)
+    return out
+
+
+class FakeLua:
+    """exec_lua stand-in serving BUFFER_INFO_LUA from a dict."""
+
+    def __init__(self, *infos):
+        self.buffers = {i["buf"]: i for i in infos}
+        self.events = []
+        self.calls = []
+
+    def __call__(self, code, *args):
+        if code == DRAIN_LUA:
+            self.calls.append("drain")
+            items, self.events = self.events, []
+            return {"items": items, "installed": len(self.calls) == 1}
+        assert code == BUFFER_INFO_LUA
+        ids = args[0]
+        self.calls.append(("info", ids))
+        if ids is None:
+            ids = sorted(self.buffers)
+        return [self.buffers[b] for b in ids if b in self.buffers]
+
+
+class TestBufferInventory:
+    """Test patching the mirror from events."""
+
+    def test_refresh_only_dirty(self):
+        """Test a full fetch first, then only buffers named by events."""
+        lua = FakeLua(info(1), info(2))
+        inventory = BufferInventory()
+        inventory.refresh(lua)
+        assert lua.calls == [("info", None)]
+
+        inventory.refresh(lua)
+        assert len(lua.calls) == 1 and inventory.stats.hits == 1
+
+        lua.buffers[2] = info(2, modified=True, changedtick=5)
+        inventory.on_event("BufChanged", 2)
+        inventory.refresh(lua)
+        assert lua.calls[-1] == ("info", [2])
+        assert inventory.buffers()[1]["modified"] is True
+
+    def test_removed_buffers(self):
+        """Test that wiped and vanished buffers leave the mirror."""
+        lua = FakeLua(info(1), info(2), info(3))
+        inventory = BufferInventory()
+        inventory.refresh(lua)
+        inventory.on_event("BufWipeout", 1)
+        del lua.buffers[2]
+        inventory.on_event("BufDelete", 2)
+        inventory.refresh(lua)
+        assert [b["buf"] for b in inventory.buffers()] == [3]
+
+    def test_unlisted(self):
+        """Test that unlisted buffers are only shown on request."""
+        lua = FakeLua(info(1), info(2, listed=False))
+        inventory = BufferInventory()
+        inventory.refresh(lua)
+        assert [b["buf"] for b in inventory.buffers()] == [1]
+        assert len(inventory.buffers(include_unlisted=True)) == 2
+
+    def test_evict_rebuilds(self):
+        """Test that an evicted mirror is fetched again in full."""
+        lua = FakeLua(info(1))
+        inventory = BufferInventory()
+        inventory.refresh(lua)
+        assert inventory.evict(0) > 0 and len(inventory) == 0
+        inventory.refresh(lua)
+        assert lua.calls[-1] == ("info", None) and len(inventory) == 1
+
+
+class TestListBuffersTool:
+    """Test the list_buffers tool."""
+
+    @pytest.mark.asyncio
+    async def test_repeat_call_skips_metadata(self):
+        """Test that a repeat call without events only drains the queue."""
+        lua = FakeLua(info(1), info(2, listed=False))
+        nvim = Mock()
+        nvim.exec_lua.side_effect = lua
+        server = NvimcpServer(nvim)
+
+        result = await server.call_tool("list_buffers", {})
+        assert [b["buf"] for b in json.loads(result[0].text)["buffers"]] == [1]
+        assert lua.calls == ["drain", ("info", None)]
+
+        await server.call_tool("list_buffers", {"include_unlisted": True})
+        assert lua.calls[2:] == ["drain"]
+
+        lua.events = [["BufWritePost", 1]]
+        await server.call_tool("list_buffers", {})
+        assert lua.calls[3:] == ["drain", ("info", [1])]
@@ -0,0 +1,172 @@
+"""Tests for cache accounting, eviction and buffer events."""
+
+import pytest
+from unittest.mock import Mock
+
+from nvimcp.cache import CacheManager, CacheStats, format_report
+from nvimcp.core import NvimcpServer
+from nvimcp.events import DRAIN_LUA, EventQueue
+from nvimcp.search import POSTING_BYTES, TrigramIndex
+from nvimcp.snapshot import SnapshotError, SnapshotStore
+
+
+class SizedCache:
+    """Cache stand-in holding entries of known sizes, oldest first."""
+
+    def __init__(self, *sizes):
+        self.sizes = list(sizes)
+        self.stats = CacheStats()
+        self.dropped = []
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def nbytes(self):
+        return sum(self.sizes)
+
+    def evict(self, target_bytes):
+        freed = 0
+        while self.sizes and self.nbytes > target_bytes:
+            freed += self.sizes.pop(0)
+        self.stats.evicted(1, freed)
+        return freed
+
+    def drop_buffer(self, bufnr):
+        self.dropped.append(bufnr)
+        return 0
+
+
+def snapshot_result(*buffers):
+    return {
+        "current": buffers[0],
+        "buffers": [
+            {"buf": b, "name": f"f{b}", "tick": 1, "lines": ["x" * 99]} for b in buffers
+        ],
+    }
+
+
+class TestCacheManager:
+    """Test budgets across caches."""
+
+    def test_under_budget(self):
+        """Test that nothing is evicted within the limits."""
+        manager = CacheManager(max_bytes=100)
+        manager.register("a", SizedCache(50, 40))
+        assert manager.enforce() == 0 and manager.rounds == 0
+
+    def test_largest_cache_first(self):
+        """Test that the biggest cache pays for the overshoot down to low water."""
+        manager = CacheManager(max_bytes=100, low_water=0.9)
+        small, big = SizedCache(20), SizedCache(30, 30, 30)
+        manager.register("small", small)
+        manager.register("big", big)
+        assert manager.enforce() == 30
+        assert small.sizes == [20] and big.sizes == [30, 30]
+        assert manager.total_bytes() <= 90
+
+    def test_rss_ceiling(self):
+        """Test that RSS over the ceiling frees the overshoot from caches."""
+        rss = [1000]
+        manager = CacheManager(max_bytes=None, max_rss=900, rss=lambda: rss[0])
+        cache = SizedCache(100, 100, 100, 100)
+        manager.register("c", cache)
+        assert manager.enforce() == 200
+        rss[0] = 800
+        assert manager.enforce() == 0
+
+    def test_drop_buffer(self):
+        """Test that buffer events reach every cache that tracks buffers."""
+        manager = CacheManager()
+        cache = SizedCache()
+        manager.register("c", cache)
+        manager.drop_buffer(7)
+        assert cache.dropped == [7] and manager.dropped_buffers == 1
+
+    def test_report(self):
+        """Test that counters are reported per cache."""
+        manager = CacheManager(max_bytes=1 << 20, rss=lambda: 2 << 20)
+        manager.register("c", SizedCache(512))
+        text = format_report(manager.report())
+        assert "rss: 2.0 MiB" in text
+        assert "cached: 0.0 MiB (limit 1.0 MiB)" in text
+        assert "c: 0.0 MiB, 1 entries, hits 0, misses 0, evictions 0" in text
+
+
+class TestManagedCaches:
+    """Test the accounting of the server's own caches."""
+
+    def test_snapshot_store(self):
+        """Test snapshot hits, misses and LRU eviction by bytes."""
+        store = SnapshotStore()
+        first = store.add(snapshot_result(1))
+        store.add(snapshot_result(2))
+        store.get(first.id)
+        with pytest.raises(SnapshotError):
+            store.get("snap-99")
+        assert (store.stats.hits, store.stats.misses) == (1, 1)
+        assert store.evict(100) == 100
+        assert len(store) == 1 and store.get(first.id) is first
+        assert store.stats.evictions == 1 and store.nbytes == 100
+
+    def test_trigram_index(self):
+        """Test that evicted documents stay candidates and buffers can be dropped."""
+        index = TrigramIndex()
+        index.add("buf:1", "alpha beta", (1,))
+        index.add("buf:2", "gamma delta", (1,))
+        before = index.nbytes
+        assert before == index.postings_count * POSTING_BYTES
+
+        freed = index.evict(before - 1)
+        assert freed > 0 and index.stats.evictions == 1
+        assert index.candidates({"gam"}, "buf:") == ["buf:1", "buf:2"]
+        assert index.stats.misses == 1
+
+        assert index.drop_buffer(2) > 0
+        assert "buf:2" not in index and index.nbytes == 0
+
+
+class TestEventQueue:
+    """Test draining autocmd events queued in nvim."""
+
+    def test_dispatch_and_resync(self):
+        """Test that events reach listeners and a fresh install resyncs."""
+        seen, resyncs = [], []
+        events = EventQueue(limit=50)
+        events.subscribe(["BufWipeout"], lambda e, b: seen.append((e, b)))
+        events.subscribe(
+            ["BufUnload"], lambda e, b: seen.append((e, b)), lambda: resyncs.append(1)
+        )
+        exec_lua = Mock(return_value={"items": [], "installed": True})
+        events.drain(exec_lua)
+        exec_lua.assert_called_with(DRAIN_LUA, ["BufUnload", "BufWipeout"], 50)
+        assert resyncs == [1]
+
+        exec_lua.return_value = {"items": [["BufUnload", 3], ["BufWipeout", 3]]}
+        assert events.drain(exec_lua) == 2
+        assert seen == [("BufUnload", 3), ("BufWipeout", 3)]
+        assert events.resyncs == 1
+
+
+class TestServerCaches:
+    """Test cache maintenance in the server."""
+
+    def test_wipeout_drops_buffer(self):
+        """Test that a wiped buffer leaves the index and the scratch pool."""
+        nvim = Mock()
+        server = NvimcpServer(nvim)
+        server.search_index.add("buf:4", "some text", (1,))
+        server.scratch.touch(4, "/tmp/x")
+        nvim.exec_lua.return_value = {"items": [["BufWipeout", 4]]}
+        server._sync_maintain()
+        assert "buf:4" not in server.search_index
+        assert 4 not in server.scratch
+
+    @pytest.mark.asyncio
+    async def test_stats_tool(self):
+        """Test that get_cache_stats lists every managed cache."""
+        server = NvimcpServer(Mock())
+        result = await server.call_tool("get_cache_stats", {})
+        assert "snapshots:" in result[0].text
+        assert "search_index:" in result[0].text
+        assert "nvim events: 0 drained" in result[0].text
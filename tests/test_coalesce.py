@@ -0,0 +1,150 @@
+"""Tests for edit coalescing."""
+
+import asyncio
+
+import pytest
+from unittest.mock import Mock
+
+from nvimcp.coalesce import EDIT_BATCH_LUA, EditCoalescer, EditError
+from nvimcp.core import NvimcpServer, SessionState
+
+
+class Applier:
+    """Batch applier that records batches and can fail single edits."""
+
+    def __init__(self, fail=()):
+        self.batches = []
+        self.fail = set(fail)
+
+    async def __call__(self, buffer_id, edits):
+        self.batches.append((buffer_id, edits))
+        results = [
+            (
+                {"ok": False, "error": "Index out of bounds"}
+                if e[2] and e[2][0] in self.fail
+                else {"ok": True}
+            )
+            for e in edits
+        ]
+        return {"results": results, "tick": 10 + len(self.batches)}
+
+
+class TestEditCoalescer:
+    """Test grouping of edits per buffer."""
+
+    @pytest.mark.asyncio
+    async def test_burst_is_one_batch(self):
+        """Test that edits within the window are applied together in order."""
+        apply = Applier()
+        edits = EditCoalescer(apply, window=0.01)
+        ticks = await asyncio.gather(
+            *(edits.submit(1, i, i + 1, [f"line {i}"]) for i in range(5))
+        )
+        assert ticks == [11] * 5
+        assert len(apply.batches) == 1
+        assert [e[2] for e in apply.batches[0][1]] == [[f"line {i}"] for i in range(5)]
+        assert edits.idle and edits.batches == 1 and edits.edits == 5
+
+    @pytest.mark.asyncio
+    async def test_buffers_are_separate(self):
+        """Test that each buffer gets its own batch."""
+        apply = Applier()
+        edits = EditCoalescer(apply, window=0.01)
+        await asyncio.gather(edits.submit(1, 0, 1, ["a"]), edits.submit(2, 0, 1, ["b"]))
+        assert sorted(b for b, _ in apply.batches) == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_failed_edit_only_fails_its_caller(self):
+        """Test that one bad edit does not fail the rest of the batch."""
+        edits = EditCoalescer(Applier(fail={"bad"}), window=0.01)
+        results = await asyncio.gather(
+            edits.submit(1, 0, 1, ["ok"]),
+            edits.submit(1, 99, 100, ["bad"]),
+            return_exceptions=True,
+        )
+        assert results[0] == 11
+        assert isinstance(results[1], EditError)
+
+    @pytest.mark.asyncio
+    async def test_flush_applies_now(self):
+        """Test that flush() does not wait for the window to close."""
+        apply = Applier()
+        edits = EditCoalescer(apply, window=60)
+        pending = asyncio.ensure_future(edits.submit(1, 0, 1, ["a"]))
+        await asyncio.sleep(0)
+        assert not apply.batches
+        await edits.flush()
+        assert len(apply.batches) == 1 and await pending == 11
+
+    @pytest.mark.asyncio
+    async def test_max_batch(self):
+        """Test that a full batch is applied without waiting."""
+        apply = Applier()
+        edits = EditCoalescer(apply, window=60, max_batch=2)
+        await asyncio.gather(edits.submit(1, 0, 1, ["a"]), edits.submit(1, 1, 2, ["b"]))
+        assert len(apply.batches) == 1
+
+
+class TestServerCoalescing:
+    """Test edit_buffer with coalescing enabled."""
+
+    def make_server(self, window=60):
+        nvim = Mock()
+        nvim.exec_lua.side_effect = lambda code, *args: (
+            {"results": [{"ok": True}] * len(args[1]), "tick": 7}
+            if code == EDIT_BATCH_LUA
+            else None
+        )
+        nvim.buffers = {3: ["before"]}
+        return NvimcpServer(nvim, coalesce_window=window), nvim
+
+    @pytest.mark.asyncio
+    async def test_read_is_a_barrier(self):
+        """Test that a read applies queued edits before running."""
+        server, nvim = self.make_server()
+        edits = [
+            asyncio.ensure_future(
+                server.call_tool(
+                    "edit_buffer",
+                    {"buffer_id": 3, "content": f"x{i}", "line_start": i + 1},
+                )
+            )
+            for i in range(3)
+        ]
+        await asyncio.sleep(0.01)
+        nvim.exec_lua.assert_not_called()
+
+        await server.call_tool("get_buffer_content", {"buffer_id": 3})
+        batch = [c for c in nvim.exec_lua.call_args_list if c[0][0] == EDIT_BATCH_LUA]
+        assert len(batch) == 1
+        assert batch[0][0][2] == [[0, -1, ["x0"]], [1, -1, ["x1"]], [2, -1, ["x2"]]]
+        for result in await asyncio.gather(*edits):
+            assert result[0].text == "Buffer updated successfully"
+
+    @pytest.mark.asyncio
+    async def test_current_buffer_is_not_coalesced(self):
+        """Test that edits without a buffer id are applied directly."""
+        server, nvim = self.make_server()
+        nvim.current.buffer = ["before"]
+        result = await server.call_tool("edit_buffer", {"content": "a"})
+        assert result[0].text == "Buffer updated successfully"
+        assert server.edits.idle and nvim.current.buffer == ["a"]
+        nvim.exec_lua.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_burst_from_one_session(self):
+        """Test that waiting edits do not hold the session's call slots."""
+        server, nvim = self.make_server(window=0.05)
+        state = SessionState(asyncio.Semaphore(server.max_session_calls))
+        server._session_state = lambda: state
+        edits = [
+            server.call_tool(
+                "edit_buffer", {"buffer_id": 3, "content": f"x{i}", "line_start": i + 1}
+            )
+            for i in range(server.max_session_calls * 2)
+        ]
+        for result in await asyncio.wait_for(asyncio.gather(*edits), timeout=5):
+            assert result[0].text == "Buffer updated successfully"
+        batches = [c for c in nvim.exec_lua.call_args_list if c[0][0] == EDIT_BATCH_LUA]
+        assert len(batches) == 1 and len(batches[0][0][2]) == 8
+        assert state.calls == 8
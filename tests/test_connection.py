@@ -2,13 +2,20 @@
 
 import pytest
 import tempfile
+import threading
 import os
+import time
 from unittest.mock import Mock, patch, MagicMock
 from nvimcp.connection import (
     connect_neovim,
     ConnectionError,
+    ConnectionManager,
+    StandbyPool,
+    StartupTiming,
     _connect_embedded,
+    lean_nvim_args,
 )
+from nvimcp.core import NvimcpServer
 
 
 class TestConnectionManagement:
@@ -72,3 +79,234 @@ class TestConnectionManagement:
         mock_socket.assert_called_once()
         mock_embedded.assert_called_once()
         assert result == mock_nvim
+
+
+class FlakyConnect:
+    """connect_neovim stand-in that fails a number of times first."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, mode, socket_path=None, nvim_args=None, timing=None):
+        self.calls.append(mode)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("not yet")
+        nvim = Mock()
+        nvim.mode = mode
+        return nvim
+
+
+class TestConnectionManager:
+    """Test supervised reconnection."""
+
+    def test_reconnect_with_backoff(self):
+        """Test that reconnect retries and notifies listeners."""
+        connect = FlakyConnect()
+        manager = ConnectionManager(mode="socket", backoff=0, connect=connect)
+        old = manager.connect()
+        seen = []
+        manager.add_listener(seen.append)
+
+        connect.failures = 2
+        nvim = manager.reconnect(manager.generation)
+
+        assert connect.calls == ["socket"] * 4
+        assert seen == [nvim] and manager.nvim is nvim
+        assert manager.generation == 2 and manager.reconnects == 1
+        old.close.assert_called_once()
+
+    def test_stale_generation(self):
+        """Test that a caller seeing an old failure does not reconnect again."""
+        connect = FlakyConnect()
+        manager = ConnectionManager(connect=connect)
+        manager.connect()
+        manager.reconnect(1)
+        assert manager.reconnect(1) is manager.nvim
+        assert len(connect.calls) == 2
+
+    def test_embedded_fallback(self):
+        """Test that socket mode falls back to embedded on the last attempt."""
+        connect = FlakyConnect()
+        manager = ConnectionManager(
+            mode="socket", max_attempts=3, backoff=0, connect=connect
+        )
+        manager.connect()
+        connect.failures = 2
+        assert manager.reconnect().mode == "embedded"
+
+    def test_gives_up(self):
+        """Test that reconnect raises once attempts are exhausted."""
+        manager = ConnectionManager(
+            max_attempts=2, backoff=0, connect=FlakyConnect(failures=10)
+        )
+        with pytest.raises(ConnectionError, match="after 2 attempts"):
+            manager.reconnect()
+
+
+class FakeSpawn:
+    """_connect_embedded stand-in that records startup phases."""
+
+    def __init__(self):
+        self.started = []
+
+    def __call__(self, nvim_args, timing=None):
+        nvim = Mock()
+        nvim.args = nvim_args
+        if timing is not None:
+            timing.phases.update(attach=0.2, probe=0.05)
+        self.started.append(nvim)
+        return nvim
+
+
+def wait_ready(pool, n=1):
+    deadline = time.monotonic() + 5
+    while len(pool) < n and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+class TestStandby:
+    """Test the lean profile and standby instances."""
+
+    def test_lean_args(self):
+        """Test that allowlisted plugins go on the runtimepath."""
+        args = lean_nvim_args(["/opt/plug ins/a,b"])
+        assert args[:7] == [
+            "nvim",
+            "--embed",
+            "--headless",
+            "--clean",
+            "-n",
+            "-i",
+            "NONE",
+        ]
+        assert args[7:] == ["--cmd", "set rtp^=/opt/plug\\ ins/a\\,b"]
+
+    def test_timing_format(self):
+        """Test that every phase and the total are reported."""
+        timing = StartupTiming({"attach": 0.1, "probe": 0.002})
+        assert timing.format() == "attach=100.0ms probe=2.0ms total=102.0ms"
+
+    def test_take_uses_standby(self):
+        """Test that take() hands out the instance started ahead."""
+        spawn = FakeSpawn()
+        pool = StandbyPool(["nvim"], spawn=spawn)
+        cold, timing = pool.take()
+        assert pool.misses == 1 and timing.phases == {"attach": 0.2, "probe": 0.05}
+
+        warm, timing = pool.take()
+        assert warm is spawn.started[1] and pool.hits == 1
+        assert set(timing.phases) == {"wait", "probe"}
+        assert timing.background.phases["attach"] == 0.2
+        assert "started ahead" in timing.format()
+        warm.request.assert_called_with("nvim_get_mode")
+        wait_ready(pool)
+        pool.close()
+        assert spawn.started[2].close.called
+
+    def test_dead_standby_is_replaced(self):
+        """Test that an instance that exited while idle is not handed out."""
+        spawn = FakeSpawn()
+        pool = StandbyPool(["nvim"], spawn=spawn)
+        pool.take()
+        wait_ready(pool)
+        pool._ready[0][0].request.side_effect = EOFError()
+        nvim, timing = pool.take()
+        assert nvim is spawn.started[2] and pool.misses == 2
+        assert timing.background is None
+        pool.close()
+
+    def test_take_times_out_on_hung_standby(self):
+        """Test that a standby whose startup hangs does not block take()."""
+        release = threading.Event()
+
+        def spawn(nvim_args, timing=None):
+            release.wait(5)
+            return Mock()
+
+        pool = StandbyPool(["nvim"], spawn=spawn, wait_timeout=0.05)
+        pool.fill()
+        with pytest.raises(ConnectionError, match="No standby nvim ready"):
+            pool.take()
+        release.set()
+        pool.close()
+
+    def test_restart_uses_standby(self):
+        """Test that a restart takes a standby instance and notifies listeners."""
+        spawn = FakeSpawn()
+        manager = ConnectionManager(
+            mode="embedded", standby=StandbyPool(["nvim"], spawn=spawn)
+        )
+        old = manager.connect()
+        seen = []
+        manager.add_listener(seen.append)
+        nvim = manager.restart()
+        assert seen == [nvim] and nvim is spawn.started[1]
+        assert manager.restarts == 1 and manager.generation == 2
+        assert manager.startup.background is not None
+        old.close.assert_called_once()
+        manager.close()
+
+
+class TestServerReconnect:
+    """Test how the server handles a lost connection."""
+
+    def make_server(self):
+        dead = Mock()
+        dead.request.side_effect = BrokenPipeError("gone")
+        dead.command_output.side_effect = BrokenPipeError("gone")
+        alive = Mock()
+        alive.request.return_value = {"mode": "n"}
+        manager = ConnectionManager(backoff=0, connect=lambda **kw: alive)
+        manager.nvim, manager.generation = dead, 1
+        server = NvimcpServer(dead, connection=manager)
+        return server, alive
+
+    @pytest.mark.asyncio
+    async def test_read_is_replayed(self):
+        """Test that a read-only tool is retried on the new connection."""
+        server, alive = self.make_server()
+        server.scratch.touch(5, "/tmp/x")
+        result = await server.call_tool("get_status", {})
+        assert "mode: {'mode': 'n'}" in result[0].text
+        assert server.nvim is alive
+        assert len(server.scratch) == 0
+
+    @pytest.mark.asyncio
+    async def test_write_fails_cleanly(self):
+        """Test that a write is not retried after reconnecting."""
+        server, alive = self.make_server()
+        result = await server.call_tool("run_command", {"command": "w"})
+        assert result[0].text.startswith("Command failed")
+        assert "not retried" in result[0].text
+        assert server.nvim is alive
+        alive.command_output.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_health_check_reconnects(self):
+        """Test that a failed ping replaces the connection."""
+        server, alive = self.make_server()
+        await server._in_executor(server._sync_ping)
+        assert server.nvim is alive
+
+    @pytest.mark.asyncio
+    async def test_restart_tool(self):
+        """Test that embedded servers can restart nvim and report startup."""
+        spawn = FakeSpawn()
+        manager = ConnectionManager(
+            mode="embedded", standby=StandbyPool(["nvim"], spawn=spawn)
+        )
+        server = NvimcpServer(manager.connect(), connection=manager)
+        result = await server.call_tool("restart_nvim", {})
+        assert result[0].text.startswith("Restarted nvim (generation 2): wait=")
+        assert server.nvim is spawn.started[1]
+        server.nvim.request.return_value = []
+        result = await server.call_tool("get_status", {})
+        assert "startup: wait=" in result[0].text
+        manager.close()
+
+    def test_no_restart_tool_for_socket(self):
+        """Test that restarting is only offered for embedded nvim."""
+        server, _ = self.make_server()
+        assert "restart_nvim" not in server.registry
@@ -0,0 +1,71 @@
+"""Tests for the get_context tool."""
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.context import budget_bytes, format_context
+from nvimcp.core import NvimcpServer
+
+
+class TestGetContext:
+    """Test budgeted context reads."""
+
+    @pytest.fixture
+    def mock_nvim(self):
+        """Create a mock nvim instance with two visible windows."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = [
+            {
+                "win": 1000,
+                "buf": 1,
+                "name": "/w/main.py",
+                "filetype": "python",
+                "cursor": [12, 4],
+                "viewport": [1, 40],
+                "first": 10,
+                "last": 13,
+                "node": "function_definition",
+                "lines": ["def f():", "    x = 1", "    y = 2", "    return x + y"],
+                "current": True,
+            },
+            {
+                "win": 1001,
+                "buf": 2,
+                "name": "",
+                "filetype": "",
+                "cursor": [1, 0],
+                "viewport": [1, 1],
+                "first": 1,
+                "last": 1,
+                "lines": ["scratch"],
+                "current": False,
+            },
+        ]
+        return nvim
+
+    @pytest.mark.asyncio
+    async def test_get_context(self, mock_nvim):
+        """Test that context for all windows comes from one call."""
+        server = NvimcpServer(mock_nvim)
+
+        result = await server._get_context(max_tokens=100)
+
+        mock_nvim.exec_lua.assert_called_once()
+        assert mock_nvim.exec_lua.call_args[0][1:] == (400, True)
+        text = result[0].text
+        assert (
+            "==> /w/main.py (buffer 1, window 1000, current) lines 10-13, "
+            "cursor 12:4, filetype python, node function_definition <==\n"
+            "def f():" in text
+        )
+        assert "==> [No Name] (buffer 2, window 1001) lines 1-1, cursor 1:0 <==" in text
+        assert text.endswith("scratch")
+
+    def test_budget_bytes(self):
+        """Test resolving token and byte budgets."""
+        assert budget_bytes() == 8000
+        assert budget_bytes(max_tokens=10) == 40
+        assert budget_bytes(max_tokens=10, max_bytes=7) == 7
+
+    def test_nothing_fits(self):
+        """Test the empty result message."""
+        assert format_context([]) == "No context within budget"
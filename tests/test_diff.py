@@ -0,0 +1,113 @@
+"""Tests for the in-nvim diff tool."""
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.diff import DIFF_LUA, build_specs, format_diffs
+from nvimcp.snapshot import SnapshotStore
+
+OPTS = {"context": 3, "algorithm": "myers", "ignore_whitespace": False}
+
+
+def snapshot():
+    store = SnapshotStore()
+    return store.add(
+        {
+            "current": 1,
+            "buffers": [
+                {"buf": 1, "name": "a", "tick": 5, "lines": ["x"]},
+                {"buf": 2, "name": "b", "tick": 7, "lines": ["y"]},
+            ],
+        }
+    )
+
+
+class TestDiffHelpers:
+    """Test spec building and formatting."""
+
+    def test_build_specs(self):
+        """Test specs for each target."""
+        assert build_specs("disk", None) is None
+        assert build_specs("disk", [3]) == [{"buf": 3, "disk": True}]
+        assert build_specs("buffer", [1, 2], 9) == [
+            {"buf": 1, "other": 9},
+            {"buf": 2, "other": 9},
+        ]
+        assert build_specs("snapshot", None, snapshot=snapshot()) == [
+            {"buf": 1, "tick": 5},
+            {"buf": 2, "tick": 7},
+        ]
+        with pytest.raises(ValueError, match="other_buffer_id"):
+            build_specs("buffer", [1])
+        with pytest.raises(ValueError, match="snapshot_id"):
+            build_specs("snapshot", None)
+
+    def test_format(self):
+        """Test headers, identical buffers and errors."""
+        text = format_diffs(
+            [
+                {
+                    "buf": 1,
+                    "old": "a.py",
+                    "new": "a.py",
+                    "hunks": "@@ -1 +1 @@\n-x\n+y\n",
+                },
+                {"buf": 2, "old": "b.py", "new": "b.py", "hunks": ""},
+                {"buf": 3, "unchanged": True},
+                {"buf": 4, "error": "invalid or unloaded buffer"},
+            ]
+        )
+        assert text == (
+            "--- a.py\n+++ a.py\n@@ -1 +1 @@\n-x\n+y\n"
+            "b.py: no differences\n"
+            "buffer 3: no differences\n"
+            "buffer 4: invalid or unloaded buffer"
+        )
+        assert format_diffs([]) == "No modified buffers"
+
+
+class TestDiffTool:
+    """Test the diff tool."""
+
+    @pytest.mark.asyncio
+    async def test_modified_buffers_against_disk(self):
+        """Test that the default diffs every modified buffer in one call."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = [
+            {"buf": 1, "old": "a", "new": "a", "hunks": "@@ -1 +1 @@\n-x\n+y\n"}
+        ]
+        server = NvimcpServer(nvim)
+        result = await server.call_tool("diff", {})
+        nvim.exec_lua.assert_called_once_with(DIFF_LUA, None, OPTS)
+        assert result[0].text.startswith("--- a\n+++ a\n@@")
+
+    @pytest.mark.asyncio
+    async def test_snapshot_lines_sent_only_when_changed(self):
+        """Test the tick check before snapshot lines are sent."""
+        nvim = Mock()
+        server = NvimcpServer(nvim)
+        server.snapshots = SnapshotStore()
+        snap = server.snapshots.add(
+            {
+                "current": 1,
+                "buffers": [
+                    {"buf": 1, "name": "a", "tick": 5, "lines": ["x"]},
+                    {"buf": 2, "name": "b", "tick": 7, "lines": ["y"]},
+                ],
+            }
+        )
+        nvim.exec_lua.side_effect = [
+            [{"buf": 1, "unchanged": True}, {"buf": 2, "need_lines": True}],
+            [{"buf": 2, "old": "b@7", "new": "b", "hunks": "@@ -1 +1 @@\n-y\n+z\n"}],
+        ]
+
+        result = await server.call_tool(
+            "diff", {"target": "snapshot", "snapshot_id": snap.id}
+        )
+
+        first, second = nvim.exec_lua.call_args_list
+        assert first.args[1] == [{"buf": 1, "tick": 5}, {"buf": 2, "tick": 7}]
+        assert second.args[1] == [{"buf": 2, "tick": 7, "lines": ["y"]}]
+        assert result[0].text == (
+            "buffer 1: no differences\n--- b@7\n+++ b\n@@ -1 +1 @@\n-y\n+z"
+        )
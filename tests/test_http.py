@@ -0,0 +1,138 @@
+"""Tests for the multi-client HTTP transport."""
+
+import asyncio
+import socket
+import httpx
+import pytest
+import uvicorn
+from unittest.mock import Mock
+from mcp import ClientSession
+from mcp.client.streamable_http import streamable_http_client
+from nvimcp.core import NvimcpServer
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestHttpTransport:
+    """Test serving several MCP sessions from one server."""
+
+    @pytest.fixture
+    def mock_nvim(self, tmp_path):
+        """Create a mock nvim instance."""
+        nvim = Mock()
+        nvim.command_output.return_value = "shared output"
+
+        def mock_request(method, *args):
+            if method == "nvim_eval":
+                return str(tmp_path)
+            return {"nvim_get_mode": {"mode": "n"}}.get(method, [])
+
+        nvim.request.side_effect = mock_request
+        return nvim
+
+    @pytest.mark.asyncio
+    async def test_concurrent_sessions(self, mock_nvim):
+        """Test that two sessions share the nvim connection."""
+        server = NvimcpServer(mock_nvim, max_session_calls=1)
+        # Keep closed sessions around so their state can be inspected
+        server._sessions = {}
+        port = _free_port()
+        http = uvicorn.Server(
+            uvicorn.Config(server.http_app(), port=port, log_level="warning")
+        )
+        serve = asyncio.create_task(http.serve())
+
+        async def client():
+            url = f"http://127.0.0.1:{port}/mcp/"
+            async with streamable_http_client(url) as (read, write, _):
+                async with ClientSession(read, write) as session:
+                    await session.initialize()
+                    tools = await session.list_tools()
+                    result = await session.call_tool(
+                        "run_command", {"command": "echo 1"}
+                    )
+                    return [t.name for t in tools.tools], result.content[0].text
+
+        try:
+            for _ in range(50):
+                try:
+                    socket.create_connection(("127.0.0.1", port)).close()
+                    break
+                except OSError:
+                    await asyncio.sleep(0.05)
+            results = await asyncio.wait_for(
+                asyncio.gather(client(), client()), timeout=20
+            )
+        finally:
+            http.should_exit = True
+            await asyncio.wait_for(serve, timeout=10)
+            if server.files is not None:
+                server.files.close()
+
+        for names, text in results:
+            assert "run_command" in names
+            assert text == "shared output"
+        assert mock_nvim.command_output.call_count == 2
+        states = list(server._sessions.values())
+        assert len(states) == 2
+        assert all(state.calls == 1 for state in states)
+
+    @pytest.mark.asyncio
+    async def test_foreign_host_and_origin_rejected(self, mock_nvim):
+        """Test DNS rebinding protection on both transports."""
+        server = NvimcpServer(mock_nvim)
+        port = _free_port()
+        http = uvicorn.Server(
+            uvicorn.Config(
+                server.http_app(allowed_hosts=["nvim.lan:*"]),
+                port=port,
+                log_level="warning",
+            )
+        )
+        serve = asyncio.create_task(http.serve())
+        init = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "initialize",
+            "params": {
+                "protocolVersion": "2025-03-26",
+                "capabilities": {},
+                "clientInfo": {"name": "t", "version": "0"},
+            },
+        }
+        accept = {"Accept": "application/json, text/event-stream"}
+        try:
+            for _ in range(50):
+                try:
+                    socket.create_connection(("127.0.0.1", port)).close()
+                    break
+                except OSError:
+                    await asyncio.sleep(0.05)
+            base = f"http://127.0.0.1:{port}"
+            async with httpx.AsyncClient(base_url=base, timeout=10) as client:
+                foreign = await client.post(
+                    "/mcp/", json=init, headers={**accept, "Host": "evil.example"}
+                )
+                origin = await client.post(
+                    "/mcp/",
+                    json=init,
+                    headers={**accept, "Origin": "http://evil.example"},
+                )
+                sse = await client.get("/sse", headers={"Host": "evil.example"})
+                allowed = await client.post(
+                    "/mcp/", json=init, headers={**accept, "Host": f"nvim.lan:{port}"}
+                )
+        finally:
+            http.should_exit = True
+            await asyncio.wait_for(serve, timeout=10)
+            if server.files is not None:
+                server.files.close()
+
+        assert foreign.status_code == 421
+        assert origin.status_code == 403
+        assert sse.status_code == 421
+        assert allowed.status_code == 200
@@ -0,0 +1,182 @@
+"""Tests for the workspace file index and the find_files tool."""
+
+import errno
+import os
+import sys
+import time
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.index import FileIndex, IgnoreRules, compile_glob, fuzzy_score
+
+
+def _write(root, rel, text=""):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    """Create a small workspace with ignore rules."""
+    root = str(tmp_path)
+    _write(root, ".gitignore", "*.log\nbuild/\n!keep.log\n/top.txt\n")
+    _write(root, "src/main.py")
+    _write(root, "src/util/helpers.py")
+    _write(root, "src/.gitignore", "generated_*\n")
+    _write(root, "src/generated_api.py")
+    _write(root, "debug.log")
+    _write(root, "keep.log")
+    _write(root, "top.txt")
+    _write(root, "docs/top.txt")
+    _write(root, "build/out.bin")
+    _write(root, ".git/HEAD")
+    return root
+
+
+class TestIgnoreRules:
+    """Test .gitignore matching."""
+
+    def test_patterns(self, workspace):
+        """Test globs, negation, anchoring and directory rules."""
+        rules = IgnoreRules()
+        rules.add_file(os.path.join(workspace, ".gitignore"))
+
+        assert rules.is_ignored("debug.log")
+        assert rules.is_ignored("a/b/trace.log")
+        assert not rules.is_ignored("keep.log")
+        assert rules.is_ignored("top.txt")
+        assert not rules.is_ignored("docs/top.txt")
+        assert rules.is_ignored("build", is_dir=True)
+        assert rules.is_ignored("build/out.bin")
+        assert rules.is_ignored(".git/HEAD")
+
+    def test_compile_glob(self):
+        """Test ** and single-segment wildcards."""
+        assert compile_glob("src/**/*.py").match("src/a/b/c.py")
+        assert compile_glob("src/**/*.py").match("src/c.py")
+        assert not compile_glob("src/*.py").match("src/a/c.py")
+        assert compile_glob("*.py").match("deep/dir/c.py")
+
+
+class TestFileIndex:
+    """Test building and querying the index."""
+
+    def test_build_and_query(self, workspace):
+        """Test that the index honours nested ignore files."""
+        index = FileIndex(workspace, watch=False)
+        index.start()
+        assert index.wait(timeout=5.0)
+
+        assert index.paths() == [
+            ".gitignore",
+            "docs/top.txt",
+            "keep.log",
+            "src/.gitignore",
+            "src/main.py",
+            "src/util/helpers.py",
+        ]
+        assert index.query("src/u", mode="prefix") == ["src/util/helpers.py"]
+        assert index.query("**/*.py", mode="glob") == [
+            "src/main.py",
+            "src/util/helpers.py",
+        ]
+        assert index.query("hlp", mode="fuzzy")[0] == "src/util/helpers.py"
+        assert index.query("", limit=2) == [".gitignore", "docs/top.txt"]
+        index.close()
+
+    def test_fuzzy_prefers_basename(self):
+        """Test that matches in the file name outrank directory matches."""
+        assert fuzzy_score("main", "src/main.py") > fuzzy_score(
+            "main", "m/a/i/n/other.py"
+        )
+        assert fuzzy_score("xyz", "src/main.py") is None
+
+    def test_invalid_mode(self, workspace):
+        """Test rejecting unknown query modes."""
+        with pytest.raises(ValueError):
+            FileIndex(workspace, watch=False).query("x", mode="regex")
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+    def test_inotify_updates(self, workspace):
+        """Test that created and deleted files are picked up."""
+        index = FileIndex(workspace)
+        events = []
+        index.add_listener(lambda event, path: events.append((event, path)))
+        index.start()
+        assert index.wait(timeout=5.0)
+
+        _write(workspace, "src/new/added.py")
+        _write(workspace, "ignored.log")
+        os.remove(os.path.join(workspace, "src/main.py"))
+
+        deadline = time.time() + 5.0
+        while time.time() < deadline:
+            paths = index.paths()
+            if "src/new/added.py" in paths and "src/main.py" not in paths:
+                break
+            time.sleep(0.05)
+
+        paths = index.paths()
+        assert "src/new/added.py" in paths
+        assert "src/main.py" not in paths
+        assert "ignored.log" not in paths
+        assert ("removed", "src/main.py") in events
+        index.close()
+
+    def test_watch_limit_keeps_existing_watches(self, workspace):
+        """Test that ENOSPC stops adding watches without dropping the others."""
+
+        class FullInotify:
+            def __init__(self):
+                self.added = []
+
+            def add_watch(self, path):
+                if len(self.added) == 2:
+                    raise OSError(errno.ENOSPC, "No space left on device")
+                self.added.append(path)
+                return len(self.added)
+
+        index = FileIndex(workspace)
+        index._inotify = inotify = FullInotify()
+        index.rebuild()
+        assert index._inotify is inotify and len(index._watches) == 2
+        assert len(inotify.added) == 2
+        assert "src/util/helpers.py" in index.paths()
+
+
+class TestFindFilesTool:
+    """Test the find_files tool."""
+
+    @pytest.mark.asyncio
+    async def test_find_files(self, workspace):
+        """Test querying the index rooted at the nvim cwd."""
+        nvim = Mock()
+        nvim.request.return_value = workspace
+        server = NvimcpServer(nvim)
+
+        result = await server._find_files("main")
+
+        nvim.request.assert_called_with("nvim_eval", "getcwd()")
+        assert result[0].text == "src/main.py"
+        assert server.files.root == os.path.abspath(workspace)
+
+        result = await server._find_files("nothing-like-this", mode="prefix")
+        assert result[0].text == "No matching files"
+        server.files.close()
+
+    @pytest.mark.asyncio
+    async def test_index_starts_on_first_use(self, workspace):
+        """Test that startup does not walk the cwd unless asked to."""
+        nvim = Mock()
+        nvim.request.return_value = workspace
+        server = NvimcpServer(nvim, maintenance_interval=0)
+        await server._startup()
+        assert server.files is None
+        nvim.request.assert_not_called()
+
+        eager = NvimcpServer(nvim, maintenance_interval=0, index_on_start=True)
+        await eager._startup()
+        assert eager.files is not None and eager.files.root == workspace
+        eager.files.close()
@@ -0,0 +1,243 @@
+"""Tests for line hash arrays, edit minimization, duplicates and moves."""
+
+import pytest
+from unittest.mock import MagicMock, Mock
+
+from nvimcp import linehash
+from nvimcp.core import NvimcpServer
+from nvimcp.linehash import (
+    SPLICE_LUA,
+    SYNC_LUA,
+    LineHashIndex,
+    find_duplicates,
+    format_duplicates,
+    hash_lines,
+    minimal_splice,
+    moved_blocks,
+    window_keys,
+)
+
+LINES = [f"line {i}" for i in range(40)]
+
+
+@pytest.fixture(params=["python", "numpy"])
+def backend(request, monkeypatch):
+    """Run a test on the pure Python paths and, if installed, on numpy."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(linehash, "NUMPY_MIN", 0)
+    else:
+        monkeypatch.setattr(linehash, "np", None)
+    return request.param
+
+
+class TestHelpers:
+    """Test comparisons over hash arrays."""
+
+    def test_minimal_splice(self, backend):
+        """Test that only the differing middle is replaced."""
+        new = LINES[:10] + ["x", "y"] + LINES[15:]
+        assert minimal_splice(hash_lines(LINES), hash_lines(new)) == (10, 15, 12)
+        same = hash_lines(LINES)
+        assert minimal_splice(same, same) == (40, 40, 40)
+        assert minimal_splice(hash_lines(["a"]), hash_lines(["a", "a"])) == (1, 1, 2)
+
+    def test_window_keys(self, backend):
+        """Test that equal runs of lines get equal keys."""
+        keys = list(window_keys(hash_lines(["a", "b", "c", "a", "b", "c"]), 3))
+        assert len(keys) == 4 and keys[0] == keys[3]
+        assert len(set(keys[:3])) == 3
+        assert list(window_keys(hash_lines(["a"]), 2)) == []
+
+    def test_find_duplicates(self, backend):
+        """Test that copies are merged into maximal blocks across buffers."""
+        buffers = {
+            1: hash_lines(LINES),
+            2: hash_lines(["other"] + LINES[5:17] + ["more"] + LINES[30:34]),
+        }
+        found = find_duplicates(buffers, min_lines=4)
+        assert [(d.lines, d.locations) for d in found] == [
+            (12, [(1, 5), (2, 1)]),
+            (4, [(1, 30), (2, 14)]),
+        ]
+        text = format_duplicates(found, {1: "a.py"})
+        assert text.splitlines()[0] == "12 lines x2: a.py:6-17, buffer 2:2-13"
+
+    def test_repeated_lines_ignored(self, backend):
+        """Test that runs of one repeated line are not reported."""
+        buffers = {1: hash_lines([""] * 10 + ["}"] * 10), 2: hash_lines([""] * 8)}
+        assert find_duplicates(buffers, min_lines=3) == []
+        assert format_duplicates([]) == "No duplicate blocks"
+
+    def test_moved_block(self, backend):
+        """Test that a moved block is reported and shifted text is not."""
+        moved = LINES[:10] + LINES[20:] + LINES[10:20]
+        assert moved_blocks(hash_lines(LINES), hash_lines(moved)) == [(10, 30, 10)]
+        inserted = LINES[:10] + ["new"] * 5 + LINES[10:]
+        assert moved_blocks(hash_lines(LINES), hash_lines(inserted)) == []
+
+
+class FakeSync:
+    """exec_lua stand-in for SYNC_LUA over lists of lines."""
+
+    def __init__(self, **buffers):
+        self.buffers = {int(b[1:]): lines for b, lines in buffers.items()}
+        self.ticks = {b: 1 for b in self.buffers}
+        self.synced = {}
+        self.window = {}
+        self.calls = []
+
+    def set_lines(self, buf, start, end, lines):
+        self.buffers[buf][start:end] = lines
+        self.ticks[buf] += 1
+        prefix, suffix = self.window.get(buf, (start, len(self.buffers[buf])))
+        self.window[buf] = (
+            min(prefix, start),
+            min(suffix, len(self.buffers[buf]) - start - len(lines)),
+        )
+
+    def __call__(self, code, known):
+        assert code == SYNC_LUA
+        self.calls.append(known)
+        out = []
+        for buf, tick in known:
+            lines = self.buffers.get(buf)
+            if lines is None:
+                out.append({"buf": buf, "error": "invalid or unloaded buffer"})
+                continue
+            r = {"buf": buf, "tick": self.ticks[buf]}
+            if tick != self.synced.get(buf):
+                r.update(full=True, lines=list(lines))
+            elif buf in self.window:
+                prefix, suffix = self.window[buf]
+                r.update(
+                    prefix=prefix,
+                    suffix=suffix,
+                    lines=lines[prefix : len(lines) - suffix],
+                )
+            self.window.pop(buf, None)
+            self.synced[buf] = self.ticks[buf]
+            out.append(r)
+        return out
+
+
+class TestLineHashIndex:
+    """Test keeping hash arrays in step with buffers."""
+
+    def test_incremental_sync(self):
+        """Test that only changed lines are sent after the first sync."""
+        lua = FakeSync(b1=list(LINES))
+        index = LineHashIndex()
+        index.sync(lua, [1, 9])
+        assert index.synced_lines == 40 and 9 not in index
+
+        lua.set_lines(1, 3, 5, ["a", "b", "c"])
+        lua.set_lines(1, 30, 32, [])
+        state = index.sync(lua, [1])[1]
+        assert state.hashes == hash_lines(lua.buffers[1])
+        assert index.synced_lines == 40 + 27 and state.tick == 3
+
+        index.sync(lua, [1])
+        assert index.synced_lines == 67 and index.stats.hits == 2
+
+    def test_evict_and_drop(self):
+        """Test that forgotten buffers are resent in full."""
+        lua = FakeSync(b1=list(LINES), b2=["x"])
+        index = LineHashIndex()
+        index.sync(lua, [1, 2])
+        assert index.drop_buffer(2) > 0 and 2 not in index
+        assert index.evict(0) == index.stats.evicted_bytes > 0
+        assert len(index) == 0
+        index.sync(lua, [1])
+        assert lua.calls[-1] == [[1, -1]]
+
+
+def server_lua(sync, *results):
+    """exec_lua dispatching SYNC_LUA to `sync`; other chunks get `results` in order."""
+    pending = list(results)
+
+    def exec_lua(code, *args):
+        if code == SYNC_LUA:
+            return sync(code, *args)
+        if not pending:
+            raise AssertionError("unexpected Lua chunk")
+        return pending.pop(0)
+
+    return Mock(side_effect=exec_lua)
+
+
+class TestServer:
+    """Test the server features built on line hashes."""
+
+    @pytest.mark.asyncio
+    async def test_minimized_edit(self):
+        """Test that a whole-buffer edit only sets the lines that differ."""
+        sync = FakeSync(b3=list(LINES))
+        nvim = Mock()
+        nvim.exec_lua = server_lua(sync, {"ok": True, "tick": 2})
+        nvim.buffers = {3: Mock(number=3)}
+        server = NvimcpServer(nvim, minimize_edits=True)
+        content = "\n".join(LINES[:20] + ["changed"] + LINES[21:])
+        result = await server.call_tool(
+            "edit_buffer", {"buffer_id": 3, "content": content}
+        )
+        assert result[0].text == "Buffer updated successfully"
+        edit = nvim.exec_lua.call_args_list[-1][0]
+        assert edit == (SPLICE_LUA, 3, 1, 20, 21, ["changed"], "line 19", "line 21")
+
+    @pytest.mark.asyncio
+    async def test_minimized_edit_checks_neighbours(self):
+        """Test that a splice whose edges do not match falls back to a full set."""
+        sync = FakeSync(b3=list(LINES))
+        nvim = Mock()
+        nvim.exec_lua = server_lua(sync, {"ok": False, "tick": 1, "mismatch": True})
+        buffer = MagicMock(number=3)
+        nvim.buffers = {3: buffer}
+        server = NvimcpServer(nvim, minimize_edits=True)
+        content = "\n".join(["changed"] + LINES[1:])
+        result = await server.call_tool(
+            "edit_buffer", {"buffer_id": 3, "content": content}
+        )
+        assert result[0].text == "Buffer updated successfully"
+        assert nvim.exec_lua.call_args_list[-1][0][-2:] == (None, "line 1")
+        buffer.__setitem__.assert_called_once_with(
+            slice(None, None), ["changed"] + LINES[1:]
+        )
+        assert 3 not in server.line_hashes
+
+    @pytest.mark.asyncio
+    async def test_find_duplicates_tool(self):
+        """Test that duplicates are reported with buffer names."""
+        sync = FakeSync(b1=list(LINES), b2=LINES[8:14])
+        infos = [
+            {"buf": b, "name": f"/src/{b}.py", "loaded": True, "listed": True}
+            for b in (1, 2)
+        ]
+        nvim = Mock()
+        nvim.exec_lua = server_lua(sync, {"items": [], "installed": True}, infos)
+        server = NvimcpServer(nvim)
+        result = await server.call_tool("find_duplicates", {"min_lines": 4})
+        assert result[0].text == "6 lines x2: /src/1.py:9-14, /src/2.py:1-6"
+        assert sync.calls == [[[1, -1], [2, -1]]]
+
+    @pytest.mark.asyncio
+    async def test_diff_detect_moves(self):
+        """Test that buffer diffs list blocks moved between the buffers."""
+        sync = FakeSync(b1=list(LINES), b2=LINES[10:20] + LINES[:10] + LINES[20:])
+        diff = [{"buf": 1, "old": "a.py", "new": "b.py", "hunks": "@@ -1 +1 @@\n"}]
+        nvim = Mock()
+        nvim.exec_lua = server_lua(sync, diff)
+        server = NvimcpServer(nvim)
+        result = await server.call_tool(
+            "diff",
+            {
+                "target": "buffer",
+                "buffer_ids": [1],
+                "other_buffer_id": 2,
+                "detect_moves": True,
+            },
+        )
+        assert "moved: 10 lines from 1-10 to 11-20" in result[0].text
+
+        result = await server.call_tool("diff", {"detect_moves": True})
+        assert "detect_moves needs target=buffer or snapshot" in result[0].text
@@ -0,0 +1,127 @@
+"""Tests for cached Lua chunks and the exec_lua tool."""
+
+import json
+import pytest
+from nvimcp.core import NvimcpServer
+from nvimcp.luacache import (
+    BATCH_LUA,
+    REGISTER_LUA,
+    LuaChunks,
+    chunk_id,
+)
+
+# Chunk code -> Python stand-in for what nvim would run
+PROGRAMS = {
+    "return ... * 2": lambda x: x * 2,
+    "error('no')": None,
+}
+
+
+class FakeLuaNvim:
+    """Emulates the nvim side of the chunk cache."""
+
+    def __init__(self):
+        self.chunks = {}
+        self.requests = []
+
+    def exec_lua(self, code, *args):
+        self.requests.append(code)
+        if code == REGISTER_LUA:
+            add, drop = args
+            for handle in drop:
+                self.chunks.pop(handle, None)
+            for handle, source in add:
+                self.chunks[handle] = PROGRAMS[source]
+            return True
+        if code == BATCH_LUA:
+            calls, stop = args
+            results = []
+            for handle, call_args, n in calls:
+                if handle not in self.chunks:
+                    result = {"ok": False, "missing": True, "error": "unknown"}
+                elif self.chunks[handle] is None:
+                    result = {"ok": False, "error": "no"}
+                else:
+                    result = {"ok": True, "value": self.chunks[handle](*call_args)}
+                results.append(result)
+                if stop and not result["ok"]:
+                    break
+            return results
+        raise AssertionError("unexpected chunk")
+
+
+class TestLuaChunks:
+    """Test the chunk cache."""
+
+    def test_batch(self):
+        """Test results per call, unknown handles and stop_on_error."""
+        nvim = FakeLuaNvim()
+        chunks = LuaChunks()
+        double, fail = chunks.add("return ... * 2"), chunks.add("error('no')")
+        calls = [[double, [1]], [fail, []], [double, [3]], ["bogus", []]]
+
+        results = chunks.batch(nvim.exec_lua, calls)
+        assert [r["ok"] for r in results] == [True, False, True, False]
+        assert results[2]["value"] == 6 and results[3]["missing"]
+        assert nvim.requests == [REGISTER_LUA, BATCH_LUA]
+
+        assert len(chunks.batch(nvim.exec_lua, calls, stop_on_error=True)) == 2
+
+    def test_batch_retries_only_lost_calls(self):
+        """Test that calls which already ran are not run twice."""
+        nvim = FakeLuaNvim()
+        chunks = LuaChunks()
+        double = chunks.add("return ... * 2")
+        chunks.batch(nvim.exec_lua, [[double, [1]]])
+        nvim.chunks.clear()
+        results = chunks.batch(nvim.exec_lua, [[double, [2]], [double, [3]]])
+        assert [r["value"] for r in results] == [4, 6]
+        assert nvim.requests[-2:] == [REGISTER_LUA, BATCH_LUA]
+
+    def test_evict_least_recently_used(self):
+        """Test that evicted chunks become unknown and nvim forgets them."""
+        nvim = FakeLuaNvim()
+        chunks = LuaChunks()
+        double, fail = chunks.add("return ... * 2"), chunks.add("error('no')")
+        chunks.batch(nvim.exec_lua, [[fail, []], [double, [1]]])
+        size = chunks.nbytes
+        assert chunks.evict(size - 1) == chunks.stats.evicted_bytes > 0
+        assert fail not in chunks and double in chunks
+
+        chunks.batch(nvim.exec_lua, [[double, [2]]])
+        assert list(nvim.chunks) == [double]
+        results = chunks.batch(nvim.exec_lua, [[fail, []]])
+        assert results[0]["missing"] and chunks.stats.misses == 1
+
+        assert chunks.add("error('no')") == fail
+        assert chunks.batch(nvim.exec_lua, [[fail, []]])[0]["error"] == "no"
+        assert chunks.evict(0) == size and len(chunks) == 0 and chunks.nbytes == 0
+
+
+class TestExecLuaTool:
+    """Test the exec_lua tool."""
+
+    @pytest.mark.asyncio
+    async def test_register_then_call(self):
+        """Test registering a chunk and calling it by handle in a batch."""
+        server = NvimcpServer(FakeLuaNvim())
+        registered = await server.call_tool("exec_lua", {"code": "return ... * 2"})
+        handle = json.loads(registered[0].text)["handle"]
+        assert handle == chunk_id("return ... * 2")
+
+        result = await server.call_tool(
+            "exec_lua", {"handle": handle, "calls": [{"args": [1]}, {"args": [2]}]}
+        )
+        values = [r["value"] for r in json.loads(result[0].text)["results"]]
+        assert values == [2, 4]
+
+    @pytest.mark.asyncio
+    async def test_errors(self):
+        """Test argument errors are reported without touching nvim."""
+        nvim = FakeLuaNvim()
+        server = NvimcpServer(nvim)
+        result = await server.call_tool("exec_lua", {"calls": [{"args": []}]})
+        assert result[0].text.startswith("Error executing Lua: every call")
+        result = await server.call_tool("exec_lua", {"args": [1]})
+        assert result[0].text == "Error executing Lua: pass code or handle"
+        assert nvim.requests == []
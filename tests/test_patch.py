@@ -0,0 +1,133 @@
+"""Tests for unified diff parsing and the apply_patch tool."""
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.patch import PatchError, parse_unified_diff, patches_to_lua
+
+MULTI_FILE_DIFF = """\
+diff --git a/src/a.py b/src/a.py
+--- a/src/a.py\t2024-01-01 00:00:00
++++ b/src/a.py\t2024-01-01 00:00:00
+@@ -1,3 +1,3 @@
+ one
+-two
++TWO
+ three
+@@ -10 +10,2 @@
+ ten
++ten and a half
+--- /dev/null
++++ b/new.txt
+@@ -0,0 +1,2 @@
++hello
++world
+"""
+
+
+class TestParseUnifiedDiff:
+    """Test unified diff parsing."""
+
+    def test_multi_file(self):
+        """Test parsing a diff touching several files."""
+        patches = parse_unified_diff(MULTI_FILE_DIFF)
+
+        assert [p.path for p in patches] == ["src/a.py", "new.txt"]
+        first, second = patches[0].hunks
+        assert first.old_start == 1
+        assert first.old_lines == ["one", "two", "three"]
+        assert first.new_lines == ["one", "TWO", "three"]
+        assert second.old_lines == ["ten"]
+        assert second.new_lines == ["ten", "ten and a half"]
+        assert patches[1].is_new_file
+        assert patches[1].hunks[0].old_lines == []
+
+    def test_strip_zero(self):
+        """Test keeping the a/ and b/ prefixes."""
+        patches = parse_unified_diff(MULTI_FILE_DIFF, strip=0)
+        assert patches[0].path == "b/src/a.py"
+
+    def test_no_newline_marker(self):
+        """Test that '\\ No newline' markers are ignored."""
+        diff = "--- a/x\n+++ b/x\n@@ -1 +1 @@\n-a\n\\ No newline at end of file\n+b\n"
+        hunk = parse_unified_diff(diff)[0].hunks[0]
+        assert hunk.old_lines == ["a"]
+        assert hunk.new_lines == ["b"]
+
+    def test_control_characters_in_lines(self):
+        """Test that only newlines split lines, with one CR stripped each."""
+        diff = (
+            "--- a/x\r\n+++ b/x\r\n@@ -1,2 +1,2 @@\r\n"
+            " \fpage\r\n-a\u2028b\r\r\n+c\x1cd\r\n"
+        )
+        hunk = parse_unified_diff(diff)[0].hunks[0]
+        assert hunk.old_lines == ["\fpage", "a\u2028b\r"]
+        assert hunk.new_lines == ["\fpage", "c\x1cd"]
+
+    def test_deletion(self):
+        """Test that deleted files keep their old path."""
+        diff = "--- a/x\n+++ /dev/null\n@@ -1 +0,0 @@\n-a\n"
+        patch = parse_unified_diff(diff)[0]
+        assert patch.is_deletion
+        assert patch.path == "x"
+
+    def test_truncated_hunk(self):
+        """Test that hunks shorter than their header are rejected."""
+        with pytest.raises(PatchError):
+            parse_unified_diff("--- a/x\n+++ b/x\n@@ -1,3 +1,3 @@\n a\n")
+
+    def test_not_a_diff(self):
+        """Test that text without file headers is rejected."""
+        with pytest.raises(PatchError):
+            parse_unified_diff("hello")
+
+
+class TestApplyPatchTool:
+    """Test the apply_patch tool."""
+
+    @pytest.fixture
+    def mock_nvim(self):
+        """Create a mock nvim instance."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = [
+            {
+                "path": "src/a.py",
+                "bufnr": 3,
+                "hunks": [
+                    {"index": 1, "status": "applied", "line": 4, "offset": 3},
+                    {"index": 2, "status": "failed", "message": "context not found"},
+                ],
+            },
+            {
+                "path": "new.txt",
+                "bufnr": 4,
+                "hunks": [{"index": 1, "status": "applied", "line": 1, "offset": 0}],
+            },
+        ]
+        return nvim
+
+    @pytest.mark.asyncio
+    async def test_single_nvim_call(self, mock_nvim):
+        """Test that all files are patched in one Lua call."""
+        server = NvimcpServer(mock_nvim)
+
+        result = await server._apply_patch(MULTI_FILE_DIFF)
+
+        mock_nvim.exec_lua.assert_called_once()
+        args = mock_nvim.exec_lua.call_args[0]
+        assert args[1] == patches_to_lua(parse_unified_diff(MULTI_FILE_DIFF))
+        assert args[2:] == (-1, False)
+        text = result[0].text
+        assert "hunk 1: applied at line 4 (offset +3)" in text
+        assert "hunk 2: failed: context not found" in text
+        assert "new.txt (buffer 4)" in text
+
+    @pytest.mark.asyncio
+    async def test_parse_error(self, mock_nvim):
+        """Test that malformed diffs never reach nvim."""
+        server = NvimcpServer(mock_nvim)
+
+        result = await server._apply_patch("not a diff")
+
+        mock_nvim.exec_lua.assert_not_called()
+        assert "Error applying patch" in result[0].text
@@ -0,0 +1,127 @@
+"""Tests for the profile tool."""
+
+import pytest
+import threading
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.profiler import Profiler, hot_spots, parse_vim_profile
+from tests.test_recorder import FakeNvim
+
+VIM_PROFILE_LOG = """SCRIPT  /tmp/a.vim
+Sourced 1 time
+Total time:   0.002000
+ Self time:   0.001000
+
+SCRIPT  /tmp/b.vim
+Sourced 1 time
+Total time:   0.010000
+ Self time:   0.010000
+
+FUNCTIONS SORTED ON TOTAL TIME
+count  total (s)   self (s)  function
+    3   0.004000   0.003000  Slow()
+    1              0.000100  <SNR>12_Helper()
+
+FUNCTIONS SORTED ON SELF TIME
+count  total (s)   self (s)  function
+    3   0.004000   0.003000  Slow()
+"""
+
+
+def busy_work():
+    return sum(i * i for i in range(20000))
+
+
+class TestProfiler:
+    """Test the Python side profiler."""
+
+    def test_parse_vim_profile(self):
+        """Test extracting functions and scripts from a :profile log."""
+        parsed = parse_vim_profile(VIM_PROFILE_LOG)
+        assert parsed["functions"] == [(3, 0.004, 0.003, "Slow()")]
+        assert parsed["scripts"] == [(0.01, "/tmp/b.vim"), (0.002, "/tmp/a.vim")]
+
+    def test_merges_thread_profiles(self):
+        """Test that work run on other threads shows up in the merged stats."""
+        profiler = Profiler()
+        profiler.start()
+        thread = threading.Thread(target=profiler.run, args=(busy_work,))
+        thread.start()
+        thread.join()
+        stats = profiler.stop()
+        names = [row[3] for row in hot_spots(stats, "cumtime", limit=50)]
+        assert any("busy_work" in name for name in names)
+        with pytest.raises(RuntimeError):
+            profiler.stop()
+
+    def test_measure(self):
+        """Test per-tool totals are only kept while profiling."""
+        profiler = Profiler()
+        with profiler.measure("idle"):
+            pass
+        profiler.start()
+        with profiler.measure("edit_buffer"):
+            pass
+        assert profiler.tool_totals()["edit_buffer"][0] == 1
+        assert "idle" not in profiler.tool_totals()
+        profiler.stop()
+
+
+class TestProfileTool:
+    """Test the profile tool."""
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        """Test that the tool is unavailable unless enabled."""
+        server = NvimcpServer(FakeNvim())
+        result = await server.call_tool("profile", {"action": "start"})
+        assert result[0].text == "Unknown tool: profile"
+        assert not server.profiler.active
+
+    @pytest.mark.asyncio
+    async def test_python_only(self):
+        """Test profiling tool calls without nvim-side profiling."""
+        server = NvimcpServer(FakeNvim(), enable_profile=True)
+        start = await server.call_tool("profile", {"action": "start", "nvim": False})
+        assert start[0].text == "Profiling started"
+        await server.call_tool("run_command", {"command": "echo 1"})
+        status = await server.call_tool("profile", {})
+        assert status[0].text.startswith("Profiling for")
+
+        result = await server.call_tool("profile", {"action": "stop", "limit": 5})
+        text = result[0].text
+        assert "run_command: 1," in text
+        assert "Python hot spots" in text
+        again = await server.call_tool("profile", {"action": "stop"})
+        assert again[0].text == "Error profiling: Profiling is not running"
+
+    @pytest.mark.asyncio
+    async def test_nvim_lua_timing(self):
+        """Test that Lua chunks are timed per tool while nvim profiling runs."""
+        nvim = Mock()
+        calls = []
+
+        def exec_lua(code, *args):
+            calls.append(args)
+            if args[0] == "start":
+                return False
+            if args[0] == "stop":
+                return {"timings": [["get_context", 1, 2_000_000]]}
+            return {"cursor": None, "windows": []}
+
+        nvim.exec_lua.side_effect = exec_lua
+        server = NvimcpServer(nvim, enable_profile=True)
+        start = await server.call_tool("profile", {"action": "start"})
+        assert "LuaJIT profiler unavailable" in start[0].text
+
+        await server._run_sync(server._lua, "return 1", "a")
+        assert calls[-1][0] == "(none)"
+        assert calls[-1][1:] == ("return 1", ["a"])
+
+        result = await server.call_tool("profile", {"action": "stop"})
+        assert calls[-1] == ("stop",)
+        assert "Profiled" in result[0].text
+        assert server._nvim_profile is None
+
+        await server._run_sync(server._lua, "return 1", "a")
+        assert calls[-1] == ("a",)
@@ -0,0 +1,86 @@
+"""Tests for quickfix and location list tools."""
+
+import json
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.quickfix import GET_QF_LUA, SET_QF_LUA, action_flag, build_items
+
+
+@pytest.fixture
+def mock_nvim():
+    return Mock()
+
+
+class TestHelpers:
+    """Test argument preparation."""
+
+    def test_build_items(self):
+        """Test that unset fields are dropped and a location is required."""
+        items = build_items([{"filename": "a.c", "lnum": 3, "type": None}])
+        assert items == [{"filename": "a.c", "lnum": 3}]
+        with pytest.raises(ValueError, match="filename or bufnr"):
+            build_items([{"lnum": 1}])
+
+    def test_action_flag(self):
+        assert action_flag("append") == "a"
+        assert action_flag("new") == " "
+        with pytest.raises(ValueError):
+            action_flag("merge")
+
+
+class TestQuickfixTools:
+    """Test the quickfix tools."""
+
+    @pytest.mark.asyncio
+    async def test_get_quickfix(self, mock_nvim):
+        """Test paging arguments and structured output."""
+        page = {
+            "id": 3,
+            "changedtick": 7,
+            "size": 500,
+            "items": [{"filename": "a.c", "lnum": 1, "col": 2, "text": "x"}],
+            "next_offset": 101,
+        }
+        mock_nvim.exec_lua.return_value = page
+        server = NvimcpServer(mock_nvim)
+
+        result = await server.call_tool(
+            "get_quickfix", {"offset": 100, "limit": 1, "since_changedtick": 6}
+        )
+
+        mock_nvim.exec_lua.assert_called_once_with(GET_QF_LUA, None, None, 6, 100, 1)
+        assert json.loads(result[0].text) == page
+
+    @pytest.mark.asyncio
+    async def test_get_quickfix_rejects_negative_offset(self, mock_nvim):
+        """Test that paging arguments are validated before nvim is called."""
+        server = NvimcpServer(mock_nvim)
+        result = await server.call_tool("get_quickfix", {"offset": -1})
+        assert result[0].text.startswith("Error: invalid arguments")
+        mock_nvim.exec_lua.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_set_location_list(self, mock_nvim):
+        """Test appending to a window's location list."""
+        mock_nvim.exec_lua.return_value = {"id": 2, "changedtick": 4, "size": 1}
+        server = NvimcpServer(mock_nvim)
+
+        result = await server.call_tool(
+            "set_quickfix",
+            {
+                "items": [{"filename": "b.c", "lnum": 9, "valid": False}],
+                "action": "append",
+                "window": 0,
+            },
+        )
+
+        mock_nvim.exec_lua.assert_called_once_with(
+            SET_QF_LUA,
+            0,
+            None,
+            "a",
+            [{"filename": "b.c", "lnum": 9, "valid": False}],
+            None,
+        )
+        assert json.loads(result[0].text)["size"] == 1
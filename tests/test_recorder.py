@@ -0,0 +1,143 @@
+"""Tests for RPC hooks, session recording and replay."""
+
+import pytest
+from unittest.mock import Mock
+from mcp.types import TextContent
+from nvimcp.core import NvimcpServer
+from nvimcp.recorder import SessionRecorder, read_trace
+from nvimcp.replay import ReplayResult, load_calls, replay, summarize
+from nvimcp.rpc import RpcHooks
+
+
+class FakeSession:
+    """Stands in for a pynvim msgpack-rpc session."""
+
+    def __init__(self):
+        self.sent = []
+
+    def request(self, method, *args):
+        self.sent.append(method)
+        if method == "fail":
+            raise RuntimeError("boom")
+        return f"{method} done"
+
+
+class FakeNvim:
+    """Minimal pynvim.Nvim whose API calls go through its session."""
+
+    def __init__(self):
+        self._session = FakeSession()
+
+    def command_output(self, command):
+        return self._session.request("nvim_exec2", command, {"output": True})
+
+
+class TestRpcHooks:
+    """Test observing RPCs."""
+
+    def test_observes_requests(self):
+        """Test that observers see every request, including failures."""
+        nvim = FakeNvim()
+        seen = []
+        hooks = RpcHooks()
+        assert hooks.install(nvim)
+        hooks.add(lambda m, a, start, dur, err: seen.append((m, a, err is None)))
+
+        assert nvim.command_output("echo") == "nvim_exec2 done"
+        with pytest.raises(RuntimeError):
+            nvim._session.request("fail")
+
+        assert seen == [
+            ("nvim_exec2", ("echo", {"output": True}), True),
+            ("fail", (), False),
+        ]
+        hooks.uninstall()
+        nvim.command_output("echo")
+        assert len(seen) == 2
+
+    def test_no_session(self):
+        """Test that objects without a session are left alone."""
+        assert not RpcHooks().install(object())
+
+
+class TestSessionRecorder:
+    """Test trace files."""
+
+    @pytest.mark.parametrize("suffix", [".jsonl", ".msgpack"])
+    def test_round_trip(self, tmp_path, suffix):
+        """Test writing and reading both trace formats."""
+        path = str(tmp_path / f"trace{suffix}")
+        recorder = SessionRecorder(path)
+        recorder.record_call(1, "run_command", {"command": "ls"}, 0.0, 0.5, True, 3)
+        recorder.record_rpc(b"nvim_exec2", ("ls",), 0.1, 0.2, None)
+        recorder.close()
+
+        events = list(read_trace(path))
+        assert [e["t"] for e in events] == ["meta", "call", "rpc"]
+        assert events[1]["args"] == {"command": "ls"}
+        assert events[2]["m"] == "nvim_exec2"
+        assert "args" not in events[2]
+
+    @pytest.mark.asyncio
+    async def test_server_records_calls_and_rpcs(self, tmp_path):
+        """Test that RPCs are attributed to the tool call that made them."""
+        path = str(tmp_path / "trace.jsonl")
+        recorder = SessionRecorder(path)
+        server = NvimcpServer(FakeNvim(), recorder=recorder)
+
+        result = await server.call_tool("run_command", {"command": "echo 1"})
+        await server.call_tool("no_such_tool", {})
+        recorder.close()
+
+        assert result[0].text == "nvim_exec2 done"
+        events = list(read_trace(path))
+        calls = [e for e in events if e["t"] == "call"]
+        rpcs = [e for e in events if e["t"] == "rpc"]
+        assert [(c["id"], c["tool"]) for c in calls] == [
+            (1, "run_command"),
+            (2, "no_such_tool"),
+        ]
+        assert calls[0]["ok"] and calls[0]["out"] == len("nvim_exec2 done")
+        assert [(r["call"], r["m"]) for r in rpcs] == [(1, "nvim_exec2")]
+
+
+class TestReplay:
+    """Test replaying traces."""
+
+    @pytest.mark.asyncio
+    async def test_replay(self, tmp_path):
+        """Test replaying recorded calls in order."""
+        path = str(tmp_path / "trace.jsonl")
+        recorder = SessionRecorder(path)
+        recorder.record_call(2, "get_status", {}, 1.0, 0.004, True, 10)
+        recorder.record_call(1, "run_command", {"command": "x"}, 0.5, 0.002, True, 1)
+        recorder.close()
+
+        server = Mock()
+        called = []
+
+        async def call_tool(name, arguments):
+            called.append((name, arguments))
+            return [TextContent(type="text", text="ok")]
+
+        server.call_tool = call_tool
+        calls = load_calls(path)
+        for speed in (None, 100.0):
+            called.clear()
+            results = await replay(server, calls, speed)
+            assert called == [("run_command", {"command": "x"}), ("get_status", {})]
+            assert [r.tool for r in results] == ["run_command", "get_status"]
+            assert all(r.ok for r in results)
+
+    def test_summarize(self):
+        """Test per-tool latency deltas."""
+        summary = summarize(
+            [
+                ReplayResult("edit_buffer", 0.010, 0.015, True),
+                ReplayResult("edit_buffer", 0.010, 0.015, False),
+            ]
+        )
+        s = summary["edit_buffer"]
+        assert s["count"] == 2 and s["failed"] == 1
+        assert s["recorded_p50"] == pytest.approx(10.0)
+        assert s["delta"] == pytest.approx(0.5)
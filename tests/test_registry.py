@@ -0,0 +1,143 @@
+"""Tests for the tool registry and argument validation."""
+
+import pytest
+from unittest.mock import Mock
+from mcp.types import TextContent
+from nvimcp import registry as registry_module
+from nvimcp.core import NvimcpServer
+from nvimcp.registry import (
+    ToolArgumentError,
+    ToolRegistry,
+    ToolSpec,
+    compile_schema,
+)
+
+
+async def echo(text: str, times: int = 1):
+    return [TextContent(type="text", text=text * times)]
+
+
+def echo_plugin(server):
+    return [
+        ToolSpec(
+            name="echo",
+            description="Repeat text",
+            handler=echo,
+            input_schema={
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "times": {"type": "integer", "minimum": 1},
+                },
+                "required": ["text"],
+            },
+            read_only=True,
+        )
+    ]
+
+
+class TestCompileSchema:
+    """Test compiled validators."""
+
+    SCHEMA = {
+        "type": "object",
+        "properties": {
+            "name": {"type": "string"},
+            "count": {"type": "integer", "minimum": 0},
+            "mode": {"type": "string", "enum": ["a", "b"]},
+            "ids": {"type": "array", "items": {"type": "integer"}},
+            "flag": {"type": "boolean"},
+        },
+        "required": ["name"],
+    }
+
+    def test_valid(self):
+        """Test that valid arguments pass, with integral floats coerced."""
+        check = compile_schema(self.SCHEMA, closed=True)
+        args = {"name": "x", "count": 2.0, "mode": "a", "ids": [1, 2], "flag": False}
+        assert check(args, "arguments") == dict(args, count=2)
+
+    @pytest.mark.parametrize(
+        "args, message",
+        [
+            ({}, "missing required argument: name"),
+            ({"name": 1}, "name must be string, got int"),
+            ({"name": "x", "count": True}, "count must be integer, got bool"),
+            ({"name": "x", "count": -1}, "count must be >= 0"),
+            ({"name": "x", "mode": "c"}, "mode must be one of 'a', 'b'"),
+            ({"name": "x", "ids": [1, "2"]}, r"ids\[1\] must be integer"),
+            ({"name": "x", "bogus": 1}, "unexpected argument: bogus"),
+        ],
+    )
+    def test_invalid(self, args, message):
+        """Test error messages for invalid arguments."""
+        check = compile_schema(self.SCHEMA, closed=True)
+        with pytest.raises(ToolArgumentError, match=message):
+            check(args, "arguments")
+
+    def test_open_objects(self):
+        """Test that nested objects allow extra keys unless closed."""
+        check = compile_schema({"type": "object", "properties": {}})
+        assert check({"x": 1}, "arguments") == {"x": 1}
+
+
+class TestToolRegistry:
+    """Test registration and the cached tool list."""
+
+    def test_tool_list_cached(self):
+        """Test that the tool list is rebuilt only after changes."""
+        registry = ToolRegistry()
+        registry.load_plugin(echo_plugin, server=None)
+        tools = registry.tools()
+        assert registry.tools() is tools
+        assert tools[0].name == "echo" and registry.read_only("echo")
+
+        registry.unregister("echo")
+        assert registry.tools() == []
+        assert not registry.read_only("echo")
+
+    def test_duplicate(self):
+        """Test that names cannot be registered twice by accident."""
+        registry = ToolRegistry()
+        registry.load_plugin(echo_plugin, server=None)
+        with pytest.raises(ValueError, match="already registered"):
+            registry.load_plugin(echo_plugin, server=None)
+
+    def test_entry_points(self, monkeypatch):
+        """Test loading plugins from entry points, skipping broken ones."""
+        good, bad = Mock(), Mock()
+        good.load.return_value = echo_plugin
+        bad.load.side_effect = ImportError("nope")
+        monkeypatch.setattr(registry_module, "entry_points", lambda group: [bad, good])
+        registry = ToolRegistry()
+        assert registry.load_entry_points(server=None) == 1
+        assert "echo" in registry
+
+
+class TestServerRegistry:
+    """Test dispatch through the registry."""
+
+    @pytest.mark.asyncio
+    async def test_invalid_arguments_skip_nvim(self):
+        """Test that bad arguments are rejected before any nvim work."""
+        nvim = Mock()
+        server = NvimcpServer(nvim)
+        result = await server.call_tool("edit_buffer", {"content": 5})
+        assert result[0].text == (
+            "Error: invalid arguments for edit_buffer: content must be string, got int"
+        )
+        assert nvim.mock_calls == []
+
+    @pytest.mark.asyncio
+    async def test_plugin_tool(self):
+        """Test that plugin tools are listed and callable."""
+        server = NvimcpServer(Mock())
+        server.registry.load_plugin(echo_plugin, server)
+        assert "echo" in [t.name for t in server.registry.tools()]
+        result = await server.call_tool("echo", {"text": "ab", "times": 2})
+        assert result[0].text == "abab"
+
+    def test_profile_tool_listed_only_when_enabled(self):
+        """Test that optional tools are registered on demand."""
+        assert "profile" not in NvimcpServer(Mock()).registry
+        assert "profile" in NvimcpServer(Mock(), enable_profile=True).registry
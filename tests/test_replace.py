@@ -0,0 +1,108 @@
+"""Tests for the replace tool."""
+
+import shutil
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.replace import REPLACE_LUA, build_targets, format_replace_results
+
+
+class TestReplaceTool:
+    """Test in-nvim find/replace."""
+
+    @pytest.fixture
+    def mock_nvim(self):
+        """Create a mock nvim instance."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = [
+            {
+                "bufnr": 1,
+                "name": "/repo/a.py",
+                "matches": 3,
+                "lines": 2,
+                "preview": [{"line": 4, "old": "foo(foo)", "new": "bar(bar)"}],
+            },
+            {"bufnr": 2, "name": "", "matches": 0, "lines": 0, "preview": {}},
+        ]
+        return nvim
+
+    @pytest.fixture
+    def server(self, mock_nvim):
+        """Create nvimcp server with mock nvim."""
+        return NvimcpServer(mock_nvim)
+
+    @pytest.mark.asyncio
+    async def test_dry_run(self, server, mock_nvim):
+        """Test that a dry run reports counts and previews."""
+        result = await server._replace("foo", "bar", buffer_ids=[1, 2], dry_run=True)
+
+        mock_nvim.exec_lua.assert_called_once()
+        args = mock_nvim.exec_lua.call_args[0]
+        assert args[1] == build_targets([1, 2])
+        assert args[2:] == ("foo", "bar", "vim", True, 20)
+        text = result[0].text
+        assert "/repo/a.py (buffer 1): would replace 3 matches on 2 lines" in text
+        assert "  4: foo(foo)" in text
+        assert "  4> bar(bar)" in text
+        assert "[No Name] (buffer 2)" in text
+        assert "total: 3 matches in 2 buffers" in text
+
+    @pytest.mark.asyncio
+    async def test_files_and_arglist(self, server, mock_nvim):
+        """Test targeting files and the argument list."""
+        await server._replace(
+            "%d+", "N", files=["x.txt"], use_arglist=True, engine="lua"
+        )
+
+        args = mock_nvim.exec_lua.call_args[0]
+        assert args[1] == {"buffers": [], "files": ["x.txt"], "arglist": True}
+        assert args[4] == "lua"
+
+    @pytest.mark.asyncio
+    async def test_invalid_engine(self, server, mock_nvim):
+        """Test that unknown engines are rejected before any RPC."""
+        result = await server._replace("a", "b", engine="pcre")
+
+        mock_nvim.exec_lua.assert_not_called()
+        assert "Error replacing" in result[0].text
+
+    def test_format_error(self):
+        """Test reporting per-buffer errors."""
+        text = format_replace_results(
+            [{"bufnr": 5, "name": "x", "error": "buffer is not modifiable"}], False
+        )
+        assert "x (buffer 5): error: buffer is not modifiable" in text
+
+
+@pytest.mark.skipif(shutil.which("nvim") is None, reason="nvim not installed")
+class TestReplaceRealNvim:
+    """Test REPLACE_LUA semantics against a real embedded nvim."""
+
+    @pytest.fixture
+    def nvim(self):
+        from nvimcp.connection import LEAN_NVIM_ARGS, connect_neovim
+
+        nvim = connect_neovim(mode="embedded", nvim_args=LEAN_NVIM_ARGS)
+        yield nvim
+        nvim.close()
+
+    def test_anchored_count_matches_replace(self, nvim, tmp_path):
+        """Test that ^ counts once per line, as substitute() replaces it."""
+        path = tmp_path / "a.txt"
+        path.write_text("foofoo\n")
+        targets = build_targets(files=[str(path)])
+        (dry,) = nvim.exec_lua(REPLACE_LUA, targets, "^foo", "x", "vim", True, 5)
+        (real,) = nvim.exec_lua(REPLACE_LUA, targets, "^foo", "x", "vim", False, 5)
+        assert dry["matches"] == real["matches"] == 1
+        assert nvim.buffers[real["bufnr"]][:] == ["xfoo"]
+
+    def test_dry_run_leaves_no_buffers(self, nvim, tmp_path):
+        """Test that a preview does not add buffers to the session."""
+        path = tmp_path / "b.txt"
+        path.write_text("foo\n")
+        before = nvim.exec_lua("return #vim.api.nvim_list_bufs()")
+        nvim.exec_lua(
+            REPLACE_LUA, build_targets(files=[str(path)]), "foo", "x", "vim", True, 5
+        )
+        assert nvim.exec_lua("return #vim.api.nvim_list_bufs()") == before
@@ -0,0 +1,170 @@
+"""Tests for saving buffers in batches."""
+
+import os
+
+import pytest
+from unittest.mock import Mock
+
+from nvimcp.core import NvimcpServer
+from nvimcp.save import (
+    MARK_SAVED_LUA,
+    SAVE_LUA,
+    encode_lines,
+    format_save_results,
+    write_file,
+    write_files,
+)
+
+
+class TestEncode:
+    """Test that direct writes match what nvim would write."""
+
+    def test_fileformats(self):
+        """Test line separators and the final end of line."""
+        assert encode_lines(["a", "b"]) == b"a\nb\n"
+        assert encode_lines(["a", "b"], "dos") == b"a\r\nb\r\n"
+        assert encode_lines(["a", "b"], "mac", eol=False) == b"a\rb"
+
+    def test_empty_and_bomb(self):
+        """Test that an empty buffer writes an empty file, BOM aside."""
+        assert encode_lines([]) == b""
+        assert encode_lines(["é"], bomb=True) == b"\xef\xbb\xbf\xc3\xa9\n"
+
+    def test_undecodable_bytes(self):
+        """Test that bytes pynvim could not decode are written back unchanged."""
+        line = b"\xff\xfe".decode("utf-8", "surrogateescape")
+        assert encode_lines([line]) == b"\xff\xfe\n"
+
+
+class TestWriteFiles:
+    """Test parallel file writes."""
+
+    def test_writes_and_errors(self, tmp_path):
+        """Test that each job reports its own failure."""
+        ok = tmp_path / "ok.txt"
+        ok.write_bytes(b"old contents\n")
+        missing = tmp_path / "no" / "such.txt"
+        errors = write_files([(str(ok), b"new\n"), (str(missing), b"x")], fsync=True)
+        assert errors[0] is None and errors[1]
+        assert ok.read_bytes() == b"new\n"
+        assert write_files([]) == []
+
+    def test_replace_keeps_mode_and_links(self, tmp_path):
+        """Test that the file is replaced through symlinks with its mode kept."""
+        target = tmp_path / "target.sh"
+        target.write_bytes(b"old\n")
+        target.chmod(0o751)
+        link = tmp_path / "link.sh"
+        link.symlink_to(target)
+        write_file(str(link), b"new\n")
+        assert link.is_symlink() and target.read_bytes() == b"new\n"
+        assert target.stat().st_mode & 0o777 == 0o751
+        assert sorted(os.listdir(tmp_path)) == ["link.sh", "target.sh"]
+
+    def test_failed_write_keeps_old_file(self, tmp_path, monkeypatch):
+        """Test that an error before the rename leaves the old contents."""
+        target = tmp_path / "f.txt"
+        target.write_bytes(b"old\n")
+
+        def fail(fd):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(os, "fsync", fail)
+        assert "No space left" in write_files([(str(target), b"new\n")])[0]
+        assert target.read_bytes() == b"old\n"
+        assert os.listdir(tmp_path) == ["f.txt"]
+
+
+class FakeSave:
+    """exec_lua stand-in for SAVE_LUA and MARK_SAVED_LUA."""
+
+    def __init__(self, results, marked):
+        self.results = results
+        self.marked = marked
+        self.calls = []
+
+    def __call__(self, code, *args):
+        self.calls.append((code, args))
+        if code == SAVE_LUA:
+            return self.results
+        if code == MARK_SAVED_LUA:
+            return self.marked
+        raise AssertionError("unexpected Lua chunk")
+
+
+class TestSaveTool:
+    """Test the save_buffers tool."""
+
+    @pytest.mark.asyncio
+    async def test_direct_and_nvim_writes(self, tmp_path):
+        """Test that large buffers are written by the server and then marked saved."""
+        big, busy = tmp_path / "big.txt", tmp_path / "busy.txt"
+        lua = FakeSave(
+            [
+                {"buf": 1, "name": str(tmp_path / "small.txt"), "written": True},
+                {
+                    "buf": 2,
+                    "name": str(big),
+                    "direct": True,
+                    "tick": 5,
+                    "lines": ["a", "b"],
+                    "fileformat": "dos",
+                    "eol": True,
+                    "bomb": False,
+                },
+                {
+                    "buf": 3,
+                    "name": str(busy),
+                    "direct": True,
+                    "tick": 9,
+                    "lines": ["c"],
+                    "fileformat": "unix",
+                    "eol": True,
+                    "bomb": False,
+                },
+                {"buf": 4, "error": "no file name"},
+            ],
+            [True, False],
+        )
+        nvim = Mock()
+        nvim.exec_lua.side_effect = lua
+        server = NvimcpServer(nvim)
+        result = await server.call_tool(
+            "save_buffers", {"autocmds": False, "direct_min_bytes": 0, "fsync": False}
+        )
+        text = result[0].text
+        assert lua.calls[0][1] == (None, False, 0, False)
+        assert lua.calls[1][1] == ([[2, 5], [3, 9]],)
+        assert big.read_bytes() == b"a\r\nb\r\n" and busy.read_bytes() == b"c\n"
+        assert text.startswith("Saved 3 of 4 buffers (2 written directly)")
+        assert "buffer 3 (" in text and "left modified" in text
+        assert "buffer 4: no file name" in text
+
+    @pytest.mark.asyncio
+    async def test_failed_direct_write_not_marked(self, tmp_path):
+        """Test that a buffer whose file could not be written stays modified."""
+        lua = FakeSave(
+            [
+                {
+                    "buf": 2,
+                    "name": str(tmp_path / "missing" / "f.txt"),
+                    "direct": True,
+                    "tick": 1,
+                    "lines": ["a"],
+                    "fileformat": "unix",
+                    "eol": True,
+                    "bomb": False,
+                }
+            ],
+            [],
+        )
+        nvim = Mock()
+        nvim.exec_lua.side_effect = lua
+        server = NvimcpServer(nvim)
+        result = await server.call_tool("save_buffers", {"buffer_ids": [2]})
+        assert [code for code, _ in lua.calls] == [SAVE_LUA]
+        assert result[0].text.startswith("Saved 0 of 1 buffers")
+        assert "No such file" in result[0].text
+
+    def test_format_nothing_to_save(self):
+        assert format_save_results([]) == "Saved 0 of 0 buffers"
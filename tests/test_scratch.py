@@ -0,0 +1,120 @@
+"""Tests for scratch buffer loading and the open_files tool."""
+
+import shutil
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.scratch import ScratchPool, format_files
+
+
+class TestScratchPool:
+    """Test LRU bookkeeping of scratch buffers."""
+
+    def test_touch_orders_by_recency(self):
+        """Test that touching moves a buffer to the most recent end."""
+        pool = ScratchPool(3)
+        pool.touch(1, "a")
+        pool.touch(2, "b")
+        pool.touch(1, "a")
+        assert pool.lru_order() == [2, 1]
+
+    def test_update(self):
+        """Test applying evictions, adoptions and new loads."""
+        pool = ScratchPool(2)
+        for bufnr in (1, 2, 3):
+            pool.touch(bufnr, str(bufnr))
+
+        pool.update(
+            {
+                "files": [
+                    {"path": "x", "bufnr": 7, "name": "/x", "scratch": True},
+                    {"path": "y", "bufnr": 8, "name": "/y", "scratch": False},
+                ],
+                "evicted": [1],
+                "adopted": [2],
+            }
+        )
+
+        assert pool.lru_order() == [3, 7]
+        assert 8 not in pool
+
+
+class TestOpenFilesTool:
+    """Test the open_files tool."""
+
+    @pytest.fixture
+    def mock_nvim(self):
+        """Create a mock nvim instance."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = {
+            "files": [
+                {
+                    "path": "a.txt",
+                    "bufnr": 4,
+                    "name": "/w/a.txt",
+                    "scratch": True,
+                    "line_count": 3,
+                    "lines": ["one", "two"],
+                },
+                {"path": "missing.txt", "error": "file not readable"},
+            ],
+            "evicted": [],
+            "adopted": [],
+        }
+        return nvim
+
+    @pytest.mark.asyncio
+    async def test_open_files(self, mock_nvim):
+        """Test loading files in one call and tracking scratch buffers."""
+        server = NvimcpServer(mock_nvim, scratch_buffers=8)
+        server.scratch.touch(2, "/w/old.txt")
+
+        result = await server._open_files(["a.txt", "missing.txt"], max_lines=2)
+
+        mock_nvim.exec_lua.assert_called_once()
+        args = mock_nvim.exec_lua.call_args[0]
+        assert args[1:] == (["a.txt", "missing.txt"], 2, True, [2], 8)
+        assert server.scratch.lru_order() == [2, 4]
+        text = result[0].text
+        assert "==> a.txt <== buffer 4, 3 lines\none\ntwo\n... (1 more lines)" in text
+        assert "==> missing.txt <== error: file not readable" in text
+
+    def test_format_without_content(self):
+        """Test that preloading only reports buffers."""
+        text = format_files(
+            {"files": [{"path": "a", "bufnr": 1, "line_count": 9}]}, False
+        )
+        assert text == "==> a <== buffer 1, 9 lines"
+
+
+@pytest.mark.skipif(shutil.which("nvim") is None, reason="nvim not installed")
+class TestOpenFilesRealNvim:
+    """Test scratch buffer handling against a real embedded nvim."""
+
+    @pytest.fixture
+    def nvim(self):
+        from nvimcp.connection import LEAN_NVIM_ARGS, connect_neovim
+
+        nvim = connect_neovim(mode="embedded", nvim_args=LEAN_NVIM_ARGS)
+        yield nvim
+        nvim.close()
+
+    @pytest.mark.asyncio
+    async def test_badd_buffer_survives_eviction(self, nvim, tmp_path):
+        """Test that a :badd'd file is read but never taken over or wiped."""
+        kept, others = tmp_path / "kept.txt", [tmp_path / "a.txt", tmp_path / "b.txt"]
+        for path in [kept] + others:
+            path.write_text(f"{path.name}\n")
+        nvim.command(f"badd {kept}")
+        bufnr = nvim.funcs.bufnr(str(kept))
+        server = NvimcpServer(nvim, scratch_buffers=1)
+
+        result = await server._open_files([str(kept)])
+        assert "kept.txt" in result[0].text and bufnr not in server.scratch
+        for path in others:
+            await server._open_files([str(path)])
+
+        assert nvim.funcs.bufexists(bufnr) and nvim.funcs.buflisted(bufnr)
+        assert not nvim.api.buf_is_loaded(nvim.buffers[bufnr])
+        assert len(server.scratch) == 1
@@ -0,0 +1,205 @@
+"""Tests for the trigram index and the search tool."""
+
+import os
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.index import FileIndex
+from nvimcp.search import (
+    SEARCH_LUA,
+    SYNC_BUFFERS_LUA,
+    TrigramIndex,
+    WorkspaceSearch,
+    required_trigrams,
+    trigrams,
+    vim_pattern,
+)
+
+
+class TestTrigrams:
+    """Test trigram extraction."""
+
+    def test_trigrams_are_per_line_and_lowercased(self):
+        """Test that trigrams never span lines."""
+        assert trigrams("AbCd\nxy") == {"abc", "bcd"}
+
+    def test_required_trigrams(self):
+        """Test conservative literal extraction from Vim regexes."""
+        assert required_trigrams("foobar") == trigrams("foobar")
+        assert required_trigrams("foo\\(bar\\)*baz") == {"foo", "baz"}
+        assert required_trigrams("ab[xyz]cdef") == {"cde", "def"}
+        assert required_trigrams("fooo*bar") == {"foo", "bar"}
+        assert required_trigrams("a\\.bcd") == {"a.b", ".bc", "bcd"}
+        assert required_trigrams("foo\\|bar") == set()
+        assert required_trigrams("\\vfoo+") == set()
+        assert required_trigrams("a.b*c", literal=True) == {"a.b", ".b*", "b*c"}
+        assert required_trigrams("\\(foo\\)\\@<=bar") == set()
+        assert required_trigrams("x\\@<!yz1") == set()
+        assert required_trigrams("\\%23lfoo") == set()
+        assert required_trigrams("\\%d123") == set()
+        assert required_trigrams("foo\\@!") == set()
+        assert required_trigrams("\\%(foo\\)bar") == {"bar"}
+        assert required_trigrams("foo\\zsbar") == {"foo", "bar"}
+        assert required_trigrams("foo\\_sbar") == {"foo", "bar"}
+        assert required_trigrams("foo\\_[abc]*bar") == {"foo", "bar"}
+        assert required_trigrams("foo\\_.bar") == {"foo", "bar"}
+
+    def test_vim_pattern(self):
+        """Test building the confirmation regex."""
+        assert vim_pattern("a\\b", literal=True, ignore_case=False) == "\\C\\Va\\\\b"
+        assert vim_pattern("x.*", literal=False, ignore_case=True) == "\\cx.*"
+
+
+class TestTrigramIndex:
+    """Test index bookkeeping."""
+
+    def test_candidates(self):
+        """Test narrowing by required trigrams."""
+        index = TrigramIndex()
+        index.add("buf:1", "def handle_call_tool():", (1,))
+        index.add("buf:2", "unrelated", (1,))
+        index.add("file:big.bin", None, (0, 0))
+
+        assert index.candidates(trigrams("call_tool"), "buf:") == ["buf:1"]
+        assert sorted(index.candidates(trigrams("call_tool"))) == [
+            "buf:1",
+            "file:big.bin",
+        ]
+        assert sorted(index.candidates([], "buf:")) == ["buf:1", "buf:2"]
+
+    def test_reindex_replaces_postings(self):
+        """Test that re-adding a document drops its old trigrams."""
+        index = TrigramIndex()
+        index.add("buf:1", "alpha", (1,))
+        index.add("buf:1", "omega", (2,))
+
+        assert index.candidates(trigrams("alpha")) == []
+        assert index.candidates(trigrams("omega")) == ["buf:1"]
+        assert index.stamp("buf:1") == (2,)
+        assert index.postings_count == 3
+
+    def test_memory_bound(self):
+        """Test that evicted documents stay candidates."""
+        index = TrigramIndex(max_postings=5)
+        index.add("buf:1", "abcdef", (1,))
+        index.add("buf:2", "uvwxyz", (1,))
+
+        assert index.postings_count <= 5
+        assert index.candidates(trigrams("abcdef")) == ["buf:1"]
+        assert index.candidates(trigrams("nothing")) == ["buf:1"]
+
+    def test_invalidate(self):
+        """Test that invalidated documents match every query."""
+        index = TrigramIndex()
+        index.add("file:a", "abcdef", (1, 6))
+        index.invalidate("file:a")
+
+        assert index.candidates(trigrams("zzzz")) == ["file:a"]
+        assert index.stamp("file:a") == ()
+
+    def test_save_and_load(self, tmp_path):
+        """Test persisting file documents only."""
+        path = str(tmp_path / "cache" / "index.pickle")
+        index = TrigramIndex()
+        index.add("file:a.py", "import os", (1, 9))
+        index.add("buf:3", "import os", (4,))
+        index.save(path)
+
+        warm = TrigramIndex()
+        assert warm.load(path) == 1
+        assert warm.candidates(trigrams("import")) == ["file:a.py"]
+        assert warm.stamp("file:a.py") == (1, 9)
+        assert TrigramIndex().load(str(tmp_path / "missing")) == 0
+
+
+class TestWorkspaceSearch:
+    """Test indexing workspace files."""
+
+    def test_index_and_warm_start(self, tmp_path):
+        """Test that workspace files are indexed and persisted."""
+        root = tmp_path / "ws"
+        root.mkdir()
+        (root / "a.txt").write_text("needle in a haystack\n")
+        (root / "b.txt").write_text("just hay\n")
+        (root / "bin.dat").write_bytes(b"\0needle")
+        cache = str(tmp_path / "cache.pickle")
+
+        files = FileIndex(str(root), watch=False)
+        files.start()
+        search = WorkspaceSearch(TrigramIndex(), cache_path=lambda _: cache)
+        search.attach(files)
+        assert search.indexed.wait(timeout=5.0)
+
+        candidates = search.candidates(trigrams("needle"))
+        assert candidates == [str(root / "a.txt"), str(root / "bin.dat")]
+        search.close()
+        assert os.path.exists(cache)
+
+        warm = TrigramIndex()
+        assert warm.load(cache) == 2
+
+
+class TestSearchTool:
+    """Test the search tool."""
+
+    @pytest.fixture
+    def mock_nvim(self):
+        """Create a mock nvim instance with two buffers."""
+        nvim = Mock()
+
+        def exec_lua(code, *args):
+            if code == SYNC_BUFFERS_LUA:
+                known = args[0]
+                items = [
+                    {"bufnr": 1, "tick": 5, "text": "the needle is here"},
+                    {"bufnr": 2, "tick": 7, "text": "only hay"},
+                ]
+                for item in items:
+                    if known.get(item["bufnr"]) == item["tick"]:
+                        del item["text"]
+                return items
+            if code == SEARCH_LUA:
+                return {
+                    "matches": [["/w/a.txt", 1, "the needle is here"]],
+                    "truncated": False,
+                }
+
+        nvim.exec_lua.side_effect = exec_lua
+        return nvim
+
+    @pytest.mark.asyncio
+    async def test_search_narrows_buffers(self, mock_nvim):
+        """Test that only candidate buffers are scanned in nvim."""
+        server = NvimcpServer(mock_nvim)
+
+        result = await server._search("needle", literal=True)
+
+        search_call = mock_nvim.exec_lua.call_args_list[-1][0]
+        assert search_call[0] == SEARCH_LUA
+        assert search_call[1:] == ([1], [], "\\C\\Vneedle", 100)
+        assert result[0].text == "/w/a.txt:1: the needle is here"
+
+    @pytest.mark.asyncio
+    async def test_unchanged_buffers_not_resent(self, mock_nvim):
+        """Test that the second search sends known changedticks."""
+        server = NvimcpServer(mock_nvim)
+
+        await server._search("needle")
+        await server._search("needle")
+
+        sync_calls = [
+            c[0]
+            for c in mock_nvim.exec_lua.call_args_list
+            if c[0][0] == SYNC_BUFFERS_LUA
+        ]
+        assert sync_calls[1][1] == {1: 5, 2: 7}
+        assert server.search_index.stamp("buf:1") == (5,)
+
+    @pytest.mark.asyncio
+    async def test_empty_pattern(self, mock_nvim):
+        """Test rejecting empty patterns."""
+        server = NvimcpServer(mock_nvim)
+
+        result = await server._search("")
+
+        assert "Error searching" in result[0].text
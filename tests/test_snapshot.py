@@ -0,0 +1,121 @@
+"""Tests for buffer snapshots."""
+
+import pytest
+from unittest.mock import Mock
+from nvimcp.core import NvimcpServer
+from nvimcp.snapshot import (
+    EDIT_IF_UNCHANGED_LUA,
+    SNAPSHOT_LUA,
+    SnapshotError,
+    SnapshotStore,
+)
+
+
+def capture(*buffers, current=1):
+    return {
+        "current": current,
+        "buffers": [
+            {"buf": b, "name": f"/tmp/{b}.py", "tick": 10 + b, "lines": lines}
+            for b, lines in buffers
+        ],
+    }
+
+
+class TestSnapshotStore:
+    """Test snapshot storage."""
+
+    def test_add_and_get(self):
+        """Test reading captured buffers, including the current default."""
+        store = SnapshotStore()
+        snap = store.add(capture((1, ["a"]), (2, ["b", "c"])))
+        assert store.get(snap.id) is snap
+        assert snap.buffer().lines == ["a"]
+        assert snap.buffer(2).tick == 12
+        with pytest.raises(SnapshotError, match="not in snapshot"):
+            snap.buffer(3)
+
+    def test_errors_recorded(self):
+        """Test that invalid buffers are reported, not stored."""
+        store = SnapshotStore()
+        result = capture((1, ["a"]))
+        result["buffers"].append({"buf": 9, "error": "invalid or unloaded buffer"})
+        snap = store.add(result)
+        assert list(snap.buffers) == [1] and 9 in snap.errors
+
+    def test_eviction(self):
+        """Test LRU eviction by count and by bytes."""
+        store = SnapshotStore(max_snapshots=2)
+        first = store.add(capture((1, ["a"])))
+        second = store.add(capture((1, ["b"])))
+        store.get(first.id)
+        store.add(capture((1, ["c"])))
+        with pytest.raises(SnapshotError, match="expired"):
+            store.get(second.id)
+        assert store.get(first.id)
+
+        store = SnapshotStore(max_bytes=10)
+        old = store.add(capture((1, ["12345"])))
+        big = store.add(capture((1, ["1234567890"])))
+        assert len(store) == 1 and store.get(big.id)
+        with pytest.raises(SnapshotError):
+            store.get(old.id)
+
+
+class TestSnapshotTools:
+    """Test snapshot, snapshot reads and conditional edits."""
+
+    @pytest.mark.asyncio
+    async def test_read_from_snapshot_without_rpc(self):
+        """Test that snapshot reads are served from the cache."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = capture((1, ["x", "y"]), (4, ["z"]))
+        server = NvimcpServer(nvim)
+
+        result = await server.call_tool("snapshot", {"buffer_ids": [1, 4]})
+        nvim.exec_lua.assert_called_once_with(SNAPSHOT_LUA, [1, 4])
+        assert result[0].text.startswith("Snapshot snap-1")
+        assert "buffer 4: /tmp/4.py changedtick=14 lines=1" in result[0].text
+
+        nvim.reset_mock()
+        content = await server.call_tool(
+            "get_buffer_content", {"snapshot_id": "snap-1"}
+        )
+        other = await server.call_tool(
+            "get_buffer_content", {"snapshot_id": "snap-1", "buffer_id": 4}
+        )
+        assert content[0].text == "x\ny" and other[0].text == "z"
+        assert nvim.mock_calls == []
+
+    @pytest.mark.asyncio
+    async def test_conditional_edit(self):
+        """Test that edits apply only while the buffer is unchanged."""
+        nvim = Mock()
+        nvim.exec_lua.return_value = capture((1, ["x", "y"]))
+        server = NvimcpServer(nvim)
+        await server.call_tool("snapshot", {})
+
+        nvim.exec_lua.return_value = {"ok": True, "tick": 12}
+        result = await server.call_tool(
+            "edit_buffer",
+            {"content": "new", "line_start": 2, "line_end": 2, "snapshot_id": "snap-1"},
+        )
+        nvim.exec_lua.assert_called_with(EDIT_IF_UNCHANGED_LUA, 1, 11, 1, 2, ["new"])
+        assert result[0].text == "Buffer updated successfully (changedtick 12)"
+
+        nvim.exec_lua.return_value = {"ok": False, "tick": 12}
+        result = await server.call_tool(
+            "edit_buffer", {"content": "again", "snapshot_id": "snap-1"}
+        )
+        nvim.exec_lua.assert_called_with(EDIT_IF_UNCHANGED_LUA, 1, 11, 0, -1, ["again"])
+        assert result[0].text == (
+            "Error editing buffer: buffer 1 changed since snap-1 (changedtick 11 -> 12)"
+        )
+
+    @pytest.mark.asyncio
+    async def test_unknown_snapshot(self):
+        """Test reading an unknown snapshot."""
+        server = NvimcpServer(Mock())
+        result = await server.call_tool("get_buffer_content", {"snapshot_id": "nope"})
+        assert result[0].text == (
+            "Error getting buffer content: Unknown or expired snapshot: nope"
+        )
@@ -0,0 +1,113 @@
+"""Tests for the soak load generator."""
+
+import asyncio
+import os
+import shutil
+
+import pytest
+
+from nvimcp.soak import Sample, SoakConfig, check, format_report, run_soak
+
+
+def samples(rss=(), p95=(), fds=None):
+    return [
+        Sample(
+            t=float(i),
+            rss=r,
+            threads=4,
+            fds=fds,
+            queue=0,
+            calls=10,
+            errors=0,
+            p50=1.0,
+            p95=p,
+        )
+        for i, (r, p) in enumerate(zip(rss, p95))
+    ]
+
+
+class FakeServer:
+    """Answers every tool call after a short delay."""
+
+    nvim = None
+
+    def __init__(self):
+        self.calls = []
+
+    async def run_sync(self, func, *args):
+        return [1, 2, 3]
+
+    async def call_tool(self, name, args):
+        from mcp.types import TextContent
+
+        self.calls.append(name)
+        await asyncio.sleep(0.001)
+        return [TextContent(type="text", text="ok")]
+
+
+class TestCheck:
+    """Test leak and drift detection on recorded samples."""
+
+    def test_steady_run_passes(self):
+        """Test that flat memory and latency pass."""
+        run = samples(rss=[100 << 20] * 8, p95=[2.0] * 8)
+        assert check(run, 80, 0, SoakConfig()) == []
+
+    def test_rss_leak(self):
+        """Test that steady RSS growth past the limit fails."""
+        run = samples(rss=[(100 + 20 * i) << 20 for i in range(8)], p95=[2.0] * 8)
+        failures = check(run, 80, 0, SoakConfig(max_rss_growth=32 << 20))
+        assert len(failures) == 1 and failures[0].startswith("rss grew by")
+
+    def test_latency_creep(self):
+        """Test that p95 creeping past the drift limit fails."""
+        run = samples(rss=[100 << 20] * 8, p95=[1.0 + i for i in range(8)])
+        failures = check(run, 80, 0, SoakConfig(max_latency_drift=0.5))
+        assert any(f.startswith("p95 latency drifted") for f in failures)
+
+    def test_warmup_is_ignored(self):
+        """Test that growth during warmup does not count."""
+        run = samples(rss=[10 << 20] + [200 << 20] * 9, p95=[9.0] + [2.0] * 9)
+        assert check(run, 100, 0, SoakConfig(max_rss_growth=1 << 20)) == []
+
+    def test_errors(self):
+        """Test that failed calls fail the run."""
+        failures = check([], 10, 1, SoakConfig())
+        assert failures == ["1 of 10 calls failed"]
+
+
+class TestRunSoak:
+    """Test the load generator."""
+
+    @pytest.mark.asyncio
+    async def test_clients_and_samples(self):
+        """Test that every client issues calls and each interval is sampled."""
+        server = FakeServer()
+        config = SoakConfig(clients=3, duration=0.3, interval=0.1)
+        report = await run_soak(server, config)
+        assert report.calls == len(server.calls) > 0
+        assert set(server.calls) <= {
+            "get_buffer_content",
+            "edit_buffer",
+            "run_command",
+            "get_status",
+            "snapshot",
+        }
+        assert len(report.samples) >= 4
+        assert "calls, 0 errors" in format_report(report)
+
+    @pytest.mark.skipif(shutil.which("nvim") is None, reason="nvim not installed")
+    @pytest.mark.asyncio
+    async def test_real_nvim(self):
+        """Soak a real embedded nvim; NVIMCP_SOAK_SECONDS sets the duration."""
+        from nvimcp.connection import LEAN_NVIM_ARGS, connect_neovim
+        from nvimcp.core import NvimcpServer
+
+        duration = float(os.environ.get("NVIMCP_SOAK_SECONDS", "10"))
+        nvim = connect_neovim(mode="embedded", nvim_args=LEAN_NVIM_ARGS)
+        try:
+            config = SoakConfig(duration=duration, interval=max(duration / 20, 0.1))
+            report = await run_soak(NvimcpServer(nvim), config)
+        finally:
+            nvim.close()
+        assert report.failures == [], format_report(report)
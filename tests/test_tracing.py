@@ -0,0 +1,165 @@
+"""Tests for span tracing and exporters."""
+
+import json
+import pytest
+from nvimcp.core import NvimcpServer
+from nvimcp.tracing import (
+    ChromeTraceExporter,
+    OtlpFileExporter,
+    Span,
+    Tracer,
+)
+from tests.test_recorder import FakeNvim
+
+
+class ListExporter:
+    """Collects spans in memory."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+class TestTracer:
+    """Test span creation and sampling."""
+
+    def test_nesting(self):
+        """Test that children share the trace and point at their parent."""
+        exporter = ListExporter()
+        tracer = Tracer(exporter)
+        with tracer.span("root"):
+            with tracer.span("child", "x", n=1):
+                tracer.record("measured", "rpc", 0.0, 0.5)
+        measured, child, root = exporter.spans
+        assert root.parent_id is None
+        assert child.parent_id == root.span_id
+        assert measured.parent_id == child.span_id
+        assert {s.trace_id for s in exporter.spans} == {root.trace_id}
+        assert child.attrs == {"n": 1} and measured.end == 0.5
+
+    def test_sampling(self):
+        """Test that unsampled traces export nothing, children included."""
+        exporter = ListExporter()
+        tracer = Tracer(exporter, sample_rate=0.0)
+        assert not tracer.enabled
+        with tracer.span("root"):
+            with tracer.span("child"):
+                tracer.record("rpc", "rpc", 0.0, 1.0)
+        assert exporter.spans == []
+
+    def test_error_attribute(self):
+        """Test that exceptions are recorded on the span."""
+        exporter = ListExporter()
+        tracer = Tracer(exporter)
+        with pytest.raises(ValueError):
+            with tracer.span("root"):
+                raise ValueError("bad")
+        assert "bad" in exporter.spans[0].attrs["error"]
+
+    def test_record_without_parent(self):
+        """Test that measured spans outside a trace are dropped."""
+        exporter = ListExporter()
+        Tracer(exporter).record("rpc", "rpc", 0.0, 1.0)
+        assert exporter.spans == []
+
+
+class TestExporters:
+    """Test trace file formats."""
+
+    def test_chrome(self, tmp_path):
+        """Test Chrome trace_event output."""
+        path = tmp_path / "trace.json"
+        tracer = Tracer(ChromeTraceExporter(str(path)))
+        with tracer.span("tool:x", "tool"):
+            pass
+        tracer.close()
+        events = [e for e in json.loads(path.read_text()) if e]
+        assert len(events) == 1
+        assert events[0]["name"] == "tool:x" and events[0]["ph"] == "X"
+        assert events[0]["dur"] >= 0
+
+    def test_otlp(self, tmp_path):
+        """Test that a trace is written as one OTLP request once its root ends."""
+        path = tmp_path / "trace.jsonl"
+        tracer = Tracer(OtlpFileExporter(str(path)))
+        with tracer.span("root"):
+            with tracer.span("child", n=2):
+                pass
+            assert path.read_text() == ""
+        tracer.close()
+        (line,) = path.read_text().splitlines()
+        spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        child, root = spans
+        assert child["parentSpanId"] == root["spanId"]
+        assert root["parentSpanId"] == ""
+        assert {"key": "n", "value": {"intValue": "2"}} in child["attributes"]
+
+    def test_otlp_late_child(self, tmp_path):
+        """Test that children finishing after their root are not held."""
+        path = tmp_path / "trace.jsonl"
+        exporter = OtlpFileExporter(str(path), max_pending=2)
+
+        def span(trace, parent):
+            return Span(trace, trace * 10 + (parent or 0), parent, "s", "c", 0, 1, 1)
+
+        exporter.export(span(1, None))
+        exporter.export(span(1, 5))
+        assert len(path.read_text().splitlines()) == 2
+        assert not exporter._pending
+
+        for trace in (2, 3, 4):
+            exporter.export(span(trace, 7))
+        assert list(exporter._pending) == [3, 4]
+        exporter.close()
+
+        def traces(line):
+            spans = json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            return [int(s["traceId"], 16) for s in spans]
+
+        assert [traces(line) for line in path.read_text().splitlines()] == [
+            [1],
+            [1],
+            [2],
+            [3],
+            [4],
+        ]
+
+
+class TestServerTracing:
+    """Test spans emitted by the server."""
+
+    @pytest.mark.asyncio
+    async def test_tool_call_spans(self):
+        """Test that a tool call covers the executor hop and its RPCs."""
+        exporter = ListExporter()
+        server = NvimcpServer(FakeNvim(), tracer=Tracer(exporter))
+
+        await server.call_tool("run_command", {"command": "echo 1"})
+
+        spans = {s.name: s for s in exporter.spans}
+        assert set(spans) == {
+            "tool:run_command",
+            "executor:queue",
+            "executor:run",
+            "nvim:lock_wait",
+            "rpc:nvim_exec2",
+        }
+        root = spans["tool:run_command"]
+        assert root.parent_id is None
+        assert spans["executor:queue"].parent_id == root.span_id
+        assert spans["executor:run"].parent_id == root.span_id
+        assert spans["nvim:lock_wait"].parent_id == spans["executor:run"].span_id
+        assert spans["rpc:nvim_exec2"].parent_id == spans["executor:run"].span_id
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self):
+        """Test that servers without a tracer do not hook RPCs."""
+        nvim = FakeNvim()
+        server = NvimcpServer(nvim)
+        assert not server.tracer.enabled
+        assert "request" not in vars(nvim._session)